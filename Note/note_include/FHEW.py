@@ -1,16 +1,27 @@
 import numpy as np
-from note_include.elem.Ring           import Ring
+from note_include.elem.Ring           import Ring, coeff_dtype
 from note_include.elem.LWE            import LWE
 from note_include.elem.RLWE           import RLWE
 from note_include.elem.RLWEp          import RLWEp
 from note_include.elem.RGSW           import RGSW
-from note_include.utils.types         import RGSWctxt, RLWEctxt, RLWEpctxt, LWEctxt
+from note_include.utils.types         import RGSWctxt, RLWEctxt, RLWEpctxt, LWEctxt, LWEctxt_batch
+from note_include.utils.NTT           import get_ntt
+from note_include.utils.RNS           import get_rns, get_transform
+from note_include.utils               import keystore
+from note_include.utils.keystore      import storage_dtype
+from note_include.utils.prng          import new_seed, uniform_rows
+from note_include.utils.gadget_decomposition import max_digit, signed_digits
+from note_include.utils.lazy          import Accumulator
 from note_include.blindrotations.DM   import DM
 from note_include.blindrotations.CGGI import CGGI
-from joblib import Parallel, delayed
+from note_include.blindrotations.LMKCDEY import LMKCDEY
+from note_include.blindrotations.BlockCGGI import BlockCGGI
+from note_include.parallel            import BootstrapExecutor, generate_keys
+from note_include.profiling           import Profiler
+
 
 class FHEW:
-    # Method -> DM, CGGI, LMKCDEY
+    # Method -> DM, CGGI, BlockCGGI (CGGI over blocks of block_size key bits), LMKCDEY
     def __init__(self, lwe_dimension, 
                        lwe_modulus, 
                        dimension, 
@@ -19,15 +30,26 @@ class FHEW:
                        e_std, 
                        base_gd, 
                        base_ks, 
-                       method = 'DM'):
+                       method = 'DM',
+                       trivial_acc = False,
+                       block_size = 2,
+                       ks_modulus = None):
         
         # it should be satisfy q = 2N
         assert lwe_modulus == dimension * 2
-        assert method == "DM" or method == "CGGI" or method == "LMKCDEY", "Method should be one of [DM, CGGI, LMKCDEY]."
+        assert method in ("DM", "CGGI", "BlockCGGI", "LMKCDEY"), "Method should be one of [DM, CGGI, BlockCGGI, LMKCDEY]."
         assert s_std == "Gaussian" or s_std == "Binary", "Secret key distribution should be one of [Gaussian, Binary]."
         
-        if method == "CGGI":
-            assert method == "CGGI" and s_std == "Binary", "We impl CGGI blind rotation only for binary key distribution."
+        if method == "CGGI" or method == "BlockCGGI":
+            assert s_std == "Binary", "We impl CGGI blind rotation only for binary key distribution."
+
+        # constructor arguments, recorded in saved key files
+        self.config   = dict(lwe_dimension = lwe_dimension, lwe_modulus = lwe_modulus,
+                             dimension     = dimension,     modulus     = modulus,
+                             s_std         = s_std,         e_std       = e_std,
+                             base_gd       = base_gd,       base_ks     = base_ks,
+                             method        = method,        trivial_acc = trivial_acc,
+                             block_size    = block_size,    ks_modulus  = ks_modulus)
 
         self.n        = lwe_dimension
         self.q        = lwe_modulus
@@ -37,50 +59,181 @@ class FHEW:
         self.e_std    = e_std
         self.B        = base_gd
         self.d_g      = int(np.ceil(np.log(lwe_modulus) / np.log(base_gd)))
+        self.d_Q      = int(np.ceil(np.log(modulus)     / np.log(base_gd)))
+        self.Q_ks     = modulus if ks_modulus is None else ks_modulus # Q -> Q_ks -> key switch -> q
         self.B_ks     = base_ks
-        self.d_ks     = int(np.ceil(np.log(modulus) / np.log(base_ks)))
+        self.d_ks     = int(np.ceil(np.log(self.Q_ks) / np.log(base_ks)))
 
         self.LWE_CC   = LWE  (lwe_dimension, lwe_modulus, s_std, e_std)
-        self.LWEQ_CC  = LWE  (lwe_dimension, modulus,     s_std, e_std)
+        self.LWEks_CC = LWE  (lwe_dimension, self.Q_ks,   s_std, e_std)
         self.RLWE_CC  = RLWE (dimension,     modulus,     s_std, e_std)
         # self.RLWEp_CC = RLWEp(dimension,     modulus,     std, base_gd, self.d_g)
-        self.RGSW_CC  = RGSW (dimension,     modulus,     s_std, e_std, base_gd, self.d_g)
+        self.RGSW_CC  = RGSW (dimension,     modulus,     s_std, e_std, base_gd, self.d_Q)
 
         if method == 'DM':
             self.method =   DM(lwe_dimension, lwe_modulus, dimension, modulus, s_std, e_std, base_gd) 
         elif method== 'CGGI':
             self.method = CGGI(lwe_dimension, lwe_modulus, dimension, modulus, s_std, e_std, base_gd) 
+        elif method == 'BlockCGGI':
+            self.method = BlockCGGI(lwe_dimension, lwe_modulus, dimension, modulus, s_std, e_std, base_gd, block_size)
+        elif method == 'LMKCDEY':
+            self.method = LMKCDEY(lwe_dimension, lwe_modulus, dimension, modulus, s_std, e_std, base_gd)
+
+        # one test polynomial per gate, acc_init only rotates it by b
+        # trivial_acc : noiseless accumulator (0, X^b * tv) instead of a pk encryption
+        # acc_power   : LMKCDEY applies psi_{1/acc_power} to the message, tv and b are pre-mapped
+        self.acc_power    = getattr(self.method, "acc_power", 1)
+        self.test_vectors = {gate : Ring.from_reduced(self.N, self.Q, test_polynomial(self.q, self.N, self.Q, gate)).automorphism(self.acc_power)
+                             for gate in GATES}
+        self.trivial_acc  = trivial_acc
+
+        self.key_path = None # key file backing brk/ksk, if any (see load_keys)
+        self.executor = None # process pool of evalBin_batch
 
     # -------------------------------- KeyGen ---------------------------- #
-    def keygen(self): # Further impl
+    def keygen(self, seeded = False, n_workers = None): # Further impl
+        '''
+            With seeded = True every mask of brk and ksk is derived from brk_seed / ksk_seed,
+            so save_keys(..., compressed = True) only has to write the b parts.
+            n_workers : processes generating brk and ksk (parallel.generate_keys, default : os.cpu_count()).
+        '''
+        self.shutdown_executor() # workers hold the previous keys
+        self.key_path  = None
+
         s              = self.LWE_CC.keygen()
         s_ring,pk_ring = self.RLWE_CC.keygen()
 
-        self.brk       = self.method.keygen(s, s_ring)
-        self.ksk       = self.KSKgen(s, s_ring)
+        self.brk_seed  = new_seed() if seeded else None
+        self.ksk_seed  = new_seed() if seeded else None
+        self.brk       = self.method.keygen(s, s_ring, self.brk_seed, n_workers)
+        self.ksk       = self.KSKgen(s, s_ring, seed = self.ksk_seed, n_workers = n_workers)
         self.pk        = pk_ring
 
         return s, s_ring
     
-    def KSKgen(self, lwe_sk:list[int], rlwe_sk:Ring):
-        ksk = []
-        for _s in rlwe_sk.coeffs:
-            matrix = []
-            for v in range(self.B_ks):
-                row = []
-                for j in range(self.d_ks):
-                    row.append(self.LWEQ_CC.encrypt((v * (self.B_ks**j) * _s) % self.Q, lwe_sk))
-                matrix.append(row)
-            ksk.append(matrix)    
-        return ksk
+    def KSKgen(self, lwe_sk:list[int], rlwe_sk:Ring, chunk = 64, seed:int = None, n_workers:int = None) -> np.ndarray:
+        '''
+            Key-switching key as one (N, ceil(B_ks/2), d_ks, n+1) tensor : ksk[i, v-1, j] = (a, b)
+            is LWE_{Q_ks}(v * B_ks^j * s_i) with a in [..., :n] and b in [..., n], for the
+            magnitudes v of the signed digits (KeySwitch subtracts the negative ones).
+            Rows of the RLWE key are the work items of parallel.generate_keys, encrypted
+            `chunk` at a time with batch encryption.
+            With a seed, the mask of ksk[i, v-1, j] is row (i * ceil(B_ks/2) + v-1) * d_ks + j of its stream.
+            Both keys are centered first : s (mod q) and s_ring (mod Q) are only the same small
+            integers mod Q_ks as representatives in (-m/2, m/2].
+        '''
+        context = (self.LWEks_CC, centered(lwe_sk, self.q), centered(rlwe_sk.coeffs, self.Q), self.B_ks, self.d_ks, seed)
+        return generate_keys(generate_ksk_rows, context, self.N, (max_digit(self.B_ks), self.d_ks, self.n + 1),
+                             storage_dtype(self.Q_ks), n_workers, chunk)
     
     # ------------------------------------------------------------------- #
 
+    # ---------------------- Evaluation-key storage ---------------------- #
+
+    def save_keys(self, path, compressed = False):
+        '''
+            Writes brk, ksk and pk to one binary file (see utils/keystore.py) whose header
+            records the parameter set and method. Secret keys are never written.
+            compressed = True (keys from keygen(seeded = True)) writes only the b parts and
+            the two mask seeds, roughly halving brk and shrinking ksk to 1/(n+1).
+            LMKCDEY automorphism keys are stored next to brk as "akey". RNS keys are stored
+            limb by limb, so their entries fit the word size of the largest prime.
+        '''
+        rns               = get_rns(self.N, self.Q)
+        dtype             = storage_dtype(self.Q if rns is None else max(rns.primes))
+        brk, akey         = self.brk if self.config["method"] == "LMKCDEY" else (self.brk, None)
+        brk_shape, leaves = keystore.flatten_rgsw(brk)
+        leaves            = (leaf if isinstance(leaf, np.ndarray) else self.RGSW_CC.to_array(leaf) for leaf in leaves)
+        leaf_shape        = (2, self.d_Q, 2, self.N)
+
+        header = {"params" : self.config,
+                  "domain" : self.key_domain()}
+        if compressed:
+            if getattr(self, "brk_seed", None) is None or getattr(self, "ksk_seed", None) is None:
+                raise ValueError("Compressed keys need keys generated with keygen(seeded = True).")
+            header["seeds"] = {"brk" : hex(self.brk_seed), "ksk" : hex(self.ksk_seed)}
+            arrays = {"brk_b" : (brk_shape + (2, self.d_Q, self.N), dtype, (leaf[:, :, 1] for leaf in leaves)),
+                      "ksk_b" : (self.ksk.shape[:-1],   storage_dtype(self.Q_ks), [self.ksk[..., self.n]])}
+            if akey is not None:
+                arrays["akey_b"] = (akey.shape[:-2] + (self.N,),    dtype, [akey[..., 1, :]])
+        else:
+            arrays = {"brk"   : (brk_shape + leaf_shape,             dtype, leaves),
+                      "ksk"   : (self.ksk.shape,      storage_dtype(self.Q_ks), [self.ksk])}
+            if akey is not None:
+                arrays["akey"]   = (akey.shape,                      dtype, [akey])
+        arrays["pk"] = ((2, self.N), storage_dtype(self.Q), [self.pk[0].coeffs, self.pk[1].coeffs])
+        keystore.save(path, header, arrays)
+
+    @classmethod
+    def load_keys(cls, path):
+        '''
+            Builds an FHEW context from a key file. brk and ksk stay np.memmap views into
+            the file, so processes loading the same file share the pages zero-copy.
+        '''
+        header, arrays = keystore.load(path)
+        fhew           = cls(**header["params"])
+
+        domain = fhew.key_domain()
+        if header["domain"] != domain:
+            raise ValueError(f"Keys are stored in the {header['domain']} domain, expected {domain}.")
+
+        pk             = np.asarray(arrays["pk"], dtype=coeff_dtype(fhew.Q))
+        if "seeds" in header:
+            fhew.brk, fhew.ksk = fhew.expand_keys(arrays["brk_b"], arrays["ksk_b"], header["seeds"], arrays.get("akey_b"))
+        else:
+            fhew.brk   = arrays["brk"] if "akey" not in arrays else (arrays["brk"], arrays["akey"])
+            fhew.ksk   = arrays["ksk"]
+        fhew.pk        = (Ring.from_reduced(fhew.N, fhew.Q, pk[0]), Ring.from_reduced(fhew.N, fhew.Q, pk[1]))
+        fhew.key_path  = path
+        return fhew
+
+    def expand_keys(self, brk_b:np.ndarray, ksk_b:np.ndarray, seeds:dict, akey_b:np.ndarray = None):
+        '''
+            Regenerates the masks of compressed keys and returns the full (brk, ksk) tensors in memory.
+            LMKCDEY automorphism keys (akey_b) take the brk mask rows that follow the RGSW keys.
+        '''
+        self.brk_seed   = int(seeds["brk"], 16)
+        self.ksk_seed   = int(seeds["ksk"], 16)
+
+        brk_a, rows = self.expand_masks(self.brk_seed, 0, brk_b.shape, -4)
+        ksk_a       = uniform_rows(self.ksk_seed, self.Q_ks, self.n, 0, ksk_b.size).reshape(ksk_b.shape + (self.n,))
+
+        brk   = np.stack([brk_a.astype(brk_b.dtype), brk_b], axis=-2)
+        ksk   = np.concatenate([ksk_a.astype(ksk_b.dtype), ksk_b[..., None]], axis=-1)
+
+        if akey_b is not None:
+            akey_a, _ = self.expand_masks(self.brk_seed, rows, akey_b.shape, -3)
+            brk       = (brk, np.stack([akey_a.astype(akey_b.dtype), akey_b], axis=-2))
+        return brk, ksk
+
+    def expand_masks(self, seed:int, start:int, b_shape:tuple, limb_axis:int):
+        '''
+            Mask rows start, start+1, ... of seed matching the b parts b_shape, in the key domain,
+            and the number of rows used. An RNS b_shape has its limbs at limb_axis.
+        '''
+        ntt, rns = get_ntt(self.N, self.Q), get_rns(self.N, self.Q)
+        shape    = b_shape if rns is None else b_shape[:limb_axis] + b_shape[limb_axis:][1:]
+        count    = int(np.prod(shape[:-1]))
+        rows     = uniform_rows(seed, self.Q, self.N, start, count).reshape(shape)
+        if ntt is not None:
+            rows = ntt.forward(rows)
+        elif rns is not None:
+            rows = np.moveaxis(rns.forward(rows), 0, limb_axis)
+        return rows, count
+
+    def key_domain(self) -> str:
+        '''Domain of the blind rotation keys : "ntt", "rns" (limb-wise NTT) or "coeff".'''
+        if get_ntt(self.N, self.Q) is not None:
+            return "ntt"
+        return "rns" if get_rns(self.N, self.Q) is not None else "coeff"
+
+    # ------------------------------------------------------------------- #
+
     # --------------------Encryption and decryption---------------------- #
 
-    def encrypt(self, m:int, s:list[int]) -> LWEctxt:
+    def encrypt(self, m:int, s:list[int], seeded = False) -> LWEctxt:
         assert m == 0 or m == 1, "message must be 0 or 1"
-        return self.LWE_CC.encrypt(m * (self.q // 4), s)
+        return self.LWE_CC.encrypt(m * (self.q // 4), s, new_seed() if seeded else None)
     
     def decrypt(self, ctxt : LWEctxt, s : list[int]) -> int:
         m = self.LWE_CC.decrypt(ctxt, s)
@@ -90,65 +243,60 @@ class FHEW:
             m = 1
         return m
 
-    def acc_init(self, ctxt:LWEctxt, gate = "AND") -> RLWEctxt:
-        _, b = ctxt
-        q0, q1, q2, q3 = mapping_function(self.q, gate)
-
-        swap1 = False
-        swap2 = False
-        if q0 > q1 : swap1 = True
-        if q2 > q3 : swap2 = True    
-
-        acc = np.zeros(self.N)
-
-        for i in range(self.q//2):
-            b = (b - 1) % self.q
-
-            if swap1 == False:
-                if b >= q0 and b < q1:
-                    acc[i] = self.Q // 8
-            
-            elif swap1 == True:
-                if b > q0 or b <= q1:
-                    acc[i] = self.Q // 8
-
-            if swap2 == False:
-                if b >= q2 and b < q3:
-                    acc[i] = -self.Q // 8
-            
-            elif swap2 == True:
-                if b > q2 or b <= q3:
-                    acc[i] = -self.Q // 8
-            
-        poly_acc = Ring(self.N, self.Q, acc)
-        acc = self.RLWE_CC.pk_encrypt(poly_acc, self.pk)
-
-        return acc
+    def encrypt_batch(self, ms:list[int], s:list[int], seeded = False) -> LWEctxt_batch:
+        ms = np.asarray(ms)
+        assert np.all((ms == 0) | (ms == 1)), "message must be 0 or 1"
+        return self.LWE_CC.encrypt_batch(ms * (self.q // 4), s, new_seed() if seeded else None)
+
+    def decrypt_batch(self, ctxts:LWEctxt_batch, s:list[int]) -> np.ndarray:
+        m = self.LWE_CC.decrypt_batch(ctxts, s)
+        return np.where((m <= self.q // 8) | (m > self.q * 5 // 8), 0, 1)
+
+    def acc_init(self, ctxt:LWEctxt, gate = "AND", trivial = None) -> RLWEctxt:
+        '''
+            acc = X^b * tv_gate, public-key encrypted, or the trivial ciphertext (0, X^b * tv_gate)
+            when trivial (default : self.trivial_acc).
+        '''
+        _, b     = ctxt
+        trivial  = self.trivial_acc if trivial is None else trivial
+        poly_acc = self.test_vectors[gate].mul_monomial(self.acc_power * int(b))
+
+        if trivial:
+            return (Ring(self.N, self.Q, []), poly_acc)
+        return self.RLWE_CC.pk_encrypt(poly_acc, self.pk)
     
     # ------------------------------------------------------------------- #
 
     # --------------------Ket Switch and Mod Switch---------------------- #
 
     def KeySwitch(self, ctxt:LWEctxt) -> LWEctxt:
+        '''LWE_{s'}(m) mod Q_ks with s' the N RLWE key coefficients -> LWE_s(m) mod Q_ks.'''
         a, b = ctxt
-
-        tmp_ct = (np.zeros(self.n), b)
-        for i, _a in enumerate(a):
-            tmpa = int(_a)
-            for j in range(self.d_ks):
-                v  = tmpa % self.B_ks
-                tmpa = tmpa // self.B_ks
-
-                tmp_ct = self.LWE_CC.sub(tmp_ct, self.ksk[i][v][j])
-
-        return tmp_ct
+        Q    = self.Q_ks
+        a    = np.asarray(a, dtype=coeff_dtype(Q))
+
+        # signed base-B_ks digits of every a_i at once, then one gather of the ksk rows
+        # of the positive and one of the negative digits (zero digits select nothing),
+        # summed unreduced (utils/lazy.py) and reduced once with the final negation
+        digits = signed_digits(a, self.B_ks, self.d_ks, Q).T.astype(np.intp)      # (N, d_ks)
+        acc    = Accumulator.zeros(Q, self.n + 1, coeff_dtype(Q))
+        i, j   = np.nonzero(digits > 0)
+        acc.add_sum(self.ksk[i, digits[i, j] - 1, j], Q - 1)
+        i, j   = np.nonzero(digits < 0)
+        acc.sub_sum(self.ksk[i, -digits[i, j] - 1, j], Q - 1)
+        a_     = (-acc.value[:self.n]) % Q
+        b_     = (b - acc.value[self.n]) % Q
+
+        return (a_, b_)
     
-    def ModSwitch(self, ctxt:RLWEctxt) -> LWEctxt:
+    def ModSwitch(self, ctxt:LWEctxt, modulus:int = None, target:int = None) -> LWEctxt:
+        '''(a, b) mod modulus (default Q) -> round(a * target / modulus), ... mod target (default q).'''
+        modulus = self.Q if modulus is None else modulus
+        target  = self.q if target  is None else target
+        if modulus == target:
+            return ctxt
         a, b = ctxt
-        a_   = [(np.round(coef*self.q/self.Q)) % self.q for coef in a]
-        b_   = (np.round(b*self.q/self.Q)) % self.q
-
-        return (a_, b_)    
+        return (mod_switch(a, modulus, target), int(mod_switch(b, modulus, target)))
 
     # ---------------------------------------------------------------------- #
 
@@ -156,35 +304,87 @@ class FHEW:
     
     def LWEextract(self, ctxt:RLWEctxt) -> LWEctxt:
         a, b = ctxt
-        b_0  = int(b.coeffs[0] + (self.Q // 8))                                                 # extract constant term
-        a_coeffs = [a.coeffs[0]] + [(-x) % a.q for x in reversed(a.coeffs[1:])] # suit for negacyclic works
+        b_0  = int(b.coeffs[0] + (self.Q // 8))                                   # extract constant term
+        a_coeffs = np.concatenate([a.coeffs[:1], (-a.coeffs[:0:-1]) % a.q])        # suit for negacyclic works
 
         return (a_coeffs, b_0)
 
     def evalBin(self, ctxt1:LWEctxt, ctxt2:LWEctxt, gate="AND"):
-        assert gate == "AND" or gate == "OR" or gate == "XOR" or gate == "NAND" or gate == "NOR" or gate == "XNOR", "Gate should be one of [AND, OR, XOR, NAND, NOR, XNOR]."
-
-        # Operate homomorphic addition and saclar mmultiplication
-        if gate == "XOR" or gate == "XNOR":
-            ctxt_operand =  self.LWE_CC.mult_cnst(self.LWE_CC.add(ctxt1, ctxt2), 2)
-        else:
-            ctxt_operand =  self.LWE_CC.add(ctxt1, ctxt2)
+        ctxt_operand = self.gate_operand(ctxt1, ctxt2, gate)
 
         acc = self.acc_init(ctxt_operand, gate)
 
         rotated_acc = self.method.Blindrotation(ctxt_operand, acc, self.brk)
 
-        # LWE extraction
-        extracted_lwe = self.LWEextract(rotated_acc)
+        return self.extract_and_switch(rotated_acc)
+
+    def gate_operand(self, ctxt1:LWEctxt, ctxt2:LWEctxt, gate="AND") -> LWEctxt:
+        assert gate in GATES, "Gate should be one of [AND, OR, XOR, NAND, NOR, XNOR]."
 
-        # KeySwitch
-        key_switched_lwe = self.KeySwitch(extracted_lwe)
+        # Operate homomorphic addition and saclar mmultiplication
+        if gate == "XOR" or gate == "XNOR":
+            return self.LWE_CC.mult_cnst(self.LWE_CC.add(ctxt1, ctxt2), 2)
+        return self.LWE_CC.add(ctxt1, ctxt2)
 
-        # ModSwitch # Too many noise so we do not use in toy example
-        # mod_switched_lwe = self.ModSwitch(key_switched_lwe)
+    def extract_and_switch(self, rotated_acc:RLWEctxt) -> LWEctxt:
+        # LWE extraction, dimension N mod Q
+        extracted_lwe = self.LWEextract(rotated_acc)
 
-        return key_switched_lwe
+        # ModSwitch Q -> Q_ks, KeySwitch N -> n at Q_ks, ModSwitch Q_ks -> q
+        ks_lwe           = self.ModSwitch(extracted_lwe, self.Q, self.Q_ks)
+        key_switched_lwe = self.KeySwitch(ks_lwe)
+        mod_switched_lwe = self.ModSwitch(key_switched_lwe, self.Q_ks, self.q)
+
+        return mod_switched_lwe
+
+    def evalBin_many(self, pairs:list[tuple[LWEctxt, LWEctxt]], gates = "AND") -> list[LWEctxt]:
+        '''
+            evalBin of independent gates in this process, with one batched blind rotation
+            (method.Blindrotation_batch, DM and CGGI) when Q has an evaluation domain : every
+            key is read once for all the gates instead of once per gate. Other methods and
+            moduli bootstrap the gates one by one.
+        '''
+        gates    = [gates] * len(pairs) if isinstance(gates, str) else list(gates)
+        operands = [self.gate_operand(ct1, ct2, gate) for (ct1, ct2), gate in zip(pairs, gates)]
+        accs     = [self.acc_init(op, gate) for op, gate in zip(operands, gates)]
+
+        if not hasattr(self.method, "Blindrotation_batch") or get_transform(self.N, self.Q) is None or len(pairs) < 2:
+            return [self.extract_and_switch(self.method.Blindrotation(op, acc, self.brk)) for op, acc in zip(operands, accs)]
+
+        accs    = np.array([[a.coeffs, b.coeffs] for a, b in accs], dtype=np.int64)
+        rotated = self.method.Blindrotation_batch(operands, accs, self.brk)
+        return [self.extract_and_switch([Ring(self.N, self.Q, a), Ring(self.N, self.Q, b)]) for a, b in rotated]
     
+    def evalBin_batch(self, pairs:list[tuple[LWEctxt, LWEctxt]], gates = "AND", n_workers = None, chunksize = None) -> list[LWEctxt]:
+        '''
+            Bootstraps independent gates on a persistent process pool (see parallel.py).
+            gates is one gate name or one per pair, results come back in order.
+            The pool is started on first use, its workers map the keys once from
+            key_path (a temporary key file is written if the keys are not file backed).
+            Workers bootstrap their chunks with evalBin_many, n_workers = 1 evaluates the
+            whole batch that way in the calling process.
+        '''
+        if n_workers == 1:
+            return self.evalBin_many(pairs, gates)
+
+        if self.executor is None or (n_workers is not None and n_workers != self.executor.n_workers):
+            self.shutdown_executor()
+            self.executor = BootstrapExecutor(self, n_workers, chunksize, self.key_path)
+        return self.executor.map(pairs, gates, chunksize)
+
+    def shutdown_executor(self):
+        if getattr(self, "executor", None) is not None:
+            self.executor.shutdown()
+        self.executor = None
+
+    def profile(self, callback = None) -> Profiler:
+        '''
+            Context manager timing the stages of evalBin and counting its operations (see
+            profiling.py) : with fhew.profile() as prof: ... ; print(prof.report()).
+            callback(record) is called after every gate with that gate's numbers.
+        '''
+        return Profiler(self, callback)
+
     def evalNOT(self, ct:LWEctxt) -> LWEctxt:
         a, b = ct
         b_   = b - self.q//4
@@ -195,6 +395,8 @@ class FHEW:
 
 # ------------------ Mapping Function ------------------ #
 
+GATES = ("AND", "OR", "XOR", "NAND", "NOR", "XNOR")
+
 def mapping_function(q:int, gate = "AND"):
     assert gate == "AND" or gate == "OR" or gate == "XOR" or gate == "NAND" or gate == "NOR" or gate == "XNOR", "Gate should be one of [AND, OR, XOR, NAND, NOR, XNOR]."
 
@@ -212,3 +414,51 @@ def mapping_function(q:int, gate = "AND"):
         q0, q1, q2, q3 = (-q / 4) % q, (q / 4), (q / 4), (3 * q / 4)
     
     return q0, q1, q2, q3
+
+def test_polynomial(q:int, N:int, Q:int, gate = "AND") -> np.ndarray:
+    '''
+        Test polynomial tv of a gate, the accumulator of b = 0 : coefficient i is +-Q/8 according
+        to where -1-i falls in the intervals of mapping_function (half open, [lo, hi) mod q).
+        Intervals are q/2 long and opposite, so X^b * tv mod X^N + 1 (q = 2N) is the
+        accumulator of any b.
+    '''
+    q0, q1, q2, q3 = mapping_function(q, gate)
+    x    = (-1 - np.arange(N)) % q
+
+    def inside(lo, hi):
+        return (x >= lo) & (x < hi) if lo <= hi else (x >= lo) | (x < hi)
+
+    tv = np.zeros(N, dtype=coeff_dtype(Q))
+    tv[inside(q0, q1)] =  Q // 8
+    tv[inside(q2, q3)] = -(Q // 8)
+    return tv % Q
+
+# ------------------ Modulus Switching ------------------ #
+
+def mod_switch(x, modulus:int, target:int) -> np.ndarray:
+    '''round(x * target / modulus) mod target elementwise, in exact integer arithmetic.'''
+    wide = modulus * target >= 2**63
+    x    = np.asarray(x, dtype=object if wide else np.int64) % modulus
+    y    = (x * target + modulus // 2) // modulus % target
+    return np.asarray(y).astype(coeff_dtype(target))
+
+def centered(x, modulus:int) -> list[int]:
+    '''Representatives of x mod modulus in (-modulus/2, modulus/2], as Python ints.'''
+    return [v - modulus if v > modulus // 2 else v for v in (int(v) % modulus for v in x)]
+
+# ------------------ Key-switching key generation ------------------ #
+
+def generate_ksk_rows(context, start, stop) -> np.ndarray:
+    '''ksk[start:stop] (see FHEW.KSKgen), one batch encryption of (stop - start) ceil(B_ks/2) d_ks messages.'''
+    LWEks_CC, lwe_sk, rlwe_sk, B_ks, d_ks, seed = context
+    Q      = LWEks_CC.q
+    c      = max_digit(B_ks)
+    gadget = np.array([(v * B_ks**j) % Q for v in range(1, c + 1) for j in range(d_ks)], dtype=object)
+    msgs   = (np.array(rlwe_sk[start:stop], dtype=object)[:, None] * gadget[None, :]) % Q
+    A, b   = LWEks_CC.encrypt_batch(msgs.ravel().astype(coeff_dtype(Q)), lwe_sk, seed, start * c * d_ks)
+
+    rows   = np.empty((stop - start, c, d_ks, LWEks_CC.n + 1), dtype=storage_dtype(Q))
+    block  = rows.reshape(-1, LWEks_CC.n + 1)
+    block[:, :LWEks_CC.n] = A
+    block[:,  LWEks_CC.n] = b
+    return rows
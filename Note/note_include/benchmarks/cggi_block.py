@@ -0,0 +1,53 @@
+# Blind rotation : CGGI vs. block-binary CGGI (one external product per block of k key bits)
+#
+#   $ cd Note && python -m note_include.benchmarks.cggi_block
+import time
+import numpy as np
+from note_include.FHEW       import FHEW
+from note_include.utils.NTT  import find_ntt_prime
+
+def key_bytes(brk):
+    return sum(np.asarray(rgsw).nbytes for rgsw in brk) if isinstance(brk, list) else brk.nbytes
+
+def phase_error(fhew, rlwe, s_ring, want):
+    '''|decrypted constant term of the rotated accumulator - want| / Q'''
+    a, b = rlwe
+    v    = int((b - a * s_ring).coeffs[0]) % fhew.Q
+    return min((v - want) % fhew.Q, (want - v) % fhew.Q) / fhew.Q
+
+def bench(method, n, N, bits, B, block_size = 2, repeat = 5):
+    Q    = find_ntt_prime(N, bits)
+    fhew = FHEW(n, 2 * N, N, Q, 'Binary', 3.2, B, 2**8, method=method, block_size=block_size)
+
+    start     = time.perf_counter()
+    s, s_ring = fhew.keygen()
+    t_keygen  = time.perf_counter() - start
+
+    t_br, ext_products, err = float("inf"), 0, 0.
+    for _ in range(repeat):
+        m0, m1  = np.random.randint(0, 2, 2)
+        operand = fhew.LWE_CC.add(fhew.encrypt(int(m0), s), fhew.encrypt(int(m1), s))
+        acc     = fhew.acc_init(operand, "AND")
+
+        start   = time.perf_counter()
+        rotated = fhew.method.Blindrotation(operand, acc, fhew.brk)
+        t_br    = min(t_br, time.perf_counter() - start)
+
+        a = np.asarray(operand[0]) % fhew.q
+        if method == "CGGI":
+            ext_products = int(np.count_nonzero(a))
+        else:
+            a = np.concatenate([a, np.zeros(-n % block_size, dtype=a.dtype)])
+            ext_products = int(np.count_nonzero(a.reshape(-1, block_size).any(axis=1)))
+        err = max(err, phase_error(fhew, rotated, s_ring, -(Q // 8) % Q if (m0 & m1) == 0 else Q // 8))
+
+    return t_keygen, key_bytes(fhew.brk), ext_products, t_br, err
+
+if __name__ == "__main__":
+    n, N, bits, B = 64, 512, 27, 2**7
+    print(f"n={n} N={N} log Q={bits} B={B}")
+    print(f"{'method':>12} {'keygen (s)':>12} {'brk (MB)':>10} {'ext. products':>14} {'blind rot. (s)':>15} {'max err / Q':>12}")
+    for method, k in [("CGGI", 1), ("BlockCGGI", 2), ("BlockCGGI", 3)]:
+        t_keygen, size, ext_products, t_br, err = bench(method, n, N, bits, B, k)
+        name = method if method == "CGGI" else f"{method}-{k}"
+        print(f"{name:>12} {t_keygen:>12.2f} {size / 2**20:>10.1f} {ext_products:>14} {t_br:>15.4f} {err:>12.2e}")
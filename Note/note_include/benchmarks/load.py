@@ -0,0 +1,133 @@
+# Load generator for the gate server (server.py)
+#
+#   $ cd Note && python -m note_include.benchmarks.load                      # in-process server, toy preset
+#   $ python -m note_include.benchmarks.load --preset small --clients 8 --concurrency 16 --workers 4
+#   $ python -m note_include.benchmarks.load --connect /tmp/toyfhew.sock --requests 200
+#
+# By default the keys are generated here and a server is started on a Unix socket in
+# this process (its bootstraps run in the worker pool), so every result is decrypted
+# and checked. With --connect an external server is loaded with random ciphertexts and
+# only the timings are reported. Every client keeps --concurrency requests in flight.
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+from note_include.FHEW                  import FHEW, GATES
+from note_include.client                import GateClient
+from note_include.server                import GateServer, percentiles
+from note_include.benchmarks.suite      import PRESETS
+
+PLAIN = {"AND"  : lambda x, y: x & y,       "OR"   : lambda x, y: x | y,       "XOR"  : lambda x, y: x ^ y,
+         "NAND" : lambda x, y: 1 - (x & y), "NOR"  : lambda x, y: 1 - (x | y), "XNOR" : lambda x, y: 1 - (x ^ y)}
+
+async def run_client(client, requests, concurrency, inputs, latencies, errors):
+    '''requests evalBin calls, at most concurrency at a time ; inputs(i) -> (ct1, ct2, gate, check).'''
+    slots = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with slots:
+            ct1, ct2, gate, check = inputs(i)
+            start  = time.perf_counter()
+            result = await client.evalBin(ct1, ct2, gate)
+            latencies.append(time.perf_counter() - start)
+            if check is not None and not check(result):
+                errors.append(i)
+
+    await asyncio.gather(*[one(i) for i in range(requests)])
+
+async def load(address, n_clients, requests, concurrency, inputs):
+    '''Throughput and client-side latencies of n_clients connections, plus the server metrics.'''
+    latencies, errors = [], []
+    clients = [await GateClient.connect(**address) for _ in range(n_clients)]
+    start   = time.perf_counter()
+    await asyncio.gather(*[run_client(c, requests, concurrency, inputs(c.info), latencies, errors) for c in clients])
+    elapsed = time.perf_counter() - start
+    metrics = await clients[0].metrics()
+    for c in clients:
+        await c.close()
+
+    total = n_clients * requests
+    return {"requests"   : total, "seconds" : elapsed, "throughput" : total / elapsed,
+            "errors"     : len(errors),
+            "latency_ms" : percentiles(latencies),
+            "server"     : metrics}
+
+# ------------------------------------------------------------------- #
+
+def checked_inputs(fhew, s, pool_size = 64):
+    '''Encrypted random bits and gates, each result is decrypted with s and compared.'''
+    rng  = np.random.default_rng()
+    bits = rng.integers(0, 2, (pool_size, 2))
+    cts  = [(fhew.encrypt(int(x), s), fhew.encrypt(int(y), s)) for x, y in bits]
+
+    def inputs(info):
+        def make(i):
+            k, gate  = i % pool_size, GATES[rng.integers(len(GATES))]
+            expected = PLAIN[gate](*map(int, bits[k]))
+            return cts[k][0], cts[k][1], gate, lambda ct: fhew.decrypt(ct, s) == expected
+        return make
+    return inputs
+
+def random_inputs(info):
+    '''Uniform ciphertexts of unknown messages, for a server whose secret key is not known here.'''
+    rng  = np.random.default_rng()
+    n, q = info["n"], info["q"]
+    def make(i):
+        return (rng.integers(0, q, n), int(rng.integers(q))), (rng.integers(0, q, n), int(rng.integers(q))), \
+               GATES[i % len(GATES)], None
+    return make
+
+async def main(args):
+    kwargs = dict(n_clients=args.clients, requests=args.requests, concurrency=args.concurrency)
+    if args.connect:
+        host, _, port = args.connect.rpartition(":")
+        address       = dict(host=host, port=int(port)) if port.isdigit() else dict(path=args.connect)
+        return await load(address, inputs=random_inputs, **kwargs)
+
+    preset = PRESETS[args.preset]
+    N      = preset["N"]
+    fhew   = FHEW(preset["n"], 2 * N, N, preset["Q"](N), "Binary", 3.2, preset["B"], preset["B_ks"],
+                  method=args.method or preset["methods"][0], ks_modulus=preset["Q_ks"])
+    s, _   = fhew.keygen()
+
+    with tempfile.TemporaryDirectory(prefix="toyfhew-") as tmp:
+        path   = os.path.join(tmp, "gates.sock")
+        server = await GateServer(fhew, n_workers=args.workers, window=args.window_ms / 1e3,
+                                  max_batch=args.max_batch, max_queue=args.max_queue).start(path=path)
+        try:
+            result = await load(dict(path=path), inputs=checked_inputs(fhew, s), **kwargs)
+        finally:
+            await server.close()
+    result["config"] = {"preset" : args.preset, "method" : fhew.config["method"], "workers" : server.n_workers,
+                        "window_ms" : args.window_ms, "max_batch" : args.max_batch}
+    return result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load generator for the FHEW gate server.")
+    parser.add_argument("--connect",     help="external server, host:port or Unix socket path")
+    parser.add_argument("--preset",      default="toy", choices=list(PRESETS))
+    parser.add_argument("--method",      default=None, help="override the first method of the preset")
+    parser.add_argument("--clients",     type=int,   default=4)
+    parser.add_argument("--requests",    type=int,   default=64, help="evalBin requests per client")
+    parser.add_argument("--concurrency", type=int,   default=8,  help="requests in flight per client")
+    parser.add_argument("--workers",     type=int,   default=None, help="bootstrap processes, 0 = a server thread")
+    parser.add_argument("--window-ms",   type=float, default=2.)
+    parser.add_argument("--max-batch",   type=int,   default=64)
+    parser.add_argument("--max-queue",   type=int,   default=1024)
+    parser.add_argument("--json",        help="write the results to this file")
+    args = parser.parse_args()
+
+    result = asyncio.run(main(args))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+    lat = result["latency_ms"]
+    print(f"{result['requests']} gates in {result['seconds']:.3f} s : {result['throughput']:.1f} gates/s, "
+          f"{result['errors']} wrong result(s)")
+    print("latency (ms) : " + ", ".join(f"{k} {v:.2f}" for k, v in lat.items()))
+    print(f"server : mean batch {result['server']['mean_batch']:.1f}, {result['server']['batches']} batch(es)")
+    sys.exit(1 if result["errors"] else 0)
@@ -0,0 +1,34 @@
+# Ring multiplication : schoolbook negacyclic convolution vs. negacyclic NTT
+#
+#   $ cd Note && python -m note_include.benchmarks.ntt
+import time
+import numpy as np
+from note_include.elem.Ring  import Ring
+from note_include.utils.NTT  import find_ntt_prime, get_ntt
+
+def timeit(f, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        best  = min(best, time.perf_counter() - start)
+    return best
+
+def bench(N, bits=30, repeat=5):
+    Q  = find_ntt_prime(N, bits)
+    p1 = Ring(N, Q, np.random.randint(0, Q, N))
+    p2 = Ring(N, Q, np.random.randint(0, Q, N))
+
+    get_ntt(N, Q) # build twiddle tables outside the timed region
+
+    t_school = timeit(lambda: p1.nega_conv(p2), 1)
+    t_ntt    = timeit(lambda: p1 * p2, repeat)
+    assert np.array_equal((p1 * p2).coeffs, p1.nega_conv(p2).coeffs)
+
+    return Q, t_school, t_ntt
+
+if __name__ == "__main__":
+    print(f"{'N':>6} {'Q':>12} {'schoolbook (s)':>16} {'NTT (s)':>12} {'speedup':>10}")
+    for N in [256, 512, 1024, 2048]:
+        Q, t_school, t_ntt = bench(N)
+        print(f"{N:>6} {Q:>12} {t_school:>16.4f} {t_ntt:>12.6f} {t_school / t_ntt:>9.1f}x")
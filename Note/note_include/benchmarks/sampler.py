@@ -0,0 +1,51 @@
+# Sampler throughput : legacy global np.random draws vs. utils/sampler.py, in samples/s
+#
+#   $ cd Note && python -m note_include.benchmarks.sampler
+#
+# "bulk" draws k values in one call, "scalar" one value per call (one LWE error per
+# encryption), the pattern the pre-sampled buffers are for.
+import time
+import numpy as np
+from note_include.elem.LWE              import LWE
+from note_include.utils.sampler         import Sampler, using
+from note_include.utils.noise_generator import discrete_gaussian
+
+def rate(f, count, repeat = 3):
+    '''Best samples/s of f(), which draws count samples.'''
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        best  = min(best, time.perf_counter() - start)
+    return count / best
+
+def scalar_loop(draw, count):
+    def f():
+        for _ in range(count):
+            draw()
+    return f
+
+def bench(std = 3.2, bulk = 1 << 20, scalar = 1 << 15, n = 512, q = 2**14):
+    sampler = Sampler()
+    rows    = 4096
+    lwe     = LWE(n, q, "Binary", std)
+    sk      = lwe.keygen()
+    with using(sampler):
+        rows_new = rate(lambda: lwe.encrypt_batch(np.zeros(rows, dtype=np.int64), sk), rows)
+        ring_new = rate(lambda: discrete_gaussian(n, q, std=std), n)
+
+    return [("gaussian bulk",   rate(lambda: np.round(std * np.random.randn(bulk)), bulk),
+                                rate(lambda: sampler.gaussian(bulk, std), bulk)),
+            ("gaussian scalar", rate(scalar_loop(lambda: np.round(std * np.random.rand()), scalar), scalar),
+                                rate(scalar_loop(lambda: sampler.gaussian(1, std), scalar), scalar)),
+            ("uniform bulk",    rate(lambda: np.random.randint(0, q, bulk), bulk),
+                                rate(lambda: sampler.uniform(bulk, q), bulk)),
+            ("ternary bulk",    rate(lambda: np.random.randint(-1, 2, bulk), bulk),
+                                rate(lambda: sampler.ternary(bulk), bulk)),
+            ("gaussian Ring",   None, ring_new),
+            ("LWE rows (n=%d)" % n, None, rows_new)]
+
+if __name__ == "__main__":
+    print(f"{'samples/s':<20} {'np.random':>14} {'Sampler':>14}")
+    for name, legacy, new in bench():
+        print(f"{name:<20} {legacy if legacy else float('nan'):>14.3e} {new:>14.3e}")
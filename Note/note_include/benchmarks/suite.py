@@ -0,0 +1,197 @@
+# Benchmark suite : every layer of the bootstrapping pipeline on named parameter presets
+#
+#   $ cd Note && python -m note_include.benchmarks.suite                        # toy and small
+#   $ python -m note_include.benchmarks.suite --preset std128 --json std128.json
+#   $ python -m note_include.benchmarks.suite --preset std128 --baseline std128.json
+#
+# Every layer (keygen included) runs in a loop of at least 0.2 s (timeit.Timer.autorange),
+# --repeat times, in passes over all the layers of a preset : times are the fastest time
+# per call over those loops, in seconds (noise only adds time), and their spread (max - min
+# between loops) is recorded next to them. Results are flat "preset/layer" and
+# "preset/method/layer" keys, so a JSON file written with --json can be passed back as
+# --baseline : every key size that grew by more than --tolerance, and every timing that
+# grew by more than --tolerance and by more than the noise (--floor seconds, or the
+# spreads of both runs if larger), is reported as a regression and the exit status is 1.
+import argparse
+import json
+import platform
+import resource
+import sys
+import time
+from timeit import Timer
+import numpy as np
+from note_include.FHEW                       import FHEW, GATES
+from note_include.elem.Ring                  import Ring
+from note_include.utils.NTT                  import find_ntt_prime
+from note_include.utils.RNS                  import rns_modulus
+from note_include.utils.gadget_decomposition import gadget_decomposition
+
+# ------------------ Parameter presets ------------------ #
+#
+# q = 2N throughout (required by the blind rotations). std128 follows the shape of the
+# usual 128-bit FHEW sets (n = 512, N = 1024, 27-bit Q, Q_ks = 2^14); DM keys hold
+# n * B * d_g RGSW ciphertexts and are only practical on the toy preset.
+
+PRESETS = {
+    "toy"        : dict(n = 16,  N = 64,   Q = lambda N: find_ntt_prime(N, 20),  B = 2**5, B_ks = 2**5, Q_ks = None,
+                        methods = ("DM", "CGGI", "LMKCDEY")),
+    "small"      : dict(n = 64,  N = 256,  Q = lambda N: find_ntt_prime(N, 25),  B = 2**7, B_ks = 2**4, Q_ks = 2**16,
+                        methods = ("CGGI", "BlockCGGI", "LMKCDEY")),
+    "medium"     : dict(n = 256, N = 512,  Q = lambda N: find_ntt_prime(N, 27),  B = 2**7, B_ks = 2**5, Q_ks = 2**14,
+                        methods = ("CGGI", "LMKCDEY")),
+    "std128"     : dict(n = 512, N = 1024, Q = lambda N: find_ntt_prime(N, 27),  B = 2**7, B_ks = 2**5, Q_ks = 2**14,
+                        methods = ("CGGI", "LMKCDEY")),
+    "std128-rns" : dict(n = 512, N = 1024, Q = lambda N: rns_modulus(N, 27, 2),  B = 2**9, B_ks = 2**5, Q_ks = 2**14,
+                        methods = ("CGGI",)),
+}
+
+def timeit(layers, repeat):
+    '''
+        {key : (min, spread)} of the time of one call of f / per_call for layers {key : (f, per_call)}.
+        Each layer runs in a loop of at least 0.2 s (Timer.autorange). The repeat loops of a layer
+        are interleaved with the others, one pass over all of them at a time, so a slow phase of
+        the machine hits one sample of every layer rather than every sample of one layer.
+    '''
+    timers  = {key : (Timer(f), per_call) for key, (f, per_call) in layers.items()}
+    loops   = {key : timer.autorange()[0] for key, (timer, _) in timers.items()}
+    samples = {key : [] for key in layers}
+    for _ in range(repeat):
+        for key, (timer, per_call) in timers.items():
+            samples[key].append(timer.timeit(loops[key]) / (loops[key] * per_call))
+    return {key : (min(t), max(t) - min(t)) for key, t in samples.items()}
+
+def nbytes(keys):
+    '''Bytes held by a (nested list / tuple of) key array(s).'''
+    if isinstance(keys, np.ndarray):
+        return keys.nbytes
+    return sum(nbytes(k) for k in keys)
+
+def max_rss():
+    '''Peak resident set size of this process in bytes (ru_maxrss is in kB on Linux).'''
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+# ------------------------------------------------------- #
+
+def bench_ring(name, preset):
+    '''Method-independent layers : Ring multiplication, gadget decomposition, external product.'''
+    N, B = preset["N"], preset["B"]
+    Q    = preset["Q"](N)
+    fhew = FHEW(preset["n"], 2 * N, N, Q, "Binary", 3.2, B, preset["B_ks"], method="CGGI", ks_modulus=preset["Q_ks"])
+    p1   = Ring(N, Q, np.random.randint(0, Q, N))
+    p2   = Ring(N, Q, np.random.randint(0, Q, N))
+    sk   = Ring(N, Q, np.random.randint(0, 2, N))
+    rgsw = fhew.RGSW_CC.to_ntt(fhew.RGSW_CC.encrypt(Ring(N, Q, [1]), sk))
+    acc  = [p1, p2]
+
+    p1 * p2 # transform tables are built outside the timed region
+    return {f"{name}/ring_mul"             : (lambda: p1 * p2, 1),
+            f"{name}/gadget_decomposition" : (lambda: gadget_decomposition(p1, B, fhew.d_Q), 1),
+            f"{name}/rgsw_mult_rlwe"       : (lambda: fhew.RGSW_CC.mult_rlwe(acc, rgsw), 1)}
+
+def bench_method(name, preset, method):
+    '''
+        Layers keygen, the stages of evalBin, one evalBin per gate and evalBin_many (per gate),
+        and the key sizes. keygen is timed on a second context, the keys of the first stay valid.
+    '''
+    N    = preset["N"]
+    fhew, spare = (FHEW(preset["n"], 2 * N, N, preset["Q"](N), "Binary", 3.2, preset["B"], preset["B_ks"],
+                        method=method, ks_modulus=preset["Q_ks"]) for _ in range(2))
+    key  = f"{name}/{method}"
+
+    s, _      = fhew.keygen()
+
+    c1, c2    = fhew.encrypt(1, s), fhew.encrypt(0, s)
+    operand   = fhew.LWE_CC.add(c1, c2)
+    acc       = fhew.acc_init(operand, "AND")
+    rotated   = fhew.method.Blindrotation(operand, acc, fhew.brk)
+    extracted = fhew.LWEextract(rotated)
+    ks_input  = fhew.ModSwitch(extracted, fhew.Q, fhew.Q_ks)
+
+    layers = {f"{key}/keygen"        : (spare.keygen, 1),
+              f"{key}/acc_init"      : (lambda: fhew.acc_init(operand, "AND"), 1),
+              f"{key}/blindrotation" : (lambda: fhew.method.Blindrotation(operand, acc, fhew.brk), 1),
+              f"{key}/lwe_extract"   : (lambda: fhew.LWEextract(rotated), 1),
+              f"{key}/keyswitch"     : (lambda: fhew.KeySwitch(ks_input), 1)}
+    for gate in GATES:
+        layers[f"{key}/evalBin/{gate}"] = (lambda gate=gate: fhew.evalBin(c1, c2, gate), 1)
+    layers[f"{key}/evalBin_many"] = (lambda: fhew.evalBin_many([(c1, c2)] * len(GATES), GATES), len(GATES))
+
+    memory = {f"{key}/brk_bytes" : nbytes(fhew.brk),
+              f"{key}/ksk_bytes" : nbytes(fhew.ksk),
+              f"{key}/max_rss"   : max_rss()}
+    return layers, memory
+
+def run(presets, methods = None, repeat = 5, log = print):
+    result = {"meta"    : {"python" : platform.python_version(), "numpy" : np.__version__,
+                           "machine" : platform.machine(), "platform" : platform.platform(),
+                           "date" : time.strftime("%Y-%m-%dT%H:%M:%S"), "repeat" : repeat},
+              "timings" : {}, "spread" : {}, "memory" : {}}
+
+    for name in presets:
+        preset = PRESETS[name]
+        layers = bench_ring(name, preset)
+        for method in (methods or preset["methods"]):
+            log(f"{name}/{method} ...")
+            method_layers, memory = bench_method(name, preset, method)
+            layers.update(method_layers)
+            result["memory"].update(memory)
+        log(f"{name} : timing {len(layers)} layers ...")
+        for key, (best, spread) in timeit(layers, repeat).items():
+            result["timings"][key], result["spread"][key] = best, spread
+    return result
+
+def compare(result, baseline, tolerance, floor = 50e-6):
+    '''
+        (key, new, old, ratio) for every timing / key size present in both, and the regressions.
+        A timing regresses when it is more than tolerance slower and the slowdown also exceeds
+        the noise : floor seconds, or the spreads of both runs when they are larger.
+    '''
+    rows, regressions = [], []
+    for section in ("timings", "memory"):
+        for key, new in result[section].items():
+            old = baseline.get(section, {}).get(key)
+            if not old or key.endswith("max_rss"): continue # peak RSS is process-wide, not per layer
+            rows.append((key, new, old, new / old))
+            noise = 0 if section == "memory" else \
+                    max(floor, result["spread"].get(key, 0) + baseline.get("spread", {}).get(key, 0))
+            if new / old > 1 + tolerance and new - old > noise:
+                regressions.append(key)
+    return rows, regressions
+
+def report(result, rows = None):
+    if rows is None:
+        for key, value in result["timings"].items():
+            print(f"{key:<40} {value:>14.6g} s")
+        for key, value in result["memory"].items():
+            print(f"{key:<40} {value:>14d} B")
+        return
+    print(f"{'benchmark':<40} {'new':>12} {'baseline':>12} {'ratio':>8}")
+    for key, new, old, ratio in rows:
+        print(f"{key:<40} {new:>12.6g} {old:>12.6g} {ratio:>7.2f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks of the FHEW bootstrapping pipeline.")
+    parser.add_argument("--preset",    nargs="+", default=["toy", "small"], choices=list(PRESETS))
+    parser.add_argument("--method",    nargs="+", default=None, help="override the methods of the presets")
+    parser.add_argument("--repeat",    type=int,   default=5)
+    parser.add_argument("--json",      help="write the results to this file")
+    parser.add_argument("--baseline",  help="compare against results written earlier with --json")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown before a regression, 0.25 = 25%%")
+    parser.add_argument("--floor",     type=float, default=50e-6, help="slowdowns below this many seconds are noise")
+    args = parser.parse_args()
+
+    result = run(args.preset, args.method, args.repeat, log=lambda msg: print(msg, file=sys.stderr))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+
+    if args.baseline is None:
+        report(result)
+    else:
+        with open(args.baseline) as f:
+            rows, regressions = compare(result, json.load(f), args.tolerance, args.floor)
+        report(result, rows)
+        if regressions:
+            print(f"{len(regressions)} regression(s) above {args.tolerance:.0%} :", ", ".join(regressions))
+            sys.exit(1)
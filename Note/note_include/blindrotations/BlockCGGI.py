@@ -0,0 +1,104 @@
+import numpy as np
+from note_include.elem.Ring   import Ring, coeff_dtype, mul_monomial
+from note_include.elem.RLWE   import RLWE
+from note_include.elem.RGSW   import RGSW
+from note_include.utils.NTT   import get_ntt
+from note_include.utils.RNS   import get_rns
+from note_include.blindrotations.CGGI import generate_rgsw_keys
+from note_include.parallel    import generate_keys
+from note_include.utils.types import RLWEctxt, LWEctxt
+
+# Block-binary (unrolled) CGGI
+#
+# The binary key is cut into blocks of k bits. For a block with bits s_j and the
+# indicator of each nonempty subset U of the block,
+#     chi_U = prod_{j in U} s_j * prod_{j not in U} (1 - s_j)     (1 iff the ones are exactly U)
+# the key holds RGSW(chi_U), and since exactly one chi_U (U possibly empty) is 1,
+#     X^{-sum_j a_j s_j} = 1 + sum_{U != 0} (X^{-a_U} - 1) chi_U,     a_U = sum_{j in U} a_j.
+# So the block key K = sum_U (X^{-a_U} - 1) RGSW(chi_U) is assembled with 2^k - 1 cheap
+# monomial products, and a block costs ONE external product : acc <- acc + acc * K.
+# CGGI needs k sequential external products for the same k bits.
+
+class BlockCGGI:
+    def __init__(self, lwe_dimension, lwe_modulus, dimension, modulus, s_std, e_std, base_gd, block_size = 2):
+        assert lwe_modulus == dimension * 2
+        assert block_size >= 1
+        self.n        = lwe_dimension
+        self.q        = lwe_modulus
+        self.N        = dimension
+        self.Q        = modulus
+        self.s_std    = s_std
+        self.e_std    = e_std
+        self.B        = base_gd
+        self.k        = block_size
+        self.blocks   = -(-lwe_dimension // block_size) # the last block is padded with s_j = 0, a_j = 0
+        self.d_Q      = int(np.ceil(np.log(modulus) / np.log(base_gd))) # RGSW gadget digits mod Q
+
+        self.RLWE_CC  = RLWE (dimension, modulus, s_std, e_std)
+        self.RGSW_CC  = RGSW (dimension, modulus, s_std, e_std, base_gd, self.d_Q)
+
+        # subset u (bit j of u set <=> j in U) -> its members, for u = 1 .. 2^k - 1
+        self.subsets  = [[j for j in range(block_size) if u >> j & 1] for u in range(1, 2**block_size)]
+
+    # -------------------------------- KeyGen ---------------------------- #
+
+    def keygen(self, s:list[int], s_ring:Ring, seed:int = None, n_workers:int = None):
+        brk = self.BRKgen(s, s_ring, seed, n_workers) # Blind rotation key generation.
+        return brk
+
+    def BRKgen(self, s:list[int], s_ring:Ring, seed:int = None, n_workers:int = None) -> np.ndarray:
+        '''
+            (blocks, 2^k - 1, 2, d, 2, N) tensor : brk[t][u-1] = RGSW(chi_U) for block t,
+            in the evaluation domain if Q is NTT-friendly ((blocks, 2^k - 1, L, 2, d, 2, N) for RNS).
+        '''
+        s            = np.concatenate([np.asarray(s, dtype=np.int64) % 2, np.zeros(self.blocks * self.k - self.n, dtype=np.int64)])
+        chi          = [int(all(s[t * self.k + j] == (j in members) for j in range(self.k)))
+                        for t in range(self.blocks) for members in self.subsets]
+        shape, dtype = self.RGSW_CC.key_layout()
+        brk          = generate_keys(generate_rgsw_keys, (self.RGSW_CC, s_ring, chi, seed), len(chi), shape, dtype, n_workers)
+        return brk.reshape((self.blocks, len(self.subsets)) + shape)
+
+    # ------------------------------------------------------------------- #
+
+    def block_key(self, a_block:list[int], keys:np.ndarray) -> np.ndarray:
+        '''K = sum_U (X^{-a_U} - 1) RGSW(chi_U), a (2, d, 2, N) tensor in the domain of keys.'''
+        Q      = self.Q
+        ntt    = get_ntt(self.N, Q)
+        rns    = get_rns(self.N, Q)
+        powers = [-sum(a_block[j] for j in members) % (2 * self.N) for members in self.subsets]
+        used   = [u for u, p in enumerate(powers) if p != 0] # X^0 - 1 = 0
+
+        if ntt is not None: # pointwise products with the evaluations of X^{-a_U} - 1
+            mono_hat = (np.array([ntt.monomial(powers[u]) for u in used]) - 1) % Q
+            return np.sum(mono_hat[:, None, None, None, :] * keys[used] % Q, axis=0) % Q
+
+        if rns is not None: # the same, limb by limb
+            K = np.empty(keys.shape[1:], dtype=np.int64)
+            for l, (ntt_l, p) in enumerate(zip(rns.ntts, rns.primes)):
+                mono_hat = (np.array([ntt_l.monomial(powers[u]) for u in used]) - 1) % p
+                K[l]     = np.sum(mono_hat[:, None, None, None, :] * keys[used, l] % p, axis=0) % p
+            return K
+
+        K = np.zeros(keys.shape[1:], dtype=coeff_dtype(Q))
+        for u in used:
+            K += mul_monomial(keys[u], powers[u], Q) - keys[u]
+        return K % Q
+
+    def skipped_products(self, a:list[int]) -> int:
+        '''External products Blindrotation saves on a : one per all-zero block.'''
+        a = np.concatenate([np.asarray(a, dtype=np.int64) % self.q, np.zeros(self.blocks * self.k - self.n, dtype=np.int64)])
+        return int(np.count_nonzero(~a.reshape(self.blocks, self.k).any(axis=1)))
+
+    def Blindrotation(self, ctxt_operand:LWEctxt, acc:RLWEctxt, brk:np.ndarray) -> RLWEctxt:
+        a,_ = ctxt_operand
+        a   = [int(_a) % self.q for _a in a] + [0] * (self.blocks * self.k - self.n)
+
+        # Blind rotation, one external product per block
+        for t in range(self.blocks):
+            a_block = a[t * self.k:(t + 1) * self.k]
+            if not any(a_block): continue
+
+            K   = self.block_key(a_block, brk[t])
+            acc = self.RLWE_CC.iadd_ctxt_ctxt(self.RGSW_CC.mult_rlwe(acc, K), acc)
+
+        return acc
@@ -1,11 +1,11 @@
 import numpy as np
-from note_include.elem.Ring   import Ring
+from note_include.elem.Ring   import Ring, mul_monomials
 from note_include.elem.LWE    import LWE
 from note_include.elem.RLWE   import RLWE
 from note_include.elem.RLWEp  import RLWEp
 from note_include.elem.RGSW   import RGSW
 from note_include.utils.types import RGSWctxt, RLWEctxt, RLWEpctxt, LWEctxt
-from joblib import Parallel, delayed
+from note_include.parallel    import generate_keys
 
 class CGGI:
     def __init__(self, lwe_dimension, lwe_modulus, dimension, modulus, s_std, e_std, base_gd):
@@ -18,55 +18,71 @@ class CGGI:
         self.e_std    = e_std
         self.B        = base_gd
         self.d_g      = int(np.ceil(np.log(lwe_modulus) / np.log(base_gd)))
+        self.d_Q      = int(np.ceil(np.log(modulus)     / np.log(base_gd))) # RGSW gadget digits mod Q
 
         self.RLWE_CC  = RLWE (dimension,     modulus,     s_std, e_std)
-        self.RGSW_CC  = RGSW (dimension, modulus, s_std, e_std, base_gd, self.d_g)
+        self.RGSW_CC  = RGSW (dimension, modulus, s_std, e_std, base_gd, self.d_Q)
 
     # -------------------------------- KeyGen ---------------------------- #
 
-    def keygen(self, s:list[int], s_ring:Ring):
-        brk = self.BRKgen(s, s_ring) # Blind rotation key generation.
+    def keygen(self, s:list[int], s_ring:Ring, seed:int = None, n_workers:int = None):
+        brk = self.BRKgen(s, s_ring, seed, n_workers) # Blind rotation key generation.
         return brk
     
-    def BRKgen(self, s:list[int], s_ring:Ring) -> list[RGSWctxt]: # RGSW(X^{-s_i}) for i \in [0, n)
-        brk = []
-        for _s in s:
-            monomial = np.zeros(self.N)
-            monomial[0] = _s
-            monomial = Ring(self.N, self.Q, monomial)
-            brk.append(self.RGSW_CC.encrypt(monomial, s_ring))
-        return brk
+    def BRKgen(self, s:list[int], s_ring:Ring, seed:int = None, n_workers:int = None) -> np.ndarray: # RGSW(X^{-s_i}) for i \in [0, n)
+        '''
+            (n, 2, d_Q, 2, N) tensor ((n, L, 2, d_Q, 2, N) for RNS), generated by parallel.generate_keys.
+            With a seed, brk[i] uses the mask rows [2 d_Q i, 2 d_Q (i + 1)).
+        '''
+        shape, dtype = self.RGSW_CC.key_layout()
+        context      = (self.RGSW_CC, s_ring, [int(_s) for _s in s], seed)
+        return generate_keys(generate_rgsw_keys, context, len(s), shape, dtype, n_workers)
     
+    def skipped_products(self, a:list[int]) -> int:
+        '''External products Blindrotation saves on a : one per zero coefficient.'''
+        return int(np.count_nonzero(np.asarray(a) % self.q == 0))
+
     def Blindrotation(self, ctxt_operand:LWEctxt, acc:RLWEctxt, brk:list[RGSWctxt]) -> RLWEctxt:
         a,_ = ctxt_operand
-        N   = int(self.N)        
 
-        # Blind rotation
+        # Blind rotation : acc <- acc + (X^{-a_i} - 1) * (acc x RGSW(s_i))
         for i, _a in enumerate(a):
+            _a = int(_a) % self.q
             if(_a == 0):continue
-            monomial = np.zeros(self.N)
 
-            reduced = False
-            if _a >= self.N:
-                _a -= self.N
-                reduced = True
+            tmp = self.RGSW_CC.mult_rlwe(acc, brk[i])
+            tmp = self.RLWE_CC.mul_monomial_minus_one(tmp, -_a)
+            acc = self.RLWE_CC.iadd_ctxt_ctxt(tmp, acc)
 
-            if _a == 0 and reduced == True:
-                monomial[0]    = -2
-            elif _a == 0 and reduced == False:
-                continue
-            elif reduced == True:           
-                monomial[N-_a] =  1
-                monomial[0]    = -1            
-            elif reduced == False:          
-                monomial[N-_a] = -1
-                monomial[0]    = -1
+        return acc
 
-            monomial     = Ring(self.N, self.Q, monomial)
-            tmp = acc
-            acc = self.RGSW_CC.mult_rlwe(acc, brk[i])
-            acc = self.RLWE_CC.mult_ring_ptxt(acc, monomial)
-            acc = self.RLWE_CC.add_ctxt_ctxt(tmp, acc)
+    def Blindrotation_batch(self, ctxt_operands:list[LWEctxt], accs:np.ndarray, brk:list[RGSWctxt]) -> np.ndarray:
+        '''
+            Blindrotation of k operands at once on (k, 2, N) coefficient-domain accumulators :
+            brk[i] is read once and applied to every accumulator with a_i != 0.
+        '''
+        A    = np.array([np.asarray(a, dtype=np.int64) % self.q for a, _ in ctxt_operands]) # (k, n)
+        accs = np.array(accs, dtype=np.int64)
 
-        return acc
-    
\ No newline at end of file
+        for i in range(A.shape[1]):
+            rows = np.nonzero(A[:, i])[0]
+            if not len(rows): continue
+
+            tmp         = self.RGSW_CC.external_product_batch(accs[rows], brk[i])
+            accs[rows] += mul_monomials(tmp, -A[rows, i], self.Q) - tmp # (X^{-a_i} - 1) * product
+            accs[rows] %= self.Q
+
+        return accs
+
+# -------------------------------- Blind rotation key generation : parallel ---------------------------- #
+def generate_rgsw_keys(context, start, stop) -> np.ndarray:
+    '''brk[start:stop], brk[i] = RGSW(s_i) with the s_i as constant polynomials.'''
+    RGSW_CC, s_ring, s, seed = context
+    keys = []
+    for i in range(start, stop):
+        rgsw = RGSW_CC.encrypt(Ring(RGSW_CC.n, RGSW_CC.q, [s[i]]), s_ring, seed, i * 2 * RGSW_CC.d)
+
+        # Keep the keys as (2, d, 2, N) tensors for the fused external product,
+        # in the evaluation domain if Q is NTT-friendly (transformed only once here).
+        keys.append(RGSW_CC.to_key(rgsw))
+    return np.stack(keys)
@@ -1,12 +1,13 @@
 import numpy as np
-from note_include.elem.Ring   import Ring
+from note_include.elem.Ring   import Ring, mul_monomials
 from note_include.elem.LWE    import LWE
 from note_include.elem.RLWE   import RLWE
 from note_include.elem.RLWEp  import RLWEp
 from note_include.elem.RGSW   import RGSW
+from note_include.utils.gadget_decomposition import max_digit, signed_digits
 from note_include.utils.types import RGSWctxt, RLWEctxt, RLWEpctxt, LWEctxt
 # from note_include.FHEW        import FHEW
-from joblib import Parallel, delayed
+from note_include.parallel    import generate_keys
 
 class DM:
     # Method -> DM, CGGI, LMKCDEY
@@ -19,14 +20,22 @@ class DM:
         self.s_std    = s_std
         self.e_std    = e_std
         self.B        = base_gd
-        self.d_g      = int(np.ceil(np.log(lwe_modulus) / np.log(base_gd)))
+        self.d_g      = int(np.ceil(np.log(lwe_modulus) / np.log(base_gd))) # digits of a_i mod q
+        self.d_Q      = int(np.ceil(np.log(modulus)     / np.log(base_gd))) # RGSW gadget digits mod Q
 
-        self.RGSW_CC  = RGSW (dimension, modulus, s_std, e_std, base_gd, self.d_g)
+        self.RLWE_CC  = RLWE (dimension, modulus, s_std, e_std)
+        self.RGSW_CC  = RGSW (dimension, modulus, s_std, e_std, base_gd, self.d_Q)
+
+        # signed digits v of a_i (|v| <= ceil(B/2)) -> slot of RGSW(X^{-v B^j s_i}) in brk[i][.][j].
+        # A binary s only needs v > 0 : Blindrotation derives the negative digits (see there).
+        c             = max_digit(base_gd)
+        self.values   = list(range(1, c + 1)) if s_std == "Binary" else [v for v in range(-c, c + 1) if v != 0]
+        self.slot     = {v : k for k, v in enumerate(self.values)}
 
     # -------------------------------- KeyGen ---------------------------- #
 
-    def keygen(self, s:list[int], s_ring:Ring):
-        brk = self.BRKgen_parallel(s, s_ring) # Blind rotation key generation.
+    def keygen(self, s:list[int], s_ring:Ring, seed:int = None, n_workers:int = None):
+        brk = self.BRKgen_parallel(s, s_ring, seed, n_workers) # Blind rotation key generation. (evaluation domain if Q is NTT-friendly)
         return brk
 
     # # Its too slow, not used. # It has a little bit of problems.
@@ -46,65 +55,87 @@ class DM:
     #         brk.append(matrix)
     #     return brk
 
-    def BRKgen_parallel(self, s:list[int], s_ring:Ring):
-        return Parallel(n_jobs=-1)(
-            delayed(generate_rgsw_matrix)(_s, self.B, self.d_g, self.q, self.N, self.Q, self.RGSW_CC, s_ring)
-            for _s in s
-        )
+    def BRKgen_parallel(self, s:list[int], s_ring:Ring, seed:int = None, n_workers:int = None) -> np.ndarray:
+        '''
+            (n, len(values), d_g, 2, d_Q, 2, N) tensor, brk[i][k][j] = RGSW(X^{-values[k] B^j s_i})
+            ((n, len(values), d_g, L, 2, d_Q, 2, N) for RNS). The leaves are one flat work queue of
+            parallel.generate_keys. With a seed, brk[i][k][j] uses the mask rows of the flattened
+            (n, len(values), d_g, 2, d_Q) key layout.
+        '''
+        shape, dtype = self.RGSW_CC.key_layout()
+        context      = (self.RGSW_CC, s_ring, [int(_s) for _s in s], self.values, self.B, self.d_g, self.q, seed)
+        brk          = generate_keys(generate_rgsw_leaves, context, len(s) * len(self.values) * self.d_g, shape, dtype, n_workers)
+        return brk.reshape(len(s), len(self.values), self.d_g, *shape)
     
+    def skipped_products(self, a:list[int]) -> int:
+        '''External products Blindrotation saves on a : one per zero signed digit.'''
+        digits = signed_digits(np.asarray(a, dtype=np.int64), self.B, self.d_g, self.q)
+        return int(np.count_nonzero(digits == 0))
+
     def Blindrotation(self, ctxt_operand:LWEctxt, acc:RLWEctxt, brk:list[list[RGSWctxt]]) -> RLWEctxt:
-        a,_ = ctxt_operand
-        
+        '''
+            acc <- acc * X^{-v B^j s_i} for every signed digit v of every a_i. With a binary s
+            and c = -v B^j > 0 (v < 0), X^{c s} = 1 + X^c - X^c X^{-c s}, so the product with
+            RGSW(X^{-c s}) = brk[i][slot[-v]][j] gives acc + X^{c+N} (acc * X^{-c s} - acc) at the
+            noise of one external product.
+        '''
+        a,_    = ctxt_operand
+        digits = signed_digits(np.asarray(a, dtype=np.int64), self.B, self.d_g, self.q) # (d_g, n)
+
         # Blind rotation
-        for i, _a in enumerate(a):
-            if(_a == 0):continue
-            for j in range(self.d_g):
-                v = _a % self.B
-                _a = _a // self.B
+        out = None # the first product allocates the accumulator, the next ones overwrite it
+        for i, j in zip(*np.nonzero(digits.T)):
+            v = int(digits[j, i])
+            if v in self.slot:
+                acc = out = self.RGSW_CC.mult_rlwe(acc, brk[i][self.slot[v]][j], out)
+                continue
 
-                acc = self.RGSW_CC.mult_rlwe(acc, brk[i][v][j])
+            prod = self.RGSW_CC.mult_rlwe(acc, brk[i][self.slot[-v]][j])
+            prod[0].isub(acc[0])
+            prod[1].isub(acc[1])
+            acc  = out = self.RLWE_CC.iadd_ctxt_ctxt(self.RLWE_CC.mul_monomial(prod, -v * self.B**int(j) + self.N), acc)
 
         return acc
 
+    def Blindrotation_batch(self, ctxt_operands:list[LWEctxt], accs:np.ndarray, brk:list[list[RGSWctxt]]) -> np.ndarray:
+        '''
+            Blindrotation of k operands at once on (k, 2, N) coefficient-domain accumulators :
+            every brk[i][slot][j] is read once and applied to all the accumulators whose digit
+            selects it (both signs of a magnitude for a binary s, as in Blindrotation).
+        '''
+        A      = np.array([np.asarray(a, dtype=np.int64) for a, _ in ctxt_operands])      # (k, n)
+        digits = signed_digits(A, self.B, self.d_g, self.q)                              # (d_g, k, n)
+        accs   = np.array(accs, dtype=np.int64)
+        binary = self.s_std == "Binary"
+
+        for i in range(A.shape[1]):
+            for j in range(self.d_g):
+                v    = digits[j, :, i]
+                keys = np.abs(v) if binary else v # key value selected by each accumulator
+                for m in np.unique(keys[v != 0]):
+                    rows = np.nonzero(keys == m)[0]
+                    prod = self.RGSW_CC.external_product_batch(accs[rows], brk[i][self.slot[int(m)]][j])
+                    neg  = v[rows] < 0
+                    accs[rows[~neg]] = prod[~neg]
+                    if neg.any(): # acc + X^{c+N} (acc * X^{-c s} - acc), c = -v B^j
+                        r       = rows[neg]
+                        accs[r] = (accs[r] + mul_monomials(prod[neg] - accs[r], -v[r] * self.B**j + self.N, self.Q)) % self.Q
+
+        return accs
+
 # -------------------------------- Blind rotation key generation : parallel ---------------------------- #
-def generate_rgsw_row(v, B, d_g, _s, q, N, Q, RGSW_CC, s_ring):
-    row = []
-    for j in range(d_g):
-        _as = int((v * (B**j) * _s) % q)
-
-        reduced = False
-        if (_as >= N) :
-            _as -= N
-            reduced = True
-
-        if _as == 0 and reduced == True:
-            monomial = np.zeros(N)
-            monomial[0] = -1
-            monomial = Ring(N, Q, monomial)
-            row.append(RGSW_CC.encrypt(monomial, s_ring))
-            continue
-
-        elif _as == 0 and reduced == False:
-            monomial = np.zeros(N)
-            monomial[0] = 1
-            monomial = Ring(N, Q, monomial)
-            row.append(RGSW_CC.encrypt(monomial, s_ring))
-            continue
-
-        if reduced == False:
-            monomial = np.zeros(N)
-            monomial[(N)-(_as)] = -1
-            monomial = Ring(N, Q, monomial)
-        else:
-            monomial = np.zeros(N)
-            monomial[(N)-(_as)] = 1
-            monomial = Ring(N, Q, monomial)
-
-        row.append(RGSW_CC.encrypt(monomial, s_ring))
-    return row
-
-def generate_rgsw_matrix(_s, B, d_g, q, N, Q, RGSW_CC, s_ring):
-    return Parallel(n_jobs=-1)(
-        delayed(generate_rgsw_row)(v, B, d_g, _s, q, N, Q, RGSW_CC, s_ring)
-        for v in range(B)
-    )
\ No newline at end of file
+def generate_rgsw_leaves(context, start, stop) -> np.ndarray:
+    '''Leaves [start, stop) of the flattened (n, len(values), d_g) key, leaf (i, k, j) = RGSW(X^{-values[k] B^j s_i}).'''
+    RGSW_CC, s_ring, s, values, B, d_g, q, seed = context
+    N, Q   = RGSW_CC.n, RGSW_CC.q
+    leaves = []
+    for leaf in range(start, stop):
+        i, k, j  = np.unravel_index(leaf, (len(s), len(values), d_g))
+        _as      = int((values[k] * B**int(j) * s[i]) % q)
+        monomial = Ring(N, Q, [1]).mul_monomial(-_as) # X^{-v B^j s}
+        rgsw     = RGSW_CC.encrypt(monomial, s_ring, seed, leaf * 2 * RGSW_CC.d)
+
+        # Keep the keys as (2, d, 2, N) tensors for the fused external product,
+        # in the evaluation domain if Q is NTT-friendly (transformed only once here).
+        leaves.append(RGSW_CC.to_key(rgsw))
+    return np.stack(leaves)
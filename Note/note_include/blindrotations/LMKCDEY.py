@@ -0,0 +1,152 @@
+import numpy as np
+from note_include.elem.Ring   import Ring
+from note_include.elem.RLWE   import RLWE
+from note_include.elem.RLWEp  import RLWEp
+from note_include.elem.RGSW   import RGSW
+from note_include.utils.RNS   import get_transform
+from note_include.parallel    import generate_keys
+from note_include.utils.types import RLWEctxt, RLWEpctxt, LWEctxt
+
+# Automorphism-based blind rotation (Lee, Micciancio, Kim, Choi, Deryabin, Eom, Yoo)
+#
+# Z_2N^* = {+-g^k : 0 <= k < N/2} for g = 5, so every odd a_i is +-g^k_i. The key is one
+# RGSW(X^{s_i}) per LWE key coefficient (any small secret, e.g. the Binary and Gaussian keys)
+# plus the automorphism keys of psi_t : X -> X^t. With I_k^{+-} = {i : a_i = +-g^k},
+#
+#   for k = N/2-1 .. 1 : acc <- acc * prod_{i in I_k^+} RGSW(X^{s_i}),  acc <- psi_g(acc)
+#   acc <- acc * prod_{i in I_0^+} RGSW(X^{s_i}),  acc <- psi_{-g}(acc)
+#   for k = N/2-1 .. 1 : acc <- acc * prod_{i in I_k^-} RGSW(X^{s_i}),  acc <- psi_g(acc)
+#   acc <- acc * prod_{i in I_0^-} RGSW(X^{s_i})
+#
+# turns acc = RLWE(m) into RLWE(psi_{-g^{-1}}(m) * X^{-sum a_i s_i}). The message side is
+# undone in advance : FHEW rotates psi_{acc_power}(tv) by acc_power * b, acc_power = -g.
+# An even a_i is split into (a_i - 1) + 1, both odd, at the price of one more external
+# product. Runs of empty levels apply psi_{g^w} at once for w up to `window`.
+
+class LMKCDEY:
+    def __init__(self, lwe_dimension, lwe_modulus, dimension, modulus, s_std, e_std, base_gd, window = 10):
+        assert lwe_modulus == dimension * 2
+        self.n        = lwe_dimension
+        self.q        = lwe_modulus
+        self.N        = dimension
+        self.Q        = modulus
+        self.s_std    = s_std
+        self.e_std    = e_std
+        self.B        = base_gd
+        self.d_Q      = int(np.ceil(np.log(modulus) / np.log(base_gd))) # RGSW / key-switching gadget digits mod Q
+        self.g        = 5
+        self.window   = max(1, min(window, dimension // 2 - 1))
+
+        self.RLWE_CC  = RLWE (dimension, modulus, s_std, e_std)
+        self.RLWEp_CC = RLWEp(dimension, modulus, s_std, e_std, base_gd, self.d_Q)
+        self.RGSW_CC  = RGSW (dimension, modulus, s_std, e_std, base_gd, self.d_Q)
+
+        # automorphism key k switches psi_{auto_powers[k]}(z) back to z
+        two_N            = 2 * dimension
+        self.auto_powers = [pow(self.g, w, two_N) for w in range(1, self.window + 1)] + [(-self.g) % two_N]
+        self.acc_power   = (-self.g) % two_N
+
+        # discrete logarithm of the odd residues mod 2N : a = sign * g^k
+        self.log_k    = np.zeros(two_N, dtype=np.int64)
+        self.log_sign = np.zeros(two_N, dtype=np.int64)
+        for k in range(dimension // 2):
+            gk = pow(self.g, k, two_N)
+            self.log_k[gk],            self.log_sign[gk]            = k,  1
+            self.log_k[(-gk) % two_N], self.log_sign[(-gk) % two_N] = k, -1
+
+    # -------------------------------- KeyGen ---------------------------- #
+
+    def keygen(self, s:list[int], s_ring:Ring, seed:int = None, n_workers:int = None):
+        '''
+            brk = (RGSW keys, automorphism keys) : an (n, 2, d, 2, N) and a (window + 1, d, 2, N)
+            array, in the evaluation domain if Q is NTT-friendly.
+            With a seed, automorphism key k uses the mask rows after the RGSW keys.
+        '''
+        return self.BRKgen(s, s_ring, seed, n_workers), self.AKgen(s_ring, seed, len(s) * 2 * self.d_Q)
+
+    def BRKgen(self, s:list[int], s_ring:Ring, seed:int = None, n_workers:int = None) -> np.ndarray: # RGSW(X^{s_i}) for i \in [0, n)
+        shape, dtype = self.RGSW_CC.key_layout()
+        context      = (self.RGSW_CC, s_ring, [int(_s) for _s in s], seed)
+        return generate_keys(generate_rgsw_monomials, context, len(s), shape, dtype, n_workers)
+
+    def AKgen(self, s_ring:Ring, seed:int = None, index:int = 0) -> np.ndarray: # RLWE'_z(psi_t(z)) for t in auto_powers
+        ntt  = get_transform(self.N, self.Q)
+        keys = []
+        for k, t in enumerate(self.auto_powers):
+            ak = self.RLWEp_CC.encrypt(s_ring.automorphism(t), s_ring, seed, index + k * self.d_Q)
+            keys.append(self.RLWEp_CC.to_ntt(ak) if ntt is not None else self.RLWEp_CC.to_array(ak))
+        return np.stack(keys)
+
+    # ------------------------------------------------------------------- #
+
+    # --------------------------- Automorphism --------------------------- #
+
+    def automorphism(self, acc:RLWEctxt, t:int, akey:RLWEpctxt) -> RLWEctxt:
+        '''
+            RLWE_z(m) -> RLWE_z(psi_t(m)) : (psi_t(a), psi_t(b)) is an encryption under psi_t(z),
+            (c0, c1) ~ RLWE_z(psi_t(a) * psi_t(z)) from the key gives (-c0, psi_t(b) - c1).
+        '''
+        a, b = acc
+        if get_transform(self.N, self.Q) is not None:
+            c0, c1 = self.RLWEp_CC.mult_poly_ntt(akey, a.automorphism(t))
+        else:
+            c0, c1 = self.RLWEp_CC.mult_poly(self.RLWEp_CC.from_array(akey), a.automorphism(t))
+        return [c0.imul_scalar(-1), b.automorphism(t).isub(c1)]
+
+    def rotate(self, acc:RLWEctxt, w:int, akeys:np.ndarray) -> RLWEctxt:
+        '''psi_{g^w}, as windows of at most self.window powers.'''
+        while w > 0:
+            step = min(w, self.window)
+            acc  = self.automorphism(acc, self.auto_powers[step - 1], akeys[step - 1])
+            w   -= step
+        return acc
+
+    # ------------------------------------------------------------------- #
+
+    def skipped_products(self, a:list[int]) -> int:
+        '''External products Blindrotation saves on a : one per zero coefficient.'''
+        return int(np.count_nonzero(np.asarray(a) % self.q == 0))
+
+    def Blindrotation(self, ctxt_operand:LWEctxt, acc:RLWEctxt, brk) -> RLWEctxt:
+        a,_         = ctxt_operand
+        rgsw, akeys = brk
+        half        = self.N // 2
+
+        # I_k^+ and I_k^- of the header, even a_i contribute a_i - 1 and 1 = g^0
+        levels = {1 : [[] for _ in range(half)], -1 : [[] for _ in range(half)]}
+        for i, _a in enumerate(a):
+            _a = int(_a) % self.q
+            if _a == 0: continue
+            if _a % 2 == 0:
+                levels[1][0].append(i)
+                _a -= 1
+            levels[int(self.log_sign[_a])][int(self.log_k[_a])].append(i)
+
+        out = None # accumulator owned by this call, reused by the external products
+        for sign in (1, -1):
+            if sign == -1:
+                acc = out = self.automorphism(acc, self.auto_powers[-1], akeys[-1])
+
+            skipped = 0
+            for k in range(half - 1, -1, -1):
+                if levels[sign][k]:
+                    if skipped:
+                        acc = out = self.rotate(acc, skipped, akeys)
+                        skipped = 0
+                    for i in levels[sign][k]:
+                        acc = out = self.RGSW_CC.mult_rlwe(acc, rgsw[i], out)
+                skipped += k > 0
+            if skipped:
+                acc = out = self.rotate(acc, skipped, akeys)
+
+        return acc
+
+# -------------------------------- Blind rotation key generation : parallel ---------------------------- #
+def generate_rgsw_monomials(context, start, stop) -> np.ndarray:
+    '''brk[start:stop], brk[i] = RGSW(X^{s_i}).'''
+    RGSW_CC, s_ring, s, seed = context
+    keys = []
+    for i in range(start, stop):
+        rgsw = RGSW_CC.encrypt(Ring(RGSW_CC.n, RGSW_CC.q, [1]).mul_monomial(s[i]), s_ring, seed, i * 2 * RGSW_CC.d)
+        keys.append(RGSW_CC.to_key(rgsw))
+    return np.stack(keys)
@@ -0,0 +1,340 @@
+import numpy as np
+from note_include.utils.types import LWEctxt
+
+# ------------------ Boolean circuits ------------------ #
+#
+# A circuit is a netlist of gates (op, inputs, output) over named wires. Only the
+# two-input gates below cost a bootstrap (FHEW.evalBin) : NOT is FHEW.evalNOT, BUF
+# copies a wire and ZERO / ONE drive constants, all without bootstrapping.
+#
+# Before evaluation the netlist is simplified for the inputs that are known
+# constants : constants are folded, NOT chains collapse (NOT is pushed into
+# XOR / XNOR), and gates that do not reach an output are dropped. The bootstrapped
+# gates are then grouped by level (number of bootstraps on their longest input
+# path) and every level is sent to FHEW.evalBin_batch as one parallel batch, so the
+# wall-clock time follows the depth of the circuit rather than its gate count.
+
+BINARY = ("AND", "OR", "XOR", "NAND", "NOR", "XNOR")
+UNARY  = ("NOT", "BUF")
+CONST  = ("ZERO", "ONE")
+
+BRISTOL_OPS = {"AND": "AND", "OR": "OR", "XOR": "XOR", "NAND": "NAND", "NOR": "NOR", "XNOR": "XNOR",
+               "INV": "NOT", "NOT": "NOT", "EQW": "BUF"}
+
+PLAIN = {"AND" : lambda x, y: x & y,        "OR"  : lambda x, y: x | y,        "XOR" : lambda x, y: x ^ y,
+         "NAND": lambda x, y: 1 - (x & y),  "NOR" : lambda x, y: 1 - (x | y),  "XNOR": lambda x, y: 1 - (x ^ y)}
+
+NEGATED = {"AND": "NAND", "NAND": "AND", "OR": "NOR", "NOR": "OR", "XOR": "XNOR", "XNOR": "XOR"}
+
+class Circuit:
+    def __init__(self, inputs:list, gates:list[tuple], outputs:list):
+        '''
+            inputs  : input wire names, in the order of the evaluation inputs.
+            gates   : (op, (in1, in2), out) for op in BINARY, (op, (in,), out) for op in UNARY
+                      and (op, (), out) for op in CONST. Any order, the netlist is sorted.
+            outputs : output wire names.
+        '''
+        self.inputs  = list(inputs)
+        self.outputs = list(outputs)
+        self.gates   = topological_sort(self.inputs, [(op, tuple(ins), out) for op, ins, out in gates])
+
+        driven = set(self.inputs) | {out for _, _, out in self.gates}
+        for wire in self.outputs:
+            if wire not in driven:
+                raise ValueError(f"Output wire {wire!r} is not driven.")
+
+    @classmethod
+    def from_bristol(cls, text:str):
+        '''
+            Parses a netlist in Bristol Fashion :
+                <#gates> <#wires>
+                <#input values> <wires of value 1> ...
+                <#output values> <wires of value 1> ...
+                <#in> <#out> <in wires> <out wires> <op>     (one line per gate)
+            Inputs are the first wires and outputs the last ones. EQ drives a constant.
+        '''
+        lines = [line.split() for line in text.splitlines() if line.strip()]
+        n_gates, n_wires = int(lines[0][0]), int(lines[0][1])
+        n_in  = sum(int(x) for x in lines[1][1:])
+        n_out = sum(int(x) for x in lines[2][1:])
+
+        gates = []
+        for line in lines[3:3 + n_gates]:
+            n_i, n_o = int(line[0]), int(line[1])
+            ins, out, op = line[2:2 + n_i], int(line[2 + n_i]), line[-1]
+            if n_o != 1:
+                raise ValueError(f"Gate {' '.join(line)} : only single-output gates are supported.")
+            if op == "EQ":
+                gates.append(("ONE" if int(ins[0]) else "ZERO", (), out))
+            elif op in BRISTOL_OPS:
+                gates.append((BRISTOL_OPS[op], tuple(int(x) for x in ins), out))
+            else:
+                raise ValueError(f"Unsupported Bristol gate {op}.")
+
+        return cls(range(n_in), gates, range(n_wires - n_out, n_wires))
+
+    # ------------------------------------------------------------------- #
+
+    # ------------------------- Simplification -------------------------- #
+
+    def simplify(self, constants:dict = None):
+        '''
+            Returns an equivalent circuit for the input wires fixed in constants (wire -> 0/1) :
+            constants folded, NOTs pushed into XOR/XNOR or onto the gate inputs, dead gates removed.
+        '''
+        constants = constants or {}
+        lit       = {} # wire -> ("const", v) or ("wire", w, negated)
+        gates     = []
+        nots      = {}
+
+        for wire in self.inputs:
+            lit[wire] = ("const", int(constants[wire])) if wire in constants else ("wire", wire, False)
+
+        def operand(l):
+            '''Wire carrying the literal l, NOT gates are shared between their users.'''
+            _, w, neg = l
+            if not neg:
+                return w
+            if w not in nots:
+                nots[w] = ("not", w)
+                gates.append(("NOT", (w,), nots[w]))
+            return nots[w]
+
+        for op, ins, out in self.gates:
+            if op in CONST:
+                lit[out] = ("const", int(op == "ONE"))
+            elif op == "BUF":
+                lit[out] = lit[ins[0]]
+            elif op == "NOT":
+                lit[out] = negate(lit[ins[0]])
+            else:
+                lit[out] = fold(op, lit[ins[0]], lit[ins[1]])
+                if lit[out] is None:
+                    x, y = lit[ins[0]], lit[ins[1]]
+                    if op in ("XOR", "XNOR"): # NOT on an input flips XOR <-> XNOR
+                        if x[2] != y[2]:
+                            op = NEGATED[op]
+                        x, y = ("wire", x[1], False), ("wire", y[1], False)
+                    gates.append((op, (operand(x), operand(y)), out))
+                    lit[out] = ("wire", out, False)
+
+        for wire in self.outputs:
+            l = lit[wire]
+            if l[0] == "const":
+                gates.append(("ONE" if l[1] else "ZERO", (), wire))
+            elif l[2]:
+                gates.append(("NOT", (l[1],), wire))
+            elif l[1] != wire:
+                gates.append(("BUF", (l[1],), wire))
+
+        inputs = [wire for wire in self.inputs if wire not in constants]
+        return Circuit(inputs, eliminate_dead_gates(gates, self.outputs), self.outputs)
+
+    # ------------------------------------------------------------------- #
+
+    # -------------------------- Scheduling ----------------------------- #
+
+    def levels(self) -> dict:
+        '''Wire -> number of bootstraps on its longest path from the inputs.'''
+        level = {wire: 0 for wire in self.inputs}
+        for op, ins, out in self.gates:
+            level[out] = max((level[w] for w in ins), default=0) + (op in BINARY)
+        return level
+
+    def schedule(self) -> list[list[tuple]]:
+        '''
+            Gates grouped by level : stage L holds the bootstrapped gates of level L followed,
+            in topological order, by the free gates (NOT, BUF, constants) of level L.
+        '''
+        level  = self.levels()
+        depth  = max((level[out] for _, _, out in self.gates), default=0)
+        stages = [[] for _ in range(depth + 1)]
+
+        for gate in self.gates:
+            if gate[0] in BINARY:
+                stages[level[gate[2]]].append(gate)
+        for gate in self.gates:
+            if gate[0] not in BINARY:
+                stages[level[gate[2]]].append(gate)
+        return stages
+
+    def critical_path(self) -> list:
+        '''Output wires of the bootstrapped gates along one longest path, from the inputs.'''
+        level  = self.levels()
+        driver = {out: (op, ins) for op, ins, out in self.gates}
+        wire   = max(self.outputs, key=lambda w: level[w], default=None)
+
+        path = []
+        while wire in driver:
+            op, ins = driver[wire]
+            if op in BINARY:
+                path.append(wire)
+            if not ins:
+                break
+            wire = max(ins, key=lambda w: level[w])
+        return path[::-1]
+
+    def report(self) -> dict:
+        '''Gate counts, bootstraps per level and the critical path of the circuit.'''
+        stages = self.schedule()
+        path   = self.critical_path()
+        return {
+            "gates"         : len(self.gates),
+            "bootstraps"    : sum(op in BINARY for op, _, _ in self.gates),
+            "free_gates"    : sum(op not in BINARY for op, _, _ in self.gates),
+            "depth"         : len(path),
+            "level_widths"  : [sum(op in BINARY for op, _, _ in stage) for stage in stages[1:]],
+            "critical_path" : path,
+        }
+
+    # ------------------------------------------------------------------- #
+
+    # -------------------------- Evaluation ----------------------------- #
+
+    def evaluate(self, fhew, inputs, n_workers = None, chunksize = None) -> list[LWEctxt]:
+        '''
+            inputs : one value per input wire (list, or dict wire -> value), either an LWE
+                     ciphertext or a plain 0/1 which is folded into the circuit.
+            Every level is one FHEW.evalBin_batch call. Returns the output ciphertexts.
+        '''
+        if not isinstance(inputs, dict):
+            inputs = dict(zip(self.inputs, inputs))
+        constants = {w: v for w, v in inputs.items() if isinstance(v, (int, np.integer))}
+        circuit   = self.simplify(constants)
+
+        wires = {w: inputs[w] for w in circuit.inputs}
+        for stage in circuit.schedule():
+            boot = [gate for gate in stage if gate[0] in BINARY]
+            if boot:
+                pairs = [(wires[ins[0]], wires[ins[1]]) for _, ins, _ in boot]
+                outs  = fhew.evalBin_batch(pairs, [op for op, _, _ in boot], n_workers, chunksize)
+                wires.update(zip([out for _, _, out in boot], outs))
+
+            for op, ins, out in stage:
+                if   op == "NOT" : wires[out] = fhew.evalNOT(wires[ins[0]])
+                elif op == "BUF" : wires[out] = wires[ins[0]]
+                elif op in CONST : wires[out] = (np.zeros(fhew.n, dtype=np.int64), int(op == "ONE") * (fhew.q // 4))
+
+        return [wires[w] for w in circuit.outputs]
+
+    def evaluate_plain(self, inputs) -> list[int]:
+        '''Cleartext reference evaluation.'''
+        if not isinstance(inputs, dict):
+            inputs = dict(zip(self.inputs, inputs))
+        wires = dict(inputs)
+        for op, ins, out in self.gates:
+            if   op in BINARY : wires[out] = PLAIN[op](wires[ins[0]], wires[ins[1]])
+            elif op == "NOT"  : wires[out] = 1 - wires[ins[0]]
+            elif op == "BUF"  : wires[out] = wires[ins[0]]
+            else              : wires[out] = int(op == "ONE")
+        return [wires[w] for w in self.outputs]
+
+# ------------------ Netlist helpers ------------------ #
+
+def negate(l):
+    return ("const", 1 - l[1]) if l[0] == "const" else ("wire", l[1], not l[2])
+
+def fold(op, x, y):
+    '''Literal of op(x, y) when it does not need a bootstrap, None otherwise.'''
+    if x[0] == "const" and y[0] == "const":
+        return ("const", PLAIN[op](x[1], y[1]))
+
+    if x[0] == "const" or y[0] == "const":
+        c, w = (x[1], y) if x[0] == "const" else (y[1], x)
+        base = op if op in ("AND", "OR", "XOR") else NEGATED[op]
+        if   base == "AND": l = w if c else ("const", 0)
+        elif base == "OR" : l = ("const", 1) if c else w
+        else              : l = negate(w) if c else w
+        return l if base == op else negate(l)
+
+    if x[1] == y[1]: # same wire, possibly negated
+        base = op if op in ("AND", "OR", "XOR") else NEGATED[op]
+        if x[2] == y[2]:
+            l = ("const", 0) if base == "XOR" else x
+        else:
+            l = ("const", 0) if base == "AND" else ("const", 1)
+        return l if base == op else negate(l)
+
+    return None
+
+def topological_sort(inputs:list, gates:list[tuple]) -> list[tuple]:
+    inputs = set(inputs)
+    driven = set(inputs)
+    users  = {}
+    for _, _, out in gates:
+        if out in driven:
+            raise ValueError(f"Wire {out!r} is driven twice.")
+        driven.add(out)
+    for i, (_, ins, _) in enumerate(gates):
+        for w in set(ins):
+            if w not in driven:
+                raise ValueError(f"Wire {w!r} is not driven.")
+            if w not in inputs:
+                users.setdefault(w, []).append(i)
+
+    missing = [len(set(ins) - inputs) for _, ins, _ in gates]
+    ready   = [i for i, m in enumerate(missing) if m == 0]
+    order   = []
+    while ready:
+        i = ready.pop()
+        order.append(gates[i])
+        for j in users.get(gates[i][2], []):
+            missing[j] -= 1
+            if missing[j] == 0:
+                ready.append(j)
+
+    if len(order) != len(gates):
+        raise ValueError("The netlist has a cycle.")
+    return order
+
+def eliminate_dead_gates(gates:list[tuple], outputs:list) -> list[tuple]:
+    live = set(outputs)
+    kept = []
+    for op, ins, out in reversed(gates):
+        if out in live:
+            kept.append((op, ins, out))
+            live.update(ins)
+    return kept[::-1]
+
+# ------------------ Arithmetic circuits ------------------ #
+
+def ripple_carry_adder(bits:int) -> Circuit:
+    '''Inputs a_0..a_{k-1}, b_0..b_{k-1} (LSB first), outputs the k+1 bits of a + b.'''
+    a = [f"a{i}" for i in range(bits)]
+    b = [f"b{i}" for i in range(bits)]
+
+    gates, carry, outputs = [], None, []
+    for i in range(bits):
+        gates.append(("XOR", (a[i], b[i]), f"p{i}"))
+        gates.append(("AND", (a[i], b[i]), f"g{i}"))
+        if carry is None:
+            gates.append(("BUF", (f"p{i}",), f"s{i}"))
+            carry = f"g{i}"
+            outputs.append(f"s{i}")
+            continue
+        gates.append(("XOR", (f"p{i}", carry), f"s{i}"))
+        gates.append(("AND", (f"p{i}", carry), f"t{i}"))
+        gates.append(("OR",  (f"g{i}", f"t{i}"), f"c{i}"))
+        carry = f"c{i}"
+        outputs.append(f"s{i}")
+
+    return Circuit(a + b, gates, outputs + [carry])
+
+def less_than(bits:int) -> Circuit:
+    '''Inputs a_0..a_{k-1}, b_0..b_{k-1} (LSB first), output [a < b].'''
+    a = [f"a{i}" for i in range(bits)]
+    b = [f"b{i}" for i in range(bits)]
+
+    gates, lt = [], None
+    for i in range(bits): # from the LSB : lt_i = (!a_i & b_i) | (!(a_i ^ b_i) & lt_{i-1})
+        gates.append(("NOT",  (a[i],), f"na{i}"))
+        gates.append(("AND",  (f"na{i}", b[i]), f"l{i}"))
+        if lt is None:
+            lt = f"l{i}"
+            continue
+        gates.append(("XNOR", (a[i], b[i]), f"e{i}"))
+        gates.append(("AND",  (f"e{i}", lt), f"k{i}"))
+        gates.append(("OR",   (f"l{i}", f"k{i}"), f"lt{i}"))
+        lt = f"lt{i}"
+
+    return Circuit(a + b, gates, [lt])
@@ -0,0 +1,109 @@
+import asyncio
+import itertools
+from note_include.utils       import wire
+from note_include.utils.types import LWEctxt
+
+# ------------------ Gate service client ------------------ #
+#
+#   client = await GateClient.connect(path="/tmp/toyfhew.sock")   # or host=..., port=...
+#   ct     = await client.evalBin(ct1, ct2, "AND")
+#   cts    = await client.evalBin_many([(ct1, ct2), ...], "XOR")
+#   await client.close()
+#
+# One connection carries any number of concurrent requests : each gets an id and a
+# future, which a reader task resolves as responses arrive. Ciphertexts go out in the
+# compact encoding of utils/wire.py and come back as (a : int64 array, b : int).
+
+class ServerError(Exception):
+    '''An ERROR or CLOSING response ; status holds the wire status.'''
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+class GateClient:
+    def __init__(self, reader, writer):
+        self.reader  = reader
+        self.writer  = writer
+        self.ids     = itertools.count(1)
+        self.futures = {}   # request id -> future
+        self.lock    = asyncio.Lock()
+        self.info    = None # server parameters (n, q, gates, ...), set by connect
+        self.task    = asyncio.create_task(self.read_loop())
+
+    @classmethod
+    async def connect(cls, host = None, port = None, path = None):
+        '''Connects to the Unix socket `path`, or to TCP (host, port).'''
+        if path is not None:
+            reader, writer = await asyncio.open_unix_connection(path)
+        else:
+            reader, writer = await asyncio.open_connection(host or "127.0.0.1", port)
+        client      = cls(reader, writer)
+        client.info = await client.request(wire.INFO, 0, b"", wire.unpack_json)
+        return client
+
+    async def close(self):
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except ConnectionError:
+            pass
+        await self.task
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    # ------------------------ Requests ------------------------ #
+
+    async def evalBin(self, ctxt1:LWEctxt, ctxt2:LWEctxt, gate = "AND") -> LWEctxt:
+        q = self.info["q"]
+        return await self.request(wire.EVAL_BIN, self.info["gates"].index(gate),
+                                  wire.pack_lwe(ctxt1, q) + wire.pack_lwe(ctxt2, q), self.ciphertext)
+
+    async def evalNOT(self, ctxt:LWEctxt) -> LWEctxt:
+        return await self.request(wire.EVAL_NOT, 0, wire.pack_lwe(ctxt, self.info["q"]), self.ciphertext)
+
+    async def evalBin_many(self, pairs, gates = "AND") -> list[LWEctxt]:
+        '''All the gates in flight at once, results in order.'''
+        gates = [gates] * len(pairs) if isinstance(gates, str) else list(gates)
+        return await asyncio.gather(*[self.evalBin(ct1, ct2, gate) for (ct1, ct2), gate in zip(pairs, gates)])
+
+    async def metrics(self) -> dict:
+        return await self.request(wire.METRICS, 0, b"", wire.unpack_json)
+
+    def ciphertext(self, payload) -> LWEctxt:
+        return wire.unpack_lwe(payload, self.info["n"], self.info["q"])
+
+    async def request(self, op, gate, payload, decode):
+        if self.task.done():
+            raise ConnectionError("Connection to the gate server is closed.")
+        request_id = next(self.ids) & 0xFFFFFFFF
+        future     = asyncio.get_running_loop().create_future()
+        self.futures[request_id] = future
+        async with self.lock:
+            self.writer.write(wire.frame(wire.REQUEST, request_id, op, gate, payload))
+            await self.writer.drain() # blocks while the server applies backpressure
+        status, body = await future
+        if status != wire.OK:
+            raise ServerError(status, body.decode())
+        return decode(body)
+
+    async def read_loop(self):
+        try:
+            while True:
+                body = await wire.read_frame(self.reader)
+                if body is None:
+                    break
+                request_id, status = wire.RESPONSE.unpack_from(body)
+                future = self.futures.pop(request_id, None)
+                if future is not None and not future.done():
+                    future.set_result((status, body[wire.RESPONSE.size:]))
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            for future in self.futures.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("Connection to the gate server was lost."))
+            self.futures.clear()
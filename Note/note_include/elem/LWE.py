@@ -1,6 +1,7 @@
 import numpy as np
-from note_include.utils.types import LWEctxt
-from note_include.utils.noise_generator import discrete_uniform, discrete_gaussian
+from note_include.utils.types import LWEctxt, LWEctxt_batch
+from note_include.utils.sampler import get_sampler
+from note_include.utils.prng import SeededMask
 
 class LWE:
     def __init__(self, dimension, modulus, s_std, e_std):
@@ -11,40 +12,86 @@ class LWE:
 
     def keygen(self):
         if self.s_std == "Gaussian":
-            s = [int(_s) for _s in discrete_gaussian(self.n, self.q, std=3.2).coeffs] # default
+            s = get_sampler().gaussian(self.n, 3.2) % self.q # default
         elif self.s_std == "Binary":
-            s = [int(_s) for _s in discrete_uniform(self.n, 2).coeffs]
+            s = get_sampler().binary(self.n)
 
-        return s
+        return s.tolist()
 
-    def encrypt(self, msg : int, sk : list[int]) -> LWEctxt:
-        a   = np.random.randint(0, self.q-1, self.n)
-        e   = np.round(self.e_std * np.random.rand()) % self.q
-        as_ = sum(x * y for x, y in zip(a, sk))
+    def encrypt(self, msg : int, sk : list[int], seed : int = None, index : int = 0) -> LWEctxt:
+        '''
+            With a seed, the mask is row `index` of the seed's PRNG stream and the
+            ciphertext only holds (seed, b) until the mask is used (see utils/prng.py).
+        '''
+        sampler = get_sampler()
+        if seed is None:
+            a = sampler.uniform(self.n, self.q)
+        else:
+            a = SeededMask(seed, self.q, self.n, index)
+        e   = int(sampler.gaussian(1, self.e_std)[0]) % self.q
+        as_ = self.inner_product(a, sk)
 
 
         b   = (as_ + msg + e) % self.q
-        return (a, b)
+        return (a.compress() if seed is not None else a, b)
 
     def decrypt(self, ctxt : LWEctxt, sk : list[int]) -> int:
         a, b = ctxt
-        as_  = sum(x * y for x, y in zip(a, sk))
+        as_  = self.inner_product(a, sk)
 
         result = b - as_
         return result % self.q
+
+    def encrypt_batch(self, msgs : list[int], sk : list[int], seed : int = None, start : int = 0) -> LWEctxt_batch:
+        '''
+            Encrypts k messages at once : one (k, n) uniform mask, bulk noise and a
+            single matrix-vector product. Row i of the result is an ordinary LWE
+            ciphertext, i.e. (A[i], b[i]) can be passed wherever LWEctxt is expected.
+            With a seed, row i uses mask row start+i of the seed's stream.
+        '''
+        msgs    = np.asarray(msgs)
+        k       = len(msgs)
+        sampler = get_sampler()
+        if seed is None:
+            A = sampler.uniform((k, self.n), self.q)
+        else:
+            A = SeededMask(seed, self.q, self.n, start, k)
+        e    = sampler.gaussian(k, self.e_std) % self.q
+        As_  = self.inner_product(A, sk)
+
+        b    = (As_ + msgs % self.q + e) % self.q
+        return (A.compress() if seed is not None else A, b)
+
+    def decrypt_batch(self, ctxts : LWEctxt_batch, sk : list[int]) -> np.ndarray:
+        A, b = ctxts
+        As_  = self.inner_product(A, sk)
+
+        return (np.asarray(b) - As_) % self.q
+
+    def inner_product(self, a, sk : list[int]):
+        '''
+            <a, sk> for one mask (n,) or a mask matrix (k, n). Stays in int64 when the
+            sum cannot overflow, and falls back to Python ints otherwise.
+        '''
+        a     = np.asarray(a)
+        sk    = np.asarray(sk)
+        bound = self.n * self.q * max(int(np.max(np.abs(sk))), 1) if len(sk) else 0
+        if bound < 2**63 and a.dtype != object:
+            return a.astype(np.int64, copy=False) @ sk.astype(np.int64, copy=False)
+        return a.astype(object) @ sk.astype(object)
     
     def add(self, c1:LWEctxt, c2:LWEctxt) -> LWEctxt:
         a1, b1 = c1
         a2, b2 = c2
 
-        return ((a1 + a2) % self.q, (b1 + b2) % self.q)
+        return ((np.asarray(a1) + np.asarray(a2)) % self.q, (b1 + b2) % self.q)
     
     def sub(self, c1:LWEctxt, c2:LWEctxt) -> LWEctxt:
         a1, b1 = c1
         a2, b2 = c2
 
-        return ((a1 - a2) % self.q, (b1 - b2) % self.q)
+        return ((np.asarray(a1) - np.asarray(a2)) % self.q, (b1 - b2) % self.q)
     
     def mult_cnst(self, ctxt:LWEctxt, d:int) -> LWEctxt:
         a, b = ctxt
-        return ((a*d) % self.q, (b*d) % self.q)
+        return ((np.asarray(a)*d) % self.q, (b*d) % self.q)
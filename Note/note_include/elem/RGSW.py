@@ -1,8 +1,12 @@
 import numpy as np
-from note_include.elem.Ring  import Ring
+from note_include.elem.Ring  import Ring, coeff_dtype
 from note_include.elem.RLWE  import RLWE
 from note_include.elem.RLWEp import RLWEp
-from note_include.utils.types import RGSWctxt, RLWEctxt
+from note_include.utils.NTT import get_ntt
+from note_include.utils.RNS import get_rns, get_transform
+from note_include.utils.gadget_decomposition import signed_digits, max_digit
+from note_include.utils.lazy import Accumulator
+from note_include.utils.types import RGSWctxt, RLWEctxt, RGSWctxt_ntt
 
 class RGSW:
     def __init__(self, 
@@ -20,19 +24,170 @@ class RGSW:
         self.d       = d
         self.CCrlwe  = RLWE(dimension, modulus, s_std, e_std)
         self.CCrlwep = RLWEp(dimension, modulus, s_std, e_std, base, d)
+        self.ws      = None # buffers of external_product, allocated on first use
 
-    def encrypt(self, msg : Ring, sk : Ring) -> RGSWctxt:
-        e0 = self.CCrlwep.encrypt(-1 * sk * msg, sk)
-        e1 = self.CCrlwep.encrypt(msg, sk)
+    def encrypt(self, msg : Ring, sk : Ring, seed : int = None, index : int = 0) -> RGSWctxt:
+        # with a seed, the 2d RLWE masks are rows index, ..., index+2d-1 (layout of to_array)
+        e0 = self.CCrlwep.encrypt(-1 * sk * msg, sk, seed, index)
+        e1 = self.CCrlwep.encrypt(msg, sk, seed, index + self.d)
 
         return [e0, e1]
     
-    def mult_rlwe(self, rlwe_ctxt : RLWEctxt, rgsw_ctxt : RGSWctxt) -> RLWEctxt:
+    def mult_rlwe(self, rlwe_ctxt : RLWEctxt, rgsw_ctxt : RGSWctxt, out : RLWEctxt = None) -> RLWEctxt:
+        '''
+            rgsw_ctxt is a list of RLWE' ciphertexts, or an array from to_ntt / to_array
+            which goes through the fused external_product (out : see there).
+        '''
+        if isinstance(rgsw_ctxt, np.ndarray):
+            if get_transform(self.n, self.q) is not None or (coeff_dtype(self.q) is np.int64 and self.n * self.B * self.q < 2**63):
+                return self.external_product(rlwe_ctxt, rgsw_ctxt, out)
+            rgsw_ctxt = self.from_array(rgsw_ctxt)
+
         a, b     = rlwe_ctxt
         ct0, ct1 = rgsw_ctxt
 
         tmp1 = self.CCrlwep.mult_poly(ct0, a) # -> Return RLWEctxt
         tmp2 = self.CCrlwep.mult_poly(ct1, b) # -> Return RLWEctxt
-        res  = self.CCrlwe.add_ctxt_ctxt(tmp1, tmp2)
+        res  = self.CCrlwe.iadd_ctxt_ctxt(tmp1, tmp2)
 
         return res
+
+    # ------------------------------ Array form ------------------------------ #
+
+    def to_array(self, rgsw_ctxt : RGSWctxt) -> np.ndarray:
+        '''Coefficient-domain (2, d, 2, N) array, the layout of to_ntt without the transform.'''
+        return np.array([[[a.coeffs, b.coeffs] for a, b in ct] for ct in rgsw_ctxt])
+
+    def from_array(self, rgsw_arr : np.ndarray) -> RGSWctxt:
+        return [[(Ring(self.n, self.q, a), Ring(self.n, self.q, b)) for a, b in ct] for ct in rgsw_arr]
+
+    # ---------------------- Evaluation (NTT) domain ---------------------- #
+
+    def to_ntt(self, rgsw_ctxt : RGSWctxt) -> RGSWctxt_ntt:
+        '''(2, d, 2, N) evaluations, or (L, 2, d, 2, N) limbs when q is an RNS modulus.'''
+        return get_transform(self.n, self.q).forward(self.to_array(rgsw_ctxt))
+
+    def to_key(self, rgsw_ctxt : RGSWctxt) -> np.ndarray:
+        '''Key form of a ciphertext : to_ntt if q has an evaluation domain, to_array otherwise.'''
+        if get_transform(self.n, self.q) is not None:
+            return self.to_ntt(rgsw_ctxt)
+        return self.to_array(rgsw_ctxt)
+
+    def key_layout(self) -> tuple[tuple, type]:
+        '''(shape, dtype) of to_key.'''
+        rns = get_rns(self.n, self.q)
+        if rns is not None:
+            return (rns.L, 2, self.d, 2, self.n), np.int64
+        if get_transform(self.n, self.q) is not None:
+            return (2, self.d, 2, self.n), np.int64
+        return (2, self.d, 2, self.n), coeff_dtype(self.q)
+
+    # ---------------------- Fused external product ---------------------- #
+    #
+    # a and b are decomposed together into a (2, d, N) signed digit array, whose 2d rows
+    # meet the key viewed as a (2d, 2, N) tensor in one multiply-accumulate. With an
+    # NTT-friendly q the key is in the evaluation domain (to_ntt) : one batched
+    # forward transform of the digits, a pointwise MAC and one inverse transform of
+    # the (a, b) pair. An RNS modulus (utils/RNS.py) does the same per limb with a
+    # Barrett-reduced MAC, and Garner's CRT turns the L inverse transforms back into
+    # values mod q. Otherwise (to_array) every digit row is expanded to its
+    # negacyclic matrix and multiplied with the key. All intermediates live in
+    # self.ws, so a call allocates nothing of size N beyond its output.
+
+    def workspace(self) -> dict:
+        if self.ws is None:
+            d, n    = self.d, self.n
+            self.ws = {"carry"  : np.empty((2, n),         dtype=np.int64),
+                       "digits" : np.empty((2, d, n),      dtype=np.int64),
+                       "prod"   : np.empty((2 * d, 2, n),  dtype=np.int64),
+                       "acc"    : np.empty((2, n),         dtype=np.int64)}
+            rns = get_rns(n, self.q)
+            if rns is not None:
+                self.ws["digits_hat"] = np.empty((rns.L, 2 * d, n),    dtype=np.int64)
+                self.ws["acc_hat"]    = np.empty((rns.L, 2, n),        dtype=np.int64)
+            elif get_ntt(n, self.q) is None:
+                i, j                 = np.arange(n)[:, None], np.arange(n)[None, :]
+                self.ws["nega_idx"]  = (i - j) % n                  # x * y = M(x) @ y with
+                self.ws["nega_sign"] = np.where(i >= j, 1, -1)      # M(x)[i][j] = +-x[i - j]
+                self.ws["matrix"]    = np.empty((n, n), dtype=np.int64)
+        return self.ws
+
+    def decompose(self, rlwe_ctxt : RLWEctxt, out : np.ndarray = None) -> np.ndarray:
+        '''Signed base-B digits of (a, b) : out[0, j] / out[1, j] is the j-th digit polynomial of a / b.'''
+        a, b  = rlwe_ctxt
+        carry = self.workspace()["carry"]
+        out   = np.empty((2, self.d, self.n), dtype=np.int64) if out is None else out
+
+        carry[0], carry[1] = a.coeffs, b.coeffs
+        signed_digits(carry, self.B, self.d, self.q, out.transpose(1, 0, 2), carry)
+        return out
+
+    def external_product(self, rlwe_ctxt : RLWEctxt, rgsw_arr : np.ndarray, out : RLWEctxt = None) -> RLWEctxt:
+        '''
+            RLWE x RGSW -> RLWE with the key as a (2, d, 2, N) array, (L, 2, d, 2, N) for RNS.
+            out : RLWE ciphertext whose coefficient buffers receive the result (it may be
+                  rlwe_ctxt itself), otherwise new polynomials are returned.
+        '''
+        ws     = self.workspace()
+        q      = self.q
+        digits = self.decompose(rlwe_ctxt, ws["digits"]).reshape(2 * self.d, self.n)
+        keys   = rgsw_arr.reshape(rgsw_arr.shape[:-4] + (2 * self.d, 2, self.n))
+        acc    = ws["acc"]
+
+        ntt = get_ntt(self.n, q)
+        rns = get_rns(self.n, q)
+        if rns is not None:
+            digits_hat = ws["digits_hat"]
+            for ntt_l, limb in zip(rns.ntts, digits_hat):
+                ntt_l.forward(digits, out=limb) # reduces the signed digits mod p_l
+            rns.mac(digits_hat, keys, out=ws["acc_hat"], prod=ws["prod"])
+            rns.inverse(ws["acc_hat"], out=acc)
+        elif ntt is not None:
+            prod = ws["prod"]
+            ntt.forward(digits, out=digits)
+            np.multiply(digits[:, None, :], keys, out=prod)
+            Accumulator.zeros(q, acc.shape, out=acc).add_sum(prod, (q - 1)**2)
+            ntt.inverse(acc, out=acc) # reduces its input
+        else:
+            lazy  = Accumulator.zeros(q, acc.shape, out=acc)
+            bound = self.n * max_digit(self.B) * (q - 1) # one row of matrix @ key
+            for k in range(2 * self.d):
+                if not digits[k].any(): continue
+                matrix = np.take(digits[k], ws["nega_idx"], out=ws["matrix"])
+                np.multiply(matrix, ws["nega_sign"], out=matrix)
+                lazy.add(np.matmul(keys[k], matrix.T, out=ws["prod"][0]), bound)
+            lazy.result(out=acc)
+
+        if out is None:
+            return [Ring.from_reduced(self.n, q, acc[0].astype(coeff_dtype(q))), Ring.from_reduced(self.n, q, acc[1].astype(coeff_dtype(q)))]
+        out[0].coeffs[:] = acc[0]
+        out[1].coeffs[:] = acc[1]
+        return out
+
+    # ---------------------- Batched external product ---------------------- #
+    #
+    # k independent accumulators against the same key : their digits are stacked into a
+    # (k, 2d, N) array and every key row meets all k digit rows in one broadcast MAC,
+    # so the key is read once per batch instead of once per accumulator.
+
+    def external_product_batch(self, accs : np.ndarray, rgsw_arr : np.ndarray) -> np.ndarray:
+        '''(k, 2, N) coefficient-domain accumulators (int64) x one key array -> (k, 2, N) int64.'''
+        k, q   = len(accs), self.q
+        digits = signed_digits(accs, self.B, self.d, q)                       # (d, k, 2, N)
+        digits = digits.transpose(1, 2, 0, 3).reshape(k, 2 * self.d, self.n) # layout of decompose
+        keys   = rgsw_arr.reshape(rgsw_arr.shape[:-4] + (2 * self.d, 2, self.n))
+
+        ntt = get_ntt(self.n, q)
+        rns = get_rns(self.n, q)
+        if rns is not None:
+            digits_hat = np.stack([ntt_l.forward(digits) for ntt_l in rns.ntts])
+            return rns.inverse(rns.mac(digits_hat, keys))
+        if ntt is not None:
+            prod = ntt.forward(digits)[:, :, None, :] * keys[None] # (k, 2d, 2, N)
+            acc  = Accumulator.zeros(q, (k, 2, self.n)).add_sum(prod.swapaxes(0, 1), (q - 1)**2)
+            return ntt.inverse(acc.value)
+
+        out = np.empty((k, 2, self.n), dtype=np.int64)
+        for r, (a, b) in enumerate(accs):
+            out[r] = [ring.coeffs for ring in self.external_product([Ring(self.n, q, a), Ring(self.n, q, b)], rgsw_arr)]
+        return out
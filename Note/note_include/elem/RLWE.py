@@ -1,5 +1,7 @@
-from note_include.elem.Ring import Ring
-from note_include.utils.noise_generator import discrete_gaussian, discrete_uniform
+import numpy as np
+from note_include.elem.Ring import Ring, SeededRing, mul_monomial, coeff_dtype
+from note_include.utils.RNS import get_transform
+from note_include.utils.sampler import get_sampler
 from note_include.utils.types import RLWEctxt
 
 class RLWE:
@@ -11,25 +13,34 @@ class RLWE:
         self.e_std = e_std
 
     def keygen(self):
+        sampler = get_sampler()
         if self.s_std == "Gaussian":
-            s = discrete_gaussian(self.n, self.q, std=3.2)     # default
+            s = Ring(self.n, self.q, sampler.gaussian(self.n, 3.2))     # default
         elif self.s_std == "Binary":
-            s = discrete_uniform(self.n, self.q, 0, 2)
+            s = Ring(self.n, self.q, sampler.binary(self.n))
             
-        e = discrete_gaussian(self.n, self.q, self.e_std)
+        e = Ring(self.n, self.q, sampler.gaussian(self.n, self.e_std))
 
-        a0 = discrete_uniform(self.n, self.q)
+        a0 = self.uniform(sampler)
         a1 = (a0 * s + e)
 
         return (s, (a0, a1)) # (secret key, public key)
     
-    def encrypt(self, msg : Ring, sk:Ring) -> RLWEctxt:
-        e = discrete_gaussian(self.n, self.q, std=self.e_std) # Noise
-        a = discrete_uniform(self.n, self.q)       # Random Num
+    def encrypt(self, msg : Ring, sk:Ring, seed : int = None, index : int = 0) -> RLWEctxt:
+        sampler = get_sampler()
+        e = Ring(self.n, self.q, sampler.gaussian(self.n, self.e_std)) # Noise
+        if seed is None:
+            a = self.uniform(sampler)                   # Random Num
+        else:
+            a = SeededRing(self.n, self.q, seed, index) # Random Num, stored as (seed, index)
 
         b = a * sk + msg + e
-        return (a, b)
+        return (a.compress() if seed is not None else a, b)
     
+    def uniform(self, sampler) -> Ring:
+        coeffs = sampler.uniform(self.n, self.q)
+        return Ring.from_reduced(self.n, self.q, coeffs.astype(coeff_dtype(self.q), copy=False))
+
     def pk_encrypt(self, msg:Ring, pk:RLWEctxt) -> RLWEctxt:
         a0, a1 = pk
         return (a0, a1 + msg)
@@ -43,6 +54,18 @@ class RLWE:
         a2, b2 = ct2
 
         return [a1 + a2, b1 + b2]
+
+    def iadd_ctxt_ctxt(self, ct1 : RLWEctxt, ct2 : RLWEctxt) -> RLWEctxt:
+        '''
+            Accumulates ct2 into ct1 in place (no new polynomials are allocated).
+            ct1 must own its polynomials, e.g. a freshly computed product.
+        '''
+        a1, b1 = ct1
+        a2, b2 = ct2
+        a1.iadd(a2)
+        b1.iadd(b2)
+
+        return ct1
     
     def add_ctxt_ptxt(self, ct : RLWEctxt, Z_ring : Ring) -> RLWEctxt:
         a, b = ct
@@ -58,4 +81,24 @@ class RLWE:
     def mult_ring_cnst(self, ct : RLWEctxt, const : int) -> RLWEctxt:
         a, b = ct
         return [const * a, const * b]
-    
\ No newline at end of file
+    
+
+    # ------------------------- Monomial products ------------------------- #
+    # X^k * ct in O(N). ct is a pair of Rings, or an array (..., 2, N) which, like the
+    # key arrays, is in the evaluation domain when q is NTT-friendly (limb-first for RNS).
+
+    def mul_monomial(self, ct : RLWEctxt, k : int) -> RLWEctxt:
+        if isinstance(ct, np.ndarray):
+            return mul_monomial(ct, k, self.q, get_transform(self.n, self.q))
+        a, b = ct
+        return [a.mul_monomial(k), b.mul_monomial(k)]
+
+    def mul_monomial_minus_one(self, ct : RLWEctxt, k : int) -> RLWEctxt:
+        '''(X^k - 1) * ct, the CGGI update term.'''
+        if isinstance(ct, np.ndarray):
+            transform = get_transform(self.n, self.q)
+            if transform is None:
+                return (mul_monomial(ct, k, self.q) - ct) % self.q
+            return transform.reduce(transform.mul_monomial(ct, k) - ct)
+        a, b = ct
+        return [a.mul_monomial(k).isub(a), b.mul_monomial(k).isub(b)]
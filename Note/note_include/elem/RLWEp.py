@@ -1,8 +1,11 @@
 import numpy as np
 from note_include.elem.RLWE import RLWE
-from note_include.elem.Ring import Ring
-from note_include.utils.gadget_decomposition import gadget_decomposition, format_ring_list, gadget_decomposition_int
-from note_include.utils.types import RLWEpctxt, RLWEctxt
+from note_include.elem.Ring import Ring, coeff_dtype
+from note_include.utils.gadget_decomposition import gadget_decomposition, format_ring_list, gadget_decomposition_int, signed_digits
+from note_include.utils.NTT import get_ntt
+from note_include.utils.RNS import get_rns, get_transform
+from note_include.utils.lazy import Accumulator
+from note_include.utils.types import RLWEpctxt, RLWEctxt, RLWEpctxt_ntt
 
 class RLWEp:
     def __init__(self, 
@@ -21,10 +24,10 @@ class RLWEp:
         self.d      = d
         self.CCrlwe = RLWE(dimension, modulus, s_std, e_std)
 
-    def encrypt(self, msg : Ring, sk : Ring) -> RLWEpctxt:
+    def encrypt(self, msg : Ring, sk : Ring, seed : int = None, index : int = 0) -> RLWEpctxt:
         ctxts = []
         for i in range(self.d):
-            ctxt = self.CCrlwe.encrypt((self.B ** i) * msg, sk)
+            ctxt = self.CCrlwe.encrypt((self.B ** i) * msg, sk, seed, index + i) # level i uses mask row index+i
             ctxts.append(ctxt)
 
         return ctxts
@@ -43,7 +46,7 @@ class RLWEp:
             Note that RLWEp multiplication uses only for multiply (huge) constant.
             -> Sure?
         '''
-        decomposed_vals = gadget_decomposition_int(num, self.B, self.d)
+        decomposed_vals = gadget_decomposition_int(num, self.B, self.d, self.q)
         zero_coeffs = np.zeros(self.n)
         zero_poly   = Ring(self.n, self.q, zero_coeffs)
         result      = [zero_poly, zero_poly]
@@ -54,14 +57,48 @@ class RLWEp:
         return result
     
     def mult_poly(self, ctxts : RLWEpctxt, poly : Ring) -> RLWEctxt:
+        '''sum_i ctxts[i] * digit_i(poly), the reduced products are summed lazily and reduced once.'''
         decomposed_polys = gadget_decomposition(poly, self.B, self.d)
-        zero_coeffs = np.zeros(self.n)
-        zero_poly   = Ring(self.n, self.q, zero_coeffs)
-        result      = [zero_poly, zero_poly]
-        
+        acc              = Accumulator.zeros(self.q, (2, self.n), coeff_dtype(self.q))
+
         for ctxt, d_poly in zip(ctxts, decomposed_polys):
-            if all(c == 0 for c in d_poly.coeffs):continue
-            tmp = result
-            result = self.CCrlwe.add_ctxt_ctxt(tmp, self.CCrlwe.mult_ring_ptxt(ctxt, d_poly))
-        
-        return result
\ No newline at end of file
+            if not d_poly.coeffs.any():continue
+            a, b = self.CCrlwe.mult_ring_ptxt(ctxt, d_poly)
+            acc.add(np.stack((a.coeffs, b.coeffs)), self.q - 1)
+
+        a, b = acc.result()
+        return [Ring.from_reduced(self.n, self.q, a), Ring.from_reduced(self.n, self.q, b)]
+    
+    def to_array(self, ctxts : RLWEpctxt) -> np.ndarray:
+        '''Coefficient-domain (d, 2, N) array, the layout of to_ntt without the transform.'''
+        return np.array([[a.coeffs, b.coeffs] for a, b in ctxts])
+
+    def from_array(self, arr : np.ndarray) -> RLWEpctxt:
+        return [(Ring(self.n, self.q, a), Ring(self.n, self.q, b)) for a, b in arr]
+
+    # ---------------------- Evaluation (NTT) domain ---------------------- #
+
+    def to_ntt(self, ctxts : RLWEpctxt) -> RLWEpctxt_ntt:
+        '''(d, 2, N) evaluations, or (L, d, 2, N) limbs when q is an RNS modulus.'''
+        return get_transform(self.n, self.q).forward(self.to_array(ctxts))
+
+    def mult_digits_ntt(self, ctxts_hat : RLWEpctxt_ntt, digits_hat : np.ndarray) -> np.ndarray:
+        '''
+            Pointwise multiply-accumulate sum_i digits_hat[i] * ctxts_hat[i].
+            Both operands and the (2, N) result stay in the evaluation domain.
+        '''
+        acc = Accumulator.zeros(self.q, ctxts_hat.shape[1:]).add_sum(digits_hat[:, None, :] * ctxts_hat, (self.q - 1)**2)
+        return acc.result(out=acc.value)
+
+    def mult_poly_ntt(self, ctxts_hat : RLWEpctxt_ntt, poly : Ring) -> RLWEctxt:
+        digits = signed_digits(poly.coeffs, self.B, self.d, self.q) # transforms reduce the signed digits
+        nz     = digits.any(axis=1)                                 # skip zero digits
+
+        rns = get_rns(self.n, self.q)
+        if rns is not None: # limb-wise MAC, then CRT back to Z_q
+            a, b = rns.inverse(rns.mac(rns.forward(digits[nz]), ctxts_hat[:, nz]))
+        else:
+            ntt     = get_ntt(self.n, self.q)
+            acc_hat = self.mult_digits_ntt(ctxts_hat[nz], ntt.forward(digits[nz]))
+            a, b    = ntt.inverse(acc_hat)
+        return [Ring(self.n, self.q, a), Ring(self.n, self.q, b)]
@@ -1,4 +1,8 @@
 import numpy as np
+from note_include.utils.NTT  import get_ntt, MAX_NTT_MODULUS
+from note_include.utils.prng import uniform_rows
+from note_include.utils.RNS  import get_rns
+from note_include.utils.lazy import Accumulator
 
 def pad_coeffs(coeffs, n):
     """Pads coeffs with zeros to length n if necessary."""
@@ -6,50 +10,105 @@ def pad_coeffs(coeffs, n):
         return np.pad(coeffs, (0, n - len(coeffs)), 'constant')
     return coeffs
 
+def coeff_dtype(q):
+    """int64 while a product of two residues fits in a machine word, Python ints (object) otherwise."""
+    return np.int64 if q <= MAX_NTT_MODULUS else object
+
+def mul_monomial(coeffs:np.ndarray, k:int, q:int, ntt = None) -> np.ndarray:
+    '''
+        X^k * coeffs mod (X^N + 1, q) along the last axis in O(N) : a rotation with sign flips,
+        or for evaluation-domain data (ntt : its NegacyclicNTT or RNS) a pointwise product.
+    '''
+    if ntt is not None:
+        return ntt.mul_monomial(coeffs, k)
+    N   = coeffs.shape[-1]
+    k  %= 2 * N
+    out = np.roll(np.asarray(coeffs, dtype=coeff_dtype(q)), k % N, axis=-1)
+    out[..., :k % N] *= -1
+    if k >= N:
+        out = -out
+    return out % q
+
+def mul_monomials(coeffs:np.ndarray, ks, q:int) -> np.ndarray:
+    '''
+        X^ks[r] * coeffs[r] for a (k, ..., N) stack of coefficient-domain polynomials, one
+        power per row : out[r, ..., t] = +-coeffs[r, ..., (t - ks[r]) mod N] in one gather.
+    '''
+    N     = coeffs.shape[-1]
+    shape = (len(ks),) + (1,) * (coeffs.ndim - 2) + (N,)
+    src   = (np.arange(N)[None, :] - np.asarray(ks, dtype=np.int64)[:, None]) % (2 * N) # X^k x_j lands on t = j + k
+    out   = np.take_along_axis(coeffs, (src % N).reshape(shape), axis=-1)
+    out  *= np.where(src < N, 1, -1).reshape(shape)                                     # wrapped once : X^N = -1
+    return out % q
+
 class Ring:
+    __slots__ = ("n", "q", "coeffs")
+
     def __init__(self, dimension, modulus, coeffs):
         self.n = dimension
         self.q = modulus
-        self.coeffs = [int(coeff % self.q) for coeff in coeffs]
+
+        coeffs = np.asarray(coeffs)
+        if coeffs.dtype.kind == 'f':
+            coeffs = coeffs.astype(np.int64)
+        if coeffs.dtype == object or coeff_dtype(modulus) is object:
+            coeffs = coeffs.astype(object)
+        self.coeffs = np.zeros(dimension, dtype=coeff_dtype(modulus)) # zero padded to length n
+        self.coeffs[:len(coeffs)] = coeffs % modulus
+
+    @classmethod
+    def from_reduced(cls, dimension, modulus, coeffs):
+        """Wraps an already reduced coefficient buffer of length n without copying it."""
+        poly = cls.__new__(cls)
+        poly.n, poly.q, poly.coeffs = dimension, modulus, coeffs
+        return poly
 
     def nega_conv(self, other):
-        result = []
-        poly1 = pad_coeffs(self.coeffs, self.n)
-        poly2 = pad_coeffs(other.coeffs, self.n)
-        for k in range(self.n):
-            v = 0
-            for i in range(k+1):
-                v += poly1[i] * poly2[k-i]
-            for i in range(k+1, self.n):
-                v -= poly1[i] * poly2[(k + self.n - i)]
-
-            result.append(v)
-        return Ring(self.n, self.q, result)
+        '''
+            Schoolbook product : sum_i self[i] * X^i * other, where X^i * other is a window
+            of [-other, other]. The n scaled windows are summed lazily (utils/lazy.py).
+        '''
+        n, q   = self.n, self.q
+        window = np.concatenate([-other.coeffs, other.coeffs])
+        acc    = Accumulator.zeros(q, n, coeff_dtype(q))
+        for i in np.flatnonzero(self.coeffs):
+            acc.add(self.coeffs[i] * window[n - i:2 * n - i], (q - 1)**2)
+        return Ring.from_reduced(n, q, acc.result())
     
+    def ntt_mul(self, other):
+        ntt = get_ntt(self.n, self.q)
+        return Ring.from_reduced(self.n, self.q, ntt.multiply(self.coeffs, other.coeffs))
+
+    def rns_mul(self, other):
+        rns = get_rns(self.n, self.q)
+        return Ring.from_reduced(self.n, self.q, rns.multiply(self.coeffs, other.coeffs).astype(object))
+
     def ring_add_q(self, other):
         assert self.q == other.q
         assert self.n == other.n
 
-        add_coeffs = [a + b for a,b in zip(self.coeffs, other.coeffs)]
-        return Ring(self.n, self.q, add_coeffs)
+        return Ring.from_reduced(self.n, self.q, (self.coeffs + other.coeffs) % self.q)
     
     def ring_sub_q(self, other):
         assert self.q == other.q
         assert self.n == other.n
 
-        sub_coeffs = [a - b for a,b in zip(self.coeffs, other.coeffs)]
-        return Ring(self.n, self.q, sub_coeffs)
+        return Ring.from_reduced(self.n, self.q, (self.coeffs - other.coeffs) % self.q)
 
     def __mul__(self, other):
+        # NTT when q is NTT-friendly, limb-wise NTTs when q is a product of such primes
+        # (utils/RNS.py), schoolbook negacyclic convolution otherwise
+        if get_ntt(self.n, self.q) is not None:
+            return self.ntt_mul(other)
+        if get_rns(self.n, self.q) is not None:
+            return self.rns_mul(other)
         return self.nega_conv(other)
     
     def __rmul__(self, integer : int):
-        coeffs = [c * integer for c in self.coeffs]
-        return Ring(self.n, self.q, coeffs)
+        return Ring.from_reduced(self.n, self.q, self.coeffs * (int(integer) % self.q) % self.q)
     
     def __mod__(self, integer):
-        coeffs = [co % integer for co in self.coeffs]
-        return Ring(self.n, self.q, coeffs)
+        return Ring(self.n, self.q, self.coeffs % integer)
     
     def __add__(self, other):
         return self.ring_add_q(other)
@@ -81,7 +140,79 @@ class Ring:
         else:
             return f"({poly_str} | n={self.n}, q={self.q})"
 
+    # ------------------------ In-place variants ------------------------ #
+    # These overwrite self.coeffs, use them only on buffers nobody else holds.
+
+    def iadd(self, other):
+        assert self.q == other.q
+        assert self.n == other.n
+
+        self.coeffs += other.coeffs
+        self.coeffs %= self.q
+        return self
+
+    def isub(self, other):
+        assert self.q == other.q
+        assert self.n == other.n
+
+        self.coeffs -= other.coeffs
+        self.coeffs %= self.q
+        return self
+
+    def imul_scalar(self, integer : int):
+        self.coeffs *= int(integer) % self.q
+        self.coeffs %= self.q
+        return self
+
     def __getitem__(self, index):
         return self.coeffs[index]  # Allow indexing into the coefficient array
+
+    def mul_monomial(self, k : int):
+        """X^k * self in O(n), k may be negative."""
+        return Ring.from_reduced(self.n, self.q, mul_monomial(self.coeffs, k, self.q))
+
+    def automorphism(self, t : int):
+        """psi_t : p(X) -> p(X^t) for odd t, a signed permutation of the coefficients."""
+        assert t % 2 == 1, "Automorphisms of Z_q[X]/(X^n+1) need an odd power."
+        k      = np.arange(self.n) * t % (2 * self.n)
+        coeffs = np.empty_like(self.coeffs)
+        coeffs[k % self.n] = np.where(k < self.n, self.coeffs, -self.coeffs)
+        return Ring.from_reduced(self.n, self.q, coeffs % self.q)
     
 
+
+class SeededRing(Ring):
+    '''
+        Uniform polynomial given by row `index` of the mask stream of `seed` (utils/prng.py).
+        The coefficients are expanded on first use, and only (seed, index) is pickled.
+    '''
+    __slots__ = ("seed", "index", "_coeffs")
+
+    def __init__(self, dimension, modulus, seed, index = 0):
+        self.n       = dimension
+        self.q       = modulus
+        self.seed    = seed
+        self.index   = index
+        self._coeffs = None
+
+    @property
+    def coeffs(self):
+        if self._coeffs is None:
+            self._coeffs = uniform_rows(self.seed, self.q, self.n, self.index)[0].astype(coeff_dtype(self.q))
+        return self._coeffs
+
+    @coeffs.setter
+    def coeffs(self, value):
+        self.seed    = None # modified in place, no longer described by the seed
+        self._coeffs = value
+
+    def compress(self):
+        """Drops the cached expansion, only the seed is kept."""
+        if self.seed is not None:
+            self._coeffs = None
+        return self
+
+    def __reduce__(self):
+        if self.seed is None:
+            return (Ring.from_reduced, (self.n, self.q, self._coeffs))
+        return (SeededRing, (self.n, self.q, self.seed, self.index))
@@ -0,0 +1,138 @@
+import math
+import os
+import tempfile
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from note_include.utils.sampler import Sampler, get_sampler, using
+
+# ------------------ Process-pool bootstrap executor ------------------ #
+#
+# Every worker loads the evaluation keys once, in its initializer, from a key file
+# written by FHEW.save_keys. The file is memory-mapped (FHEW.load_keys), so all
+# workers share the key pages and tasks only carry the LWE ciphertexts.
+
+_worker_fhew = None
+
+def _init_worker(key_path):
+    global _worker_fhew
+    from note_include.FHEW import FHEW # imported here, FHEW imports this module
+    _worker_fhew = FHEW.load_keys(key_path)
+
+def _eval_chunk(tasks):
+    return _worker_fhew.evalBin_many([(ct1, ct2) for ct1, ct2, _ in tasks], [gate for _, _, gate in tasks])
+
+class BootstrapExecutor:
+    def __init__(self, fhew, n_workers = None, chunksize = None, key_path = None, mp_context = None):
+        '''
+            fhew      : FHEW context holding the evaluation keys.
+            n_workers : number of worker processes (default : os.cpu_count()).
+            chunksize : bootstraps sent to a worker per task (default : len(batch) / (4 * n_workers)).
+            key_path  : existing key file of fhew, otherwise the keys are saved to a temporary file.
+        '''
+        self.n_workers = n_workers or os.cpu_count()
+        self.chunksize = chunksize
+        self.tmp_path  = None
+
+        if key_path is None:
+            fd, key_path  = tempfile.mkstemp(prefix="toyfhew-", suffix=".keys")
+            os.close(fd)
+            fhew.save_keys(key_path)
+            self.tmp_path = key_path
+
+        self.key_path = key_path
+        self.pool     = ProcessPoolExecutor(max_workers=self.n_workers, mp_context=mp_context,
+                                            initializer=_init_worker, initargs=(key_path,))
+
+    def map(self, pairs, gates = "AND", chunksize = None) -> list:
+        '''
+            Bootstraps every (ct1, ct2) pair with its gate (one gate name or one per pair)
+            and returns the results in order.
+        '''
+        pairs = list(pairs)
+        gates = [gates] * len(pairs) if isinstance(gates, str) else list(gates)
+        assert len(gates) == len(pairs), "One gate per pair."
+
+        tasks     = [(ct1, ct2, gate) for (ct1, ct2), gate in zip(pairs, gates)]
+        chunksize = chunksize or self.chunksize or max(1, -(-len(tasks) // (4 * self.n_workers)))
+        chunks    = [tasks[i:i + chunksize] for i in range(0, len(tasks), chunksize)]
+
+        return [ct for chunk in self.pool.map(_eval_chunk, chunks) for ct in chunk]
+
+    def shutdown(self):
+        self.pool.shutdown()
+        if self.tmp_path is not None and os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+        self.tmp_path = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+
+# ------------------ Shared-memory key generation ------------------ #
+#
+# Key tensors (brk, ksk) are lists of independent leaves, e.g. brk[i][v][j] for DM.
+# generate_keys preallocates the whole (n_items, *leaf_shape) tensor in shared memory
+# and hands out flat [start, stop) ranges of leaves to one pool of workers, which write
+# their leaves in place : no nested pools, no per-task copies of the secret key (it is
+# sent once per worker, in the initializer) and no list of results to reassemble.
+#
+# Each range samples its errors and masks from its own stream, child `start` of one
+# SeedSequence with 128 bits of entropy drawn from the current sampler (utils/sampler.py).
+# Ranges are KEYGEN_CHUNK leaves (or the caller's chunksize) whatever the number of
+# workers, so a seeded sampler gives the same keys with or without the pool and the
+# streams are independent of the process a range runs in. Seeded masks (utils/prng.py)
+# only depend on the leaf index and are unaffected.
+
+KEYGEN_CHUNK = 8
+
+_worker_keys = None
+
+def _init_keygen(fill, context, shm_name, shape, dtype):
+    global _worker_keys
+    from multiprocessing.shared_memory import SharedMemory
+    shm          = SharedMemory(name=shm_name)
+    _worker_keys = (fill, context, shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf))
+
+def _fill_chunk(start, stop, entropy):
+    fill, context, _, out = _worker_keys
+    fill_range(fill, context, out, start, stop, entropy)
+
+def fill_range(fill, context, out, start, stop, entropy):
+    '''out[start:stop] = fill(context, start, stop), with the stream of child `start` of entropy.'''
+    with using(Sampler.stream(entropy, start)):
+        out[start:stop] = fill(context, start, stop)
+
+def generate_keys(fill, context, n_items, leaf_shape, dtype, n_workers = None, chunksize = None, mp_context = None) -> np.ndarray:
+    '''
+        (n_items, *leaf_shape) key tensor whose leaves [start, stop) are fill(context, start, stop).
+        fill      : module-level function (pickled by reference), context : its picklable arguments.
+        n_workers : number of worker processes (default : os.cpu_count()). With one worker, or
+                    for object arrays (Python-int coefficients), the ranges run in this process.
+        chunksize : leaves per task and per stream (default : KEYGEN_CHUNK), never derived from
+                    n_workers so that the keys do not depend on it.
+    '''
+    n_workers = n_workers or os.cpu_count()
+    chunksize = chunksize or KEYGEN_CHUNK
+    ranges    = [(start, min(start + chunksize, n_items)) for start in range(0, n_items, chunksize)]
+    entropy   = [int(x) for x in get_sampler().rng.integers(2**64, size=2, dtype=np.uint64)] # reproducible under utils.sampler.using
+    shape     = (n_items, *leaf_shape)
+
+    if n_workers == 1 or len(ranges) == 1 or np.dtype(dtype) == object:
+        out = np.empty(shape, dtype=dtype)
+        for start, stop in ranges:
+            fill_range(fill, context, out, start, stop, entropy)
+        return out
+
+    from multiprocessing.shared_memory import SharedMemory
+    shm = SharedMemory(create=True, size=max(1, math.prod(shape) * np.dtype(dtype).itemsize))
+    try:
+        with ProcessPoolExecutor(max_workers=n_workers, mp_context=mp_context, initializer=_init_keygen,
+                                 initargs=(fill, context, shm.name, shape, dtype)) as pool:
+            for task in [pool.submit(_fill_chunk, start, stop, entropy) for start, stop in ranges]:
+                task.result()
+        return np.ndarray(shape, dtype=dtype, buffer=shm.buf).copy() # the segment is released below
+    finally:
+        shm.close()
+        shm.unlink()
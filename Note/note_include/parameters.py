@@ -0,0 +1,237 @@
+# Parameter selection : noise and cost models for picking an FHEW parameter set
+#
+#   $ cd Note && python -m note_include.parameters --security 128 --p-fail -32 --objective latency
+#
+# prints the fastest (or smallest-key) set that meets the security level and the
+# failure probability, as keyword arguments of FHEW(...) plus its estimates.
+import argparse
+import json
+import math
+import time
+import numpy as np
+from functools import lru_cache
+from note_include.elem.Ring import Ring
+from note_include.elem.RGSW import RGSW
+from note_include.elem.RLWE import RLWE
+from note_include.utils.NTT import find_ntt_prime
+from note_include.utils.gadget_decomposition import max_digit
+
+# ------------------ Security ------------------ #
+#
+# Linear fit of the HomomorphicEncryption.org tables for 128-bit security with ternary
+# secrets and sigma = 3.2 (N = 1024 : log Q <= 27, 2048 : 54, 4096 : 109) :
+#     lambda ~ SECURITY_SLOPE * n / log2(q)
+# A coarse rule for ranking parameter sets, not a replacement for the lattice estimator.
+# It is applied to the RLWE part (N, Q) and to the LWE part (n, Q_ks) of the scheme.
+
+SECURITY_SLOPE = 3.375
+
+def security_bits(n:int, log_q:float) -> float:
+    return SECURITY_SLOPE * n / log_q
+
+def max_log_modulus(n:int, security:int) -> int:
+    return int(SECURITY_SLOPE * n / security)
+
+def min_dimension(log_q:float, security:int, step:int = 16) -> int:
+    return step * math.ceil(security * log_q / SECURITY_SLOPE / step)
+
+# ------------------ Noise ------------------ #
+#
+# Errors are tracked as (mean, variance) of one coefficient. Encryption errors follow
+# the samplers of this repository (utils/sampler.py) : LWE and RLWE errors are centered
+# discrete Gaussians of std e_std, whose variance is e_std^2 up to a negligible term for
+# e_std >= 1. Gadget digits are signed, uniform in [-B/2, B/2) (utils/gadget_decomposition.py).
+
+def lwe_error(e_std:float) -> tuple[float, float]:
+    return 0., e_std**2
+
+def rlwe_error(e_std:float) -> tuple[float, float]:
+    return 0., e_std**2
+
+def secret_norm2(dimension:int, s_std:str) -> float:
+    '''E ||s||^2 of a Binary or Gaussian (std 3.2) secret.'''
+    return dimension / 2 if s_std == "Binary" else dimension * 3.2**2
+
+def digit_moment(B:int) -> float:
+    '''E x^2 for a digit x uniform in [-B/2, B/2).'''
+    return (B**2 + 2) / 12 if B % 2 == 0 else (B**2 - 1) / 12
+
+def nonzero_digits(B:int) -> float:
+    '''Fraction of the digits that select a key (zero digits are skipped).'''
+    return 1 - 1 / B
+
+def digits(modulus:int, base:int) -> int:
+    return int(np.ceil(np.log(modulus) / np.log(base)))
+
+def external_product_variance(N:int, B:int, d_Q:int, e_std:float) -> float:
+    '''Error added by one RLWE x RGSW product : 2 d_Q digit polynomials times fresh errors.'''
+    return 2 * d_Q * N * digit_moment(B) * rlwe_error(e_std)[1]
+
+def blind_rotation_variance(config:dict) -> float:
+    '''Error variance of the rotated accumulator, mod Q.'''
+    n, N, q, Q, B = (config[k] for k in ("lwe_dimension", "dimension", "lwe_modulus", "modulus", "base_gd"))
+    v_ep = external_product_variance(N, B, digits(Q, B), config["e_std"])
+    if config["method"] == "DM":
+        return n * digits(q, B) * nonzero_digits(B) * v_ep # one product per nonzero digit of the a_i
+    if config["method"] == "BlockCGGI":
+        k = config.get("block_size", 2)
+        return -(-n // k) * (2**k - 1) * 2 * v_ep    # K = sum_U (X^-a_U - 1) RGSW(chi_U)
+    return n * 2 * v_ep                              # CGGI : (X^-a_i - 1) * product
+
+def output_noise(config:dict) -> tuple[float, float]:
+    '''(mean, variance) of the error of an evalBin output mod q : Q -> Q_ks -> key switch -> q.'''
+    n, N, q, Q = (config[k] for k in ("lwe_dimension", "dimension", "lwe_modulus", "modulus"))
+    Q_ks       = config.get("ks_modulus") or Q
+    d_ks       = digits(Q_ks, config["base_ks"])
+
+    var  = blind_rotation_variance(config) * (Q_ks / Q)**2
+    var += (1 + secret_norm2(N, config["s_std"])) / 12 if Q_ks != Q else 0. # rounding to Q_ks
+    mu, v_ks   = lwe_error(config["e_std"])
+    B_ks       = config["base_ks"]
+    mean       = N * (d_ks - 1) * mu / B_ks                                 # rows subtracted with sign(v) : E sign(v) = -1/B_ks,
+    var       += N * d_ks * (nonzero_digits(B_ks) * (v_ks + mu**2) - (mu / B_ks)**2) # about 0 for the top digit
+    mean, var  = mean * q / Q_ks, var * (q / Q_ks)**2 + (1 + secret_norm2(n, config["s_std"])) / 12
+    return mean, var
+
+def failure_probability(config:dict) -> float:
+    '''
+        Probability that the worst gate input, XOR of two outputs (2 e1 + 2 e2), leaves
+        the q/8 window of the test polynomial.
+    '''
+    mean, var = output_noise(config)
+    mean, std = 4 * mean, math.sqrt(8 * var)
+    bound     = config["lwe_modulus"] / 8
+    tail      = lambda x: 0.5 * math.erfc(x / (std * math.sqrt(2)))
+    return tail(bound - abs(mean)) + tail(bound + abs(mean))
+
+# ------------------ Cost model ------------------ #
+#
+# Latency is a sum of kernel counts times kernel times measured on this machine :
+#   t_ext(d)  external product with d gadget digits, fitted as t0 + t1 * d
+#   t_mono    (X^k - 1) * acc and the accumulation of a CGGI step
+#   t_ks      key switch, per gathered ksk entry ((n + 1) per nonzero digit of the N a_i)
+
+@lru_cache(maxsize=None)
+def calibrate(N:int, repeat:int = 5) -> dict:
+    def best(f):
+        t = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            f()
+            t     = min(t, time.perf_counter() - start)
+        return t
+
+    Q, B  = find_ntt_prime(N, 27), 2**4
+    sk    = Ring(N, Q, np.random.randint(0, 2, N))
+    acc   = [Ring(N, Q, np.random.randint(0, Q, N)), Ring(N, Q, np.random.randint(0, Q, N))]
+    t_ext = {}
+    for d in (2, 6):
+        C        = RGSW(N, Q, 0., 3.2, B, d)
+        key      = C.to_ntt(C.encrypt(Ring(N, Q, [1]), sk))
+        t_ext[d] = best(lambda: C.mult_rlwe(acc, key))
+    RLWE_CC = RLWE(N, Q, 0., 3.2)
+    t_mono  = best(lambda: RLWE_CC.iadd_ctxt_ctxt(RLWE_CC.mul_monomial_minus_one(acc, 3), acc))
+
+    n, rows = 512, 2 * N
+    ksk     = np.random.randint(0, 2**14, (rows, n + 1)).astype(np.uint16)
+    index   = np.random.randint(0, rows, rows)
+    t_ks    = best(lambda: ksk[index].sum(axis=0, dtype=np.int64)) / (rows * (n + 1))
+
+    slope = (t_ext[6] - t_ext[2]) / 4
+    return {"t_ext0" : t_ext[2] - 2 * slope, "t_ext1" : slope, "t_mono" : t_mono, "t_ks" : t_ks}
+
+def latency(config:dict, cal:dict) -> float:
+    n, N, q, Q, B = (config[k] for k in ("lwe_dimension", "dimension", "lwe_modulus", "modulus", "base_gd"))
+    Q_ks  = config.get("ks_modulus") or Q
+    t_ext = cal["t_ext0"] + cal["t_ext1"] * digits(Q, B)
+    if config["method"] == "DM":
+        t_br = n * digits(q, B) * nonzero_digits(B) * t_ext
+    elif config["method"] == "BlockCGGI":
+        k    = config.get("block_size", 2)
+        t_br = -(-n // k) * (t_ext + (2**k - 1) * cal["t_mono"])
+    else:
+        t_br = n * (t_ext + cal["t_mono"])
+    return t_br + N * digits(Q_ks, config["base_ks"]) * nonzero_digits(config["base_ks"]) * (n + 1) * cal["t_ks"]
+
+def signed_values(B:int, s_std:str) -> int:
+    '''RGSW keys per (i, j) of DM : the digit magnitudes, both signs for a non-binary secret.'''
+    return max_digit(B) if s_std == "Binary" else 2 * max_digit(B)
+
+def storage_bytes(modulus:int) -> int:
+    return 2 if modulus <= 2**16 else 4 if modulus <= 2**32 else 8
+
+def key_bytes(config:dict) -> int:
+    '''brk + ksk as stored (utils/keystore.storage_dtype).'''
+    n, N, q, Q, B = (config[k] for k in ("lwe_dimension", "dimension", "lwe_modulus", "modulus", "base_gd"))
+    Q_ks, B_ks    = config.get("ks_modulus") or Q, config["base_ks"]
+    rgsw          = 2 * digits(Q, B) * 2 * N * storage_bytes(Q)
+    if config["method"] == "DM":
+        brk = n * signed_values(B, config["s_std"]) * digits(q, B) * rgsw
+    elif config["method"] == "BlockCGGI":
+        k   = config.get("block_size", 2)
+        brk = -(-n // k) * (2**k - 1) * rgsw
+    else:
+        brk = n * rgsw
+    return brk + N * max_digit(B_ks) * digits(Q_ks, B_ks) * (n + 1) * storage_bytes(Q_ks)
+
+# ------------------ Search ------------------ #
+
+def candidates(security:int, methods, dimensions, s_std:str, e_std:float):
+    '''FHEW configurations meeting the security level (noise is checked by select).'''
+    for N in dimensions:
+        q        = 2 * N
+        max_bits = min(max_log_modulus(N, security), 30) # single NTT-friendly prime
+        for bits in range(max(max_bits - 6, 14), max_bits + 1):
+            Q = find_ntt_prime(N, bits)
+            for ks_bits in range(10, min(bits, 18) + 1):
+                n = min_dimension(ks_bits, security)
+                for method in methods:
+                    for b_g in range(2, 13):
+                        if method == "DM" and n * signed_values(2**b_g, s_std) * digits(q, 2**b_g) > 2**20: continue # key too large
+                        for b_ks in range(1, 8):
+                            config = dict(lwe_dimension = n,      lwe_modulus = q,
+                                          dimension     = N,      modulus     = Q,
+                                          s_std         = s_std,  e_std       = e_std,
+                                          base_gd       = 2**b_g, base_ks     = 2**b_ks,
+                                          method        = method, ks_modulus  = 2**ks_bits)
+                            if method != "BlockCGGI":
+                                yield config
+                                continue
+                            for k in (2, 3):
+                                yield dict(config, block_size = k)
+
+def select(security = 128, p_fail = 2**-32, objective = "latency", methods = ("DM", "CGGI"),
+           dimensions = (512, 1024, 2048), s_std = "Binary", e_std = 3.2):
+    '''
+        The candidate with the smallest estimated latency (objective = "latency") or key
+        size ("key_size") whose failure probability is at most p_fail, as (config, estimate).
+        config is ready for FHEW(**config).
+    '''
+    best = None
+    for config in candidates(security, methods, dimensions, s_std, e_std):
+        p = failure_probability(config)
+        if p > p_fail: continue
+        estimate = {"latency"  : latency(config, calibrate(config["dimension"])),
+                    "key_size" : key_bytes(config),
+                    "log2_p_fail" : math.log2(p) if p > 0 else -math.inf,
+                    "security" : min(security_bits(config["dimension"], math.log2(config["modulus"])),
+                                     security_bits(config["lwe_dimension"], math.log2(config["ks_modulus"])))}
+        if best is None or estimate[objective] < best[1][objective]:
+            best = (config, estimate)
+    if best is None:
+        raise ValueError("No parameter set meets the security level and failure probability.")
+    return best
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="FHEW parameter selection from noise and cost models.")
+    parser.add_argument("--security",   type=int,   default=128)
+    parser.add_argument("--p-fail",     type=float, default=-32, help="log2 of the allowed failure probability")
+    parser.add_argument("--objective",  default="latency", choices=["latency", "key_size"])
+    parser.add_argument("--method",     nargs="+", default=["DM", "CGGI"], choices=["DM", "CGGI", "BlockCGGI"])
+    parser.add_argument("--dimension",  nargs="+", type=int, default=[512, 1024, 2048])
+    parser.add_argument("--s-std",      default="Binary", choices=["Binary", "Gaussian"])
+    parser.add_argument("--e-std",      type=float, default=3.2)
+    args = parser.parse_args()
+
+    config, estimate = select(args.security, 2**args.p_fail, args.objective, args.method, args.dimension, args.s_std, args.e_std)
+    print(json.dumps({"config" : config, "estimate" : estimate}, indent=2))
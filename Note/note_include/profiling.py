@@ -0,0 +1,210 @@
+import time
+import numpy as np
+from collections import defaultdict
+from note_include.elem.Ring  import Ring
+from note_include.elem.RGSW  import RGSW
+from note_include.elem.RLWEp import RLWEp
+from note_include.utils.NTT  import NegacyclicNTT
+from note_include.utils.gadget_decomposition import signed_digits
+
+# ------------------ Per-stage profiling of evalBin ------------------ #
+#
+#   with fhew.profile() as prof:
+#       fhew.evalBin(c1, c2, "AND")
+#   print(prof.report())
+#
+# While the profiler is active, the stages of the FHEW instance (acc_init, Blindrotation,
+# LWEextract, ModSwitch, KeySwitch) are timed and the operations below are counted :
+#
+#   external_products : RGSW x RLWE products (RGSW.mult_rlwe)
+#   gadget_products   : RLWE' x polynomial products outside external products, i.e. the
+#                       LMKCDEY automorphism key switches (RLWEp.mult_poly / mult_poly_ntt)
+#   ring_mults        : Ring multiplications (Ring.__mul__)
+#   ntts              : polynomials through a forward or inverse NTT (per limb for RNS)
+#   skipped_products  : external products a blind rotation saved on zero mask coefficients
+#   key_bytes         : bytes of key material read (RGSW, RLWE' and key-switching rows)
+#
+# The counters are installed by wrapping the methods on entry and removed on exit, so
+# nothing is left in the hot paths when profiling is off. Class-level counters see
+# everything this process runs while active; process-pool workers are not profiled
+# (use evalBin_batch(..., n_workers = 1)). A batched blind rotation (evalBin_many) is
+# one "blindrotation" call for all its gates, and reads each key once for all of them.
+
+STAGES   = ("acc_init", "blindrotation", "lwe_extract", "mod_switch", "key_switch")
+COUNTERS = ("external_products", "gadget_products", "ring_mults", "ntts", "skipped_products", "key_bytes")
+
+class Profiler:
+    def __init__(self, fhew, callback = None):
+        '''
+            callback : called after every evalBin with a dict of that gate's "gate",
+                       "time", "stages" (stage -> seconds) and "counts" (counter -> count).
+        '''
+        self.fhew     = fhew
+        self.callback = callback
+        self.stages   = defaultdict(float) # stage -> total seconds
+        self.calls    = defaultdict(int)   # stage -> number of calls
+        self.counts   = defaultdict(int)   # counter -> total
+        self.gates    = defaultdict(int)   # gate -> evalBin calls
+        self.patches  = []
+        self.depth    = 0                  # > 0 inside an external product
+
+    # ------------------------ Installation ------------------------ #
+
+    def __enter__(self):
+        fhew = self.fhew
+        for stage, owner, name in (("acc_init",      fhew,        "acc_init"),
+                                   ("blindrotation", fhew.method, "Blindrotation"),
+                                   ("lwe_extract",   fhew,        "LWEextract"),
+                                   ("mod_switch",    fhew,        "ModSwitch"),
+                                   ("key_switch",    fhew,        "KeySwitch")):
+            self.patch(owner, name, self.timed(stage, getattr(owner, name)))
+        self.patch(fhew,          "evalBin",       self.per_gate(fhew.evalBin))
+        self.patch(fhew,          "evalBin_many",  self.per_batch(fhew.evalBin_many))
+        self.patch(fhew.method,   "Blindrotation", self.skips(fhew.method.Blindrotation))
+        if hasattr(fhew.method, "Blindrotation_batch"):
+            batch = self.timed("blindrotation", fhew.method.Blindrotation_batch)
+            self.patch(fhew.method, "Blindrotation_batch", self.skips(batch, batched=True))
+        self.patch(fhew,          "KeySwitch",     self.counted(fhew.KeySwitch, None, self.ksk_bytes))
+
+        self.patch(RGSW,          "mult_rlwe",     self.external(RGSW.mult_rlwe))
+        self.patch(RGSW,          "external_product_batch", self.external_batch(RGSW.external_product_batch))
+        self.patch(RLWEp,         "mult_poly",     self.counted(RLWEp.mult_poly,     "gadget_products", lambda args: nbytes(args[1])))
+        self.patch(RLWEp,         "mult_poly_ntt", self.counted(RLWEp.mult_poly_ntt, "gadget_products", lambda args: nbytes(args[1])))
+        self.patch(Ring,          "__mul__",       self.counted(Ring.__mul__,       "ring_mults"))
+        self.patch(NegacyclicNTT, "forward",       self.counted(NegacyclicNTT.forward, "ntts", None, polys))
+        self.patch(NegacyclicNTT, "inverse",       self.counted(NegacyclicNTT.inverse, "ntts", None, polys))
+        return self
+
+    def __exit__(self, *exc):
+        for owner, name, original in reversed(self.patches):
+            if isinstance(owner, type):
+                setattr(owner, name, original)
+            else:
+                delattr(owner, name) # instance attribute over the class method
+        self.patches = []
+        return False
+
+    def patch(self, owner, name, wrapper):
+        original = owner.__dict__[name] if isinstance(owner, type) else None
+        if isinstance(owner, type) or name not in vars(owner):
+            self.patches.append((owner, name, original))
+        setattr(owner, name, wrapper)
+
+    # -------------------------- Wrappers -------------------------- #
+
+    def timed(self, stage, f):
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return f(*args, **kwargs)
+            finally:
+                self.stages[stage] += time.perf_counter() - start
+                self.calls[stage]  += 1
+        return wrapper
+
+    def counted(self, f, counter, key_bytes = None, amount = None):
+        '''counter += amount(args) (default 1), key_bytes += key_bytes(args), outside external products.'''
+        def wrapper(*args, **kwargs):
+            if counter == "gadget_products" and self.depth:
+                return f(*args, **kwargs)
+            if counter is not None:
+                self.counts[counter] += 1 if amount is None else amount(args)
+            if key_bytes is not None:
+                self.counts["key_bytes"] += key_bytes(args)
+            return f(*args, **kwargs)
+        return wrapper
+
+    def external(self, f):
+        def wrapper(rgsw_cc, rlwe_ctxt, rgsw_ctxt, *args, **kwargs):
+            self.counts["external_products"] += 1
+            self.counts["key_bytes"]         += nbytes(rgsw_ctxt)
+            self.depth += 1
+            try:
+                return f(rgsw_cc, rlwe_ctxt, rgsw_ctxt, *args, **kwargs)
+            finally:
+                self.depth -= 1
+        return wrapper
+
+    def external_batch(self, f):
+        '''k external products, but the key is read once.'''
+        def wrapper(rgsw_cc, accs, rgsw_arr, *args, **kwargs):
+            self.counts["external_products"] += len(accs)
+            self.counts["key_bytes"]         += nbytes(rgsw_arr)
+            return f(rgsw_cc, accs, rgsw_arr, *args, **kwargs)
+        return wrapper
+
+    def skips(self, f, batched = False):
+        method = self.fhew.method
+        def wrapper(ctxt_operand, *args, **kwargs):
+            for op in (ctxt_operand if batched else [ctxt_operand]):
+                self.counts["skipped_products"] += method.skipped_products(op[0])
+            return f(ctxt_operand, *args, **kwargs)
+        return wrapper
+
+    def per_gate(self, f):
+        def wrapper(ctxt1, ctxt2, gate = "AND"):
+            stages, counts = dict(self.stages), dict(self.counts)
+            start          = time.perf_counter()
+            result         = f(ctxt1, ctxt2, gate)
+            elapsed        = time.perf_counter() - start
+            self.stages["evalBin"] += elapsed
+            self.calls["evalBin"]  += 1
+            self.gates[gate]       += 1
+            if self.callback is not None:
+                self.callback({"gate"   : gate, "time" : elapsed,
+                               "stages" : {s : self.stages[s] - stages.get(s, 0.) for s in STAGES},
+                               "counts" : {c : self.counts[c] - counts.get(c, 0)  for c in COUNTERS}})
+            return result
+        return wrapper
+
+    def per_batch(self, f):
+        '''evalBin_many : the gates are counted, the callback only sees single evalBin calls.'''
+        def wrapper(pairs, gates = "AND"):
+            gate_list = [gates] * len(pairs) if isinstance(gates, str) else list(gates)
+            start     = time.perf_counter()
+            result    = f(pairs, gates)
+            self.stages["evalBin"] += time.perf_counter() - start
+            self.calls["evalBin"]  += len(pairs)
+            for gate in gate_list:
+                self.gates[gate] += 1
+            return result
+        return wrapper
+
+    def ksk_bytes(self, args):
+        '''One (n + 1) row per nonzero signed digit of every input coefficient.'''
+        fhew = self.fhew
+        rows = int(np.count_nonzero(signed_digits(np.asarray(args[0][0], dtype=np.int64), fhew.B_ks, fhew.d_ks, fhew.Q_ks)))
+        return rows * (fhew.n + 1) * np.dtype(fhew.ksk.dtype).itemsize
+
+    # --------------------------- Results --------------------------- #
+
+    def as_dict(self) -> dict:
+        return {"gates"  : dict(self.gates),
+                "stages" : {s : {"calls" : self.calls[s], "seconds" : self.stages[s]} for s in STAGES + ("evalBin",)},
+                "counts" : {c : self.counts[c] for c in COUNTERS}}
+
+    def report(self) -> str:
+        gates = max(1, self.calls["evalBin"])
+        lines = [f"{self.calls['evalBin']} gate(s) : " + ", ".join(f"{g} x{k}" for g, k in self.gates.items()),
+                 f"{'stage':<18} {'calls':>8} {'total (s)':>12} {'per gate (s)':>14}"]
+        for s in STAGES + ("evalBin",):
+            lines.append(f"{s:<18} {self.calls[s]:>8} {self.stages[s]:>12.6f} {self.stages[s] / gates:>14.6f}")
+        lines.append(f"{'counter':<18} {'total':>21} {'per gate':>14}")
+        for c in COUNTERS:
+            lines.append(f"{c:<18} {self.counts[c]:>21} {self.counts[c] / gates:>14.1f}")
+        return "\n".join(lines)
+
+# ------------------------------------------------------------------- #
+
+def nbytes(key) -> int:
+    '''Bytes of a key operand : an array, or (nested lists of) Ring ciphertexts.'''
+    if isinstance(key, np.ndarray):
+        return key.nbytes
+    if isinstance(key, Ring):
+        return key.coeffs.nbytes
+    return sum(nbytes(k) for k in key)
+
+def polys(args) -> int:
+    '''Number of length-n polynomials in the input of a transform (self, a, ...).'''
+    ntt, a = args[0], args[1]
+    return int(np.size(a)) // ntt.n
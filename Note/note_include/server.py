@@ -0,0 +1,336 @@
+# Asyncio gate service : holds the evaluation keys and bootstraps gates for many clients
+#
+#   $ cd Note && python -m note_include.server keys.bin --unix /tmp/toyfhew.sock
+#   $ python -m note_include.server keys.bin --host 127.0.0.1 --port 8765 --workers 4 --window-ms 2
+#
+# Clients (client.py) send evalBin / evalNOT requests in the compact encoding of
+# utils/wire.py. evalNOT needs no bootstrapping and is answered inline.
+import argparse
+import asyncio
+import os
+import signal
+import sys
+import time
+import numpy as np
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from note_include.FHEW        import FHEW, GATES
+from note_include.parallel    import BootstrapExecutor, _eval_chunk
+from note_include.utils       import wire
+
+# ------------------ Micro-batching ------------------ #
+#
+# evalBin requests from all connections go through one bounded queue. A batcher takes
+# one of `max_inflight` batch slots (default : one per worker), then collects requests
+# for up to `window` seconds or `max_batch` requests, and sends the batch to the pool as
+# one evalBin_many task. While every worker is busy the queue fills, so batches grow
+# with the load and a lone request only waits `window`.
+#
+# Backpressure : when the queue holds `max_queue` requests, a connection's reader waits
+# for room before reading its next frame, so the socket buffers fill and clients block
+# in their writes instead of the server buffering without bound.
+#
+# Shutdown (close(), SIGINT / SIGTERM) : the listener stops accepting, requests that
+# arrive afterwards get a CLOSING response, every queued or running request is still
+# answered, then the connections and the pool are closed.
+
+class Pending:
+    __slots__ = ("ct1", "ct2", "gate", "future", "arrival")
+
+    def __init__(self, ct1, ct2, gate, future, arrival):
+        self.ct1, self.ct2, self.gate = ct1, ct2, gate
+        self.future                   = future
+        self.arrival                  = arrival
+
+class GateServer:
+    def __init__(self, fhew, n_workers = None, window = 0.002, max_batch = 64, max_queue = 1024,
+                 max_inflight = None, key_path = None, history = 10000):
+        '''
+            fhew         : FHEW context holding the evaluation keys (brk, ksk).
+            n_workers    : bootstrap worker processes (default : os.cpu_count()), 0 bootstraps
+                           in a thread of this process.
+            window       : seconds a batch waits for more requests after its first one.
+            max_batch    : most requests in one batch.
+            max_queue    : queued requests before readers stop reading (backpressure).
+            max_inflight : batches being bootstrapped at once (default : max(1, n_workers)).
+            key_path     : key file of fhew for the workers, otherwise a temporary one is written.
+            history      : requests kept for the latency percentiles of metrics().
+        '''
+        self.fhew         = fhew
+        self.window       = window
+        self.max_batch    = max_batch
+        self.max_queue    = max_queue
+        self.n_workers    = os.cpu_count() if n_workers is None else n_workers
+        self.max_inflight = max_inflight or max(1, self.n_workers)
+        self.key_path     = key_path or fhew.key_path
+        self.info         = {"n" : fhew.n, "q" : fhew.q, "N" : fhew.N, "Q" : fhew.Q, "gates" : list(GATES),
+                             "method" : fhew.config["method"], "lwe_bytes" : wire.lwe_bytes(fhew.n, fhew.q)}
+
+        self.server      = None
+        self.executor    = None
+        self.queue       = None
+        self.slots       = None
+        self.batcher     = None
+        self.batches     = set()  # running batch tasks
+        self.connections = {}     # writer -> set of response tasks
+        self.handlers    = set()  # connection tasks
+        self.closing     = False
+
+        self.started     = None
+        self.latency     = {stage : deque(maxlen=history) for stage in ("queue", "service", "total")}
+        self.counts      = defaultdict(int)
+        self.batch_sizes = deque(maxlen=history)
+
+    # ------------------------ Lifecycle ------------------------ #
+
+    async def start(self, host = None, port = None, path = None):
+        '''Listens on the Unix socket `path`, or on TCP (host, port) ; port 0 picks a free port.'''
+        if self.n_workers == 0:
+            self.executor = ThreadPoolExecutor(max_workers=1)
+        else:
+            self.executor = BootstrapExecutor(self.fhew, self.n_workers, key_path=self.key_path)
+        self.queue   = asyncio.Queue(self.max_queue)
+        self.slots   = asyncio.Semaphore(self.max_inflight)
+        self.batcher = asyncio.create_task(self.batch_loop())
+        self.started = time.perf_counter()
+
+        if path is not None:
+            self.server = await asyncio.start_unix_server(self.handle, path=path)
+        else:
+            self.server = await asyncio.start_server(self.handle, host or "127.0.0.1", port or 0)
+        return self
+
+    @property
+    def address(self):
+        '''Socket path, or the (host, port) actually bound.'''
+        return self.server.sockets[0].getsockname()
+
+    async def close(self):
+        '''Graceful shutdown : answers every accepted request, then releases the pool.'''
+        if self.closing: return
+        self.closing = True
+        self.server.close()
+
+        await self.queue.put(None) # behind every accepted request
+        await self.batcher
+        await asyncio.gather(*self.batches)
+        while not self.queue.empty(): # put by a reader that was waiting for room
+            item = self.queue.get_nowait()
+            if item is not None:
+                item.future.set_exception(RuntimeError("Server is shutting down."))
+        for tasks in list(self.connections.values()):
+            await asyncio.gather(*tasks)
+        for writer in list(self.connections):
+            writer.close()
+        await asyncio.gather(*self.handlers, return_exceptions=True)
+        await self.server.wait_closed()
+
+        if isinstance(self.executor, BootstrapExecutor):
+            self.executor.shutdown()
+        else:
+            self.executor.shutdown(wait=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    # ------------------------ Connections ------------------------ #
+
+    async def handle(self, reader, writer):
+        tasks = self.connections.setdefault(writer, set())
+        lock  = asyncio.Lock() # one drain at a time
+        self.handlers.add(asyncio.current_task())
+        try:
+            while True:
+                try:
+                    body = await wire.read_frame(reader)
+                except (ConnectionError, ValueError):
+                    break
+                if body is None:
+                    break
+                arrival           = time.perf_counter()
+                request_id, reply = await self.admit(body, arrival) # waits while the queue is full
+                task              = asyncio.create_task(self.respond(writer, lock, request_id, reply))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        finally:
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self.connections.pop(writer, None)
+            self.handlers.discard(asyncio.current_task())
+            writer.close()
+
+    async def admit(self, body, arrival):
+        '''(request id, Pending) for a queued evalBin, (request id, (status, payload)) otherwise.'''
+        n, q = self.fhew.n, self.fhew.q
+        size = wire.lwe_bytes(n, q)
+        try:
+            request_id, op, gate = wire.REQUEST.unpack_from(body)
+        except Exception:
+            return 0, (wire.ERROR, b"Malformed request.")
+        payload = body[wire.REQUEST.size:]
+        self.counts[f"op_{op}"] += 1
+
+        try:
+            if op == wire.INFO:
+                return request_id, (wire.OK, wire.pack_json(self.info))
+            if op == wire.METRICS:
+                return request_id, (wire.OK, wire.pack_json(self.metrics()))
+            if self.closing:
+                return request_id, (wire.CLOSING, b"Server is shutting down.")
+            if op == wire.EVAL_NOT:
+                if len(payload) != size:
+                    raise ValueError(f"evalNOT expects {size} bytes, got {len(payload)}.")
+                return request_id, (wire.OK, wire.pack_lwe(self.fhew.evalNOT(wire.unpack_lwe(payload, n, q)), q))
+            if op == wire.EVAL_BIN:
+                if len(payload) != 2 * size:
+                    raise ValueError(f"evalBin expects {2 * size} bytes, got {len(payload)}.")
+                if gate >= len(GATES):
+                    raise ValueError(f"Unknown gate {gate}.")
+                ct1, ct2 = wire.unpack_lwe(payload[:size], n, q), wire.unpack_lwe(payload[size:], n, q)
+                pending  = Pending(ct1, ct2, GATES[gate], asyncio.get_running_loop().create_future(), arrival)
+                await self.queue.put(pending)
+                return request_id, pending
+            raise ValueError(f"Unknown op {op}.")
+        except Exception as exc:
+            self.counts["errors"] += 1
+            return request_id, (wire.ERROR, f"{type(exc).__name__} : {exc}".encode())
+
+    async def respond(self, writer, lock, request_id, reply):
+        if not isinstance(reply, Pending):
+            return await self.send(writer, lock, request_id, *reply)
+        try:
+            status, payload = wire.OK, wire.pack_lwe(await reply.future, self.fhew.q)
+        except Exception as exc:
+            self.counts["errors"] += 1
+            status, payload = wire.ERROR, f"{type(exc).__name__} : {exc}".encode()
+        await self.send(writer, lock, request_id, status, payload)
+        self.latency["total"].append(time.perf_counter() - reply.arrival)
+
+    async def send(self, writer, lock, request_id, status, payload):
+        try:
+            async with lock:
+                writer.write(wire.frame(wire.RESPONSE, request_id, status, payload))
+                await writer.drain()
+        except ConnectionError:
+            pass # client went away, its requests were still evaluated
+
+    # ------------------------ Batching ------------------------ #
+
+    async def batch_loop(self):
+        loop = asyncio.get_running_loop()
+        done = False
+        while not done:
+            await self.slots.acquire()
+            first = await self.queue.get()
+            if first is None:
+                break
+            batch    = [first]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch:
+                try:
+                    item = self.queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self.queue.get(), timeout)
+                    except asyncio.TimeoutError: # not TimeoutError before 3.11
+                        break
+                if item is None:
+                    done = True
+                    break
+                batch.append(item)
+
+            task = asyncio.create_task(self.run_batch(batch))
+            self.batches.add(task)
+            task.add_done_callback(self.batches.discard)
+
+    async def run_batch(self, batch):
+        loop  = asyncio.get_running_loop()
+        start = time.perf_counter()
+        for p in batch:
+            self.latency["queue"].append(start - p.arrival)
+        self.batch_sizes.append(len(batch))
+        self.counts["batches"] += 1
+        try:
+            if isinstance(self.executor, BootstrapExecutor):
+                results = await loop.run_in_executor(self.executor.pool, _eval_chunk, [(p.ct1, p.ct2, p.gate) for p in batch])
+            else:
+                results = await loop.run_in_executor(self.executor, self.fhew.evalBin_many,
+                                                     [(p.ct1, p.ct2) for p in batch], [p.gate for p in batch])
+        except Exception as exc:
+            for p in batch:
+                p.future.set_exception(exc)
+        else:
+            service = time.perf_counter() - start
+            for p, result in zip(batch, results):
+                self.latency["service"].append(service)
+                p.future.set_result(result)
+            self.counts["completed"] += len(batch)
+        finally:
+            self.slots.release()
+
+    # ------------------------ Metrics ------------------------ #
+
+    def metrics(self) -> dict:
+        '''Counters, queue state and latency percentiles (ms) over the last `history` requests.'''
+        uptime = time.perf_counter() - self.started
+        result = {"uptime"         : uptime,
+                  "completed"      : self.counts["completed"],
+                  "errors"         : self.counts["errors"],
+                  "throughput"     : self.counts["completed"] / uptime if uptime else 0.,
+                  "requests"       : {name : self.counts[f"op_{op}"] for name, op in
+                                      (("evalBin", wire.EVAL_BIN), ("evalNOT", wire.EVAL_NOT))},
+                  "batches"        : self.counts["batches"],
+                  "mean_batch"     : float(np.mean(self.batch_sizes)) if self.batch_sizes else 0.,
+                  "queued"         : self.queue.qsize(),
+                  "running"        : len(self.batches),
+                  "connections"    : len(self.connections),
+                  "latency_ms"     : {}}
+        for stage, samples in self.latency.items():
+            result["latency_ms"][stage] = percentiles(samples)
+        return result
+
+def percentiles(samples) -> dict:
+    '''mean / p50 / p90 / p99 / max of latencies in seconds, in milliseconds.'''
+    if not samples:
+        return {}
+    ms = 1e3 * np.asarray(samples)
+    return {"mean" : float(ms.mean()), "max" : float(ms.max()),
+            **{f"p{p}" : float(np.percentile(ms, p)) for p in (50, 90, 99)}}
+
+# ------------------------------------------------------------------- #
+
+async def serve(key_path, host = None, port = None, path = None, **kwargs):
+    '''Serves the keys of key_path until SIGINT / SIGTERM, then shuts down gracefully.'''
+    fhew   = FHEW.load_keys(key_path)
+    server = await GateServer(fhew, key_path=key_path, **kwargs).start(host, port, path)
+    stop   = asyncio.Event()
+    loop   = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    print(f"serving {fhew.config['method']} keys (n = {fhew.n}, q = {fhew.q}) on {server.address}", file=sys.stderr)
+    await stop.wait()
+    print("shutting down ...", file=sys.stderr)
+    await server.close()
+    if path is not None and os.path.exists(path):
+        os.remove(path)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="FHEW gate evaluation server.")
+    parser.add_argument("keys",           help="key file written by FHEW.save_keys")
+    parser.add_argument("--unix",         help="Unix socket path (otherwise TCP)")
+    parser.add_argument("--host",         default="127.0.0.1")
+    parser.add_argument("--port",         type=int,   default=8765)
+    parser.add_argument("--workers",      type=int,   default=None, help="bootstrap processes, 0 = a thread of the server")
+    parser.add_argument("--window-ms",    type=float, default=2.,   help="batching window")
+    parser.add_argument("--max-batch",    type=int,   default=64)
+    parser.add_argument("--max-queue",    type=int,   default=1024)
+    args = parser.parse_args()
+
+    asyncio.run(serve(args.keys, args.host, args.port, args.unix, n_workers=args.workers,
+                      window=args.window_ms / 1e3, max_batch=args.max_batch, max_queue=args.max_queue))
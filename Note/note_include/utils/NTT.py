@@ -1,5 +1,8 @@
-## Not yet
 import numpy as np
+from functools import lru_cache
+
+# Largest modulus for which a product of two residues still fits in int64.
+MAX_NTT_MODULUS = 2**31
 
 def mod_inverse(a, m):
     """Compute the modular inverse of a modulo m using the Extended Euclidean Algorithm."""
@@ -113,4 +116,159 @@ def positive_wrapped_intt(hat_a, omega_inv, q, n, n_inv):
         # Take modulo q for the result
         a[i] = (n_inv * summation) % q
             
-    return a
\ No newline at end of file
+    return a
+
+# ------------------------ Negacyclic NTT (fast) ------------------------ #
+
+def is_prime(n):
+    """Deterministic Miller-Rabin test (exact for n < 3.3 * 10^24)."""
+    if n < 2:
+        return False
+    small = [2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37]
+    for p in small:
+        if n % p == 0:
+            return n == p
+    d, r = n - 1, 0
+    while d % 2 == 0:
+        d //= 2
+        r += 1
+    for a in small:
+        x = pow(a, d, n)
+        if x == 1 or x == n - 1:
+            continue
+        for _ in range(r - 1):
+            x = pow(x, 2, n)
+            if x == n - 1:
+                break
+        else:
+            return False
+    return True
+
+def is_ntt_friendly(n, q):
+    """True if Z_q[X]/(X^n+1) admits a negacyclic NTT handled by NegacyclicNTT."""
+    return (n & (n - 1)) == 0 and q < MAX_NTT_MODULUS and (q - 1) % (2 * n) == 0 and is_prime(q)
+
+def find_ntt_prime(n, bits):
+    """Largest prime q < 2^bits with q = 1 mod 2n."""
+    q = ((2**bits - 1) // (2 * n)) * (2 * n) + 1
+    while q > 2 * n:
+        if q < 2**bits and is_prime(q):
+            return q
+        q -= 2 * n
+    raise ValueError("No NTT-friendly prime found.")
+
+def find_ntt_primes(n, bits, count):
+    """The count largest primes q < 2^bits with q = 1 mod 2n, in decreasing order."""
+    primes, q = [], ((2**bits - 1) // (2 * n)) * (2 * n) + 1
+    while len(primes) < count:
+        if q <= 2 * n:
+            raise ValueError("Not enough NTT-friendly primes.")
+        if q < 2**bits and is_prime(q):
+            primes.append(q)
+        q -= 2 * n
+    return primes
+
+def primitive_2nth_root(n, q):
+    """
+        Return psi, a primitive 2n-th root of unity modulo the prime q (psi^n = -1).
+        Unlike primitive_root, this does not need the factorization of q-1.
+    """
+    if (q - 1) % (2 * n) != 0:
+        raise ValueError("2n does not divide q-1. 2n-th roots of unity do not exist in Z_q.")
+    exponent = (q - 1) // (2 * n)
+    for x in range(2, q):
+        psi = pow(x, exponent, q)
+        if pow(psi, n, q) == q - 1:
+            return psi
+    raise ValueError("No primitive 2n-th root found.")
+
+def bit_reverse(n):
+    """Bit-reversal permutation of [0, n) for a power-of-two n."""
+    logn = n.bit_length() - 1
+    rev  = np.zeros(n, dtype=np.int64)
+    idx  = np.arange(n, dtype=np.int64)
+    for k in range(logn):
+        rev |= ((idx >> k) & 1) << (logn - 1 - k)
+    return rev
+
+class NegacyclicNTT:
+    """
+        Negacyclic NTT over Z_q[X]/(X^n+1).
+
+        The twist by psi (psi^2 = omega) is merged into the butterflies, so the
+        forward transform is a Cooley-Tukey NTT taking natural order to
+        bit-reversed order and the inverse is a Gentleman-Sande NTT taking it
+        back. Each stage is one vectorized butterfly over a (..., m, 2, t) view,
+        so the transforms also act on stacks of polynomials along the last axis.
+    """
+    def __init__(self, n, q):
+        assert is_ntt_friendly(n, q), "q should be a prime with q = 1 mod 2n and q < 2^31."
+        self.n       = n
+        self.q       = q
+        self.psi     = primitive_2nth_root(n, q)
+        self.psi_inv = mod_inverse(self.psi, q)
+        self.n_inv   = mod_inverse(n, q)
+
+        rev          = bit_reverse(n)
+        psi_pows     = np.array([pow(self.psi,     k, q) for k in range(n)], dtype=np.int64)
+        psi_inv_pows = np.array([pow(self.psi_inv, k, q) for k in range(n)], dtype=np.int64)
+        self.psi_rev     = psi_pows[rev]      # twiddle tables in bit-reversed order
+        self.psi_inv_rev = psi_inv_pows[rev]
+
+        # a_hat[i] = a(psi^(2 rev(i) + 1)), so X^k evaluates to psi^((2 rev(i) + 1) k mod 2n)
+        self.exponents   = 2 * rev + 1
+        self.psi_pows_2n = np.concatenate([psi_pows, (q - psi_pows) % q]) # psi^n = -1
+
+    def forward(self, a, out = None) -> np.ndarray:
+        """out : optional int64 buffer of the same shape, the transform is done in it."""
+        q     = self.q
+        a     = np.array(a, dtype=np.int64) % q if out is None else np.remainder(a, q, out=out)
+        batch = a.shape[:-1]
+        t, m  = self.n, 1
+        while m < self.n:
+            t //= 2
+            x  = a.reshape(batch + (m, 2, t))
+            V  = x[..., 1, :] * self.psi_rev[m:2*m, None] % q
+            x[..., 1, :]  = x[..., 0, :] - V
+            x[..., 0, :] += V
+            a %= q
+            m *= 2
+        return a
+
+    def inverse(self, a_hat, out = None) -> np.ndarray:
+        q     = self.q
+        a     = np.array(a_hat, dtype=np.int64) % q if out is None else np.remainder(a_hat, q, out=out)
+        batch = a.shape[:-1]
+        t, m  = 1, self.n
+        while m > 1:
+            h  = m // 2
+            x  = a.reshape(batch + (h, 2, t))
+            U  = x[..., 0, :] + x[..., 1, :]
+            x[..., 1, :] = (x[..., 0, :] - x[..., 1, :]) % q * self.psi_inv_rev[h:m, None] % q
+            x[..., 0, :] = U % q
+            t *= 2
+            m  = h
+        np.multiply(a, self.n_inv, out=a)
+        return np.remainder(a, q, out=a)
+
+    def reduce(self, a_hat) -> np.ndarray:
+        return a_hat % self.q
+
+    def monomial(self, k) -> np.ndarray:
+        """Evaluations of X^k, without a transform."""
+        return self.psi_pows_2n[self.exponents * (k % (2 * self.n)) % (2 * self.n)]
+
+    def mul_monomial(self, a_hat, k) -> np.ndarray:
+        """X^k * a in the evaluation domain (along the last axis), a pointwise product in O(n)."""
+        return a_hat * self.monomial(k) % self.q
+
+    def multiply(self, a, b) -> np.ndarray:
+        """Negacyclic product a * b mod (X^n+1, q) in O(n log n)."""
+        return self.inverse(self.forward(a) * self.forward(b) % self.q)
+
+@lru_cache(maxsize=None)
+def get_ntt(n, q):
+    """Cached NegacyclicNTT for (n, q), or None if q is not NTT-friendly."""
+    if not is_ntt_friendly(n, q):
+        return None
+    return NegacyclicNTT(n, q)
@@ -0,0 +1,187 @@
+import math
+import numpy as np
+from functools import lru_cache
+from note_include.utils.NTT import MAX_NTT_MODULUS, find_ntt_primes, get_ntt, is_ntt_friendly, is_prime, mod_inverse
+from note_include.utils.lazy import Accumulator
+
+# ------------------- Residue number system (multi-prime) ------------------- #
+#
+# A modulus Q = p_0 * ... * p_{L-1} of distinct NTT-friendly primes (p_l < 2^31) is
+# handled limb-wise : a polynomial mod Q is the stack of its L residues, one NTT per
+# limb, and Z_Q[X]/(X^N+1) = prod_l Z_{p_l}[X]/(X^N+1) by the CRT. Arrays in this
+# domain are limb-first, (L, ..., N) int64. Limb products are < 2^62 and reduced with
+# Barrett (varying operands) or Shoup (fixed operands) in uint64, without a division ;
+# multiply-accumulates (mac) sum their products unreduced and reduce once per limb.
+# Positional values mod Q are rebuilt with Garner's mixed-radix CRT, exact in int64
+# as long as Q < 2^63, which bounds the moduli handled here (54-bit Q = 2 x 27 bits).
+
+MAX_RNS_MODULUS = 2**63
+
+def barrett_constants(p):
+    '''(b, mu) with b = bit length of p, mu = floor(2^2b / p) < 2^(b+1).'''
+    b = p.bit_length()
+    return b, (1 << (2 * b)) // p
+
+def barrett_reduce(x:np.ndarray, p:int, b:int, mu:int, tmp:np.ndarray = None) -> np.ndarray:
+    '''
+        x mod p in place for a uint64 array x < p^2 : the quotient estimate
+        ((x >> (b-1)) * mu) >> (b+1) is at most 2 below x // p, so two conditional
+        subtractions (np.minimum against the wrapped x - p) finish the reduction.
+    '''
+    t = np.right_shift(x, np.uint64(b - 1), out=tmp)
+    t *= np.uint64(mu)
+    t >>= np.uint64(b + 1)
+    t *= np.uint64(p)
+    x -= t
+    for _ in range(2):
+        np.subtract(x, np.uint64(p), out=t)
+        np.minimum(x, t, out=x)
+    return x
+
+def shoup_precompute(w:int, p:int) -> int:
+    '''w' = floor(w * 2^32 / p) for a fixed multiplier w < p < 2^31.'''
+    return (w << 32) // p
+
+def shoup_mul(x:np.ndarray, w:int, w_shoup:int, p:int) -> np.ndarray:
+    '''w * x mod p for a uint64 array x < 2^32 : one high product and one correction.'''
+    t  = (x * np.uint64(w_shoup)) >> np.uint64(32)
+    r  = x * np.uint64(w) - t * np.uint64(p)
+    return np.minimum(r, r - np.uint64(p))
+
+class RNS:
+    """
+        Negacyclic transform over Z_Q[X]/(X^n+1) for Q = prod(primes), limb by limb.
+        Same interface as NegacyclicNTT (forward / inverse / monomial / mul_monomial /
+        multiply), with a leading limb axis in the evaluation domain.
+    """
+    def __init__(self, n, primes):
+        assert all(is_ntt_friendly(n, p) for p in primes) and len(set(primes)) == len(primes)
+        self.n       = n
+        self.primes  = list(primes)
+        self.L       = len(primes)
+        self.q       = math.prod(primes)
+        assert self.q < MAX_RNS_MODULUS, "Q should be below 2^63."
+        self.ntts    = [get_ntt(n, p) for p in primes]
+        self.barrett = [barrett_constants(p) for p in primes]
+
+        # Garner : x = v_0 + v_1 R_1 + ... + v_{L-1} R_{L-1}, R_l = p_0 ... p_{l-1},
+        #          v_l = (x_l - (v_0 + ... + v_{l-1} R_{l-1})) * R_l^{-1} mod p_l
+        self.radix        = [math.prod(primes[:l]) for l in range(self.L)]
+        self.garner       = [mod_inverse(r % p, p) for r, p in zip(self.radix, self.primes)]
+        self.garner_shoup = [shoup_precompute(w, p) for w, p in zip(self.garner, self.primes)]
+
+    # ----------------------------- CRT ----------------------------- #
+
+    def to_rns(self, a) -> np.ndarray:
+        '''(..., N) values mod Q (int64 or Python ints) -> (L, ..., N) int64 residues.'''
+        a = np.asarray(a)
+        return np.stack([(a % p).astype(np.int64) for p in self.primes])
+
+    def from_rns(self, limbs:np.ndarray, out:np.ndarray = None) -> np.ndarray:
+        '''(L, ..., N) residues -> (..., N) int64 values in [0, Q), by Garner's algorithm.'''
+        if out is None:
+            x = limbs[0].astype(np.int64)
+        else:
+            x      = out
+            x[...] = limbs[0]
+        for l in range(1, self.L):
+            p = self.primes[l]
+            t = ((limbs[l] - x % p) % p).astype(np.uint64)
+            v = shoup_mul(t, self.garner[l], self.garner_shoup[l], p)
+            x += v.astype(np.int64) * self.radix[l]
+        return x
+
+    # --------------------------- Transforms --------------------------- #
+
+    def forward(self, a) -> np.ndarray:
+        limbs = self.to_rns(a)
+        for ntt, limb in zip(self.ntts, limbs):
+            ntt.forward(limb, out=limb)
+        return limbs
+
+    def inverse(self, a_hat, out:np.ndarray = None) -> np.ndarray:
+        '''out : optional (..., N) int64 buffer for the result, a_hat is transformed in place then.'''
+        limbs = np.array(a_hat, dtype=np.int64) if out is None else a_hat
+        for ntt, limb in zip(self.ntts, limbs):
+            ntt.inverse(limb, out=limb)
+        return self.from_rns(limbs, out)
+
+    def reduce(self, a_hat) -> np.ndarray:
+        return np.stack([a_hat[l] % p for l, p in enumerate(self.primes)])
+
+    def monomial(self, k) -> np.ndarray:
+        return np.stack([ntt.monomial(k) for ntt in self.ntts])
+
+    def mul_monomial(self, a_hat, k) -> np.ndarray:
+        return np.stack([ntt.mul_monomial(a_hat[l], k) for l, ntt in enumerate(self.ntts)])
+
+    def multiply(self, a, b) -> np.ndarray:
+        prod = self.forward(a)
+        prod = prod.view(np.uint64)
+        prod *= self.forward(b).view(np.uint64)
+        for l, (p, (bits, mu)) in enumerate(zip(self.primes, self.barrett)):
+            barrett_reduce(prod[l], p, bits, mu)
+        return self.inverse(prod.view(np.int64))
+
+    def mac(self, digits_hat:np.ndarray, keys:np.ndarray, out:np.ndarray = None, prod:np.ndarray = None) -> np.ndarray:
+        '''
+            sum_k digits_hat[..., k, :] * keys[:, k] limb-wise, for (L, ..., K, N) digits and (L, K, 2, N)
+            keys (int64 or uint32), into a (L, ..., 2, N) result : the leading dimensions of the digits
+            are independent accumulators sharing every key row. prod : optional (..., K, 2, N) int64 buffer.
+            The products (< p^2 < 2^62) are summed unreduced (utils/lazy.py), one reduction per limb.
+        '''
+        L, (K, N) = digits_hat.shape[0], digits_hat.shape[-2:]
+        batch     = digits_hat.shape[1:-2]
+        out       = np.empty((L,) + batch + (2, N), dtype=np.int64) if out is None else out
+        prod      = np.empty(batch + (K, 2, N), dtype=np.int64) if prod is None else prod
+        for l, p in enumerate(self.primes):
+            np.multiply(digits_hat[l][..., None, :], keys[l], out=prod)
+            acc = Accumulator.zeros(p, out[l].shape, out=out[l]).add_sum(np.moveaxis(prod, -3, 0), (p - 1)**2)
+            acc.result(out=out[l])
+        return out
+
+# ------------------------------------------------------------------- #
+
+def factor(n) -> list[int]:
+    """Prime factors of n with multiplicity : trial division, then Pollard's rho."""
+    factors = []
+    for p in range(2, 1000):
+        while n % p == 0:
+            factors.append(p)
+            n //= p
+    stack = [n] if n > 1 else []
+    while stack:
+        m = stack.pop()
+        if is_prime(m):
+            factors.append(m)
+            continue
+        for c in range(1, m):
+            x = y = 2
+            d = 1
+            while d == 1:
+                x = (x * x + c) % m
+                y = (y * y + c) % m
+                y = (y * y + c) % m
+                d = math.gcd(abs(x - y), m)
+            if d != m:
+                break
+        stack += [d, m // d]
+    return sorted(factors)
+
+def rns_modulus(n, bits, count) -> int:
+    """Q = product of the count largest NTT-friendly primes below 2^bits."""
+    return math.prod(find_ntt_primes(n, bits, count))
+
+@lru_cache(maxsize=None)
+def get_rns(n, q):
+    """Cached RNS for (n, q) if q > 2^31 is a product of distinct NTT-friendly primes, None otherwise."""
+    if q <= MAX_NTT_MODULUS or q >= MAX_RNS_MODULUS or (n & (n - 1)) or q % (2 * n) != 1:
+        return None
+    primes = factor(q)
+    if len(set(primes)) != len(primes) or not all(is_ntt_friendly(n, p) for p in primes):
+        return None
+    return RNS(n, sorted(primes, reverse=True))
+
+def get_transform(n, q):
+    """The evaluation domain of Z_q[X]/(X^n+1) : a NegacyclicNTT, an RNS, or None."""
+    return get_ntt(n, q) or get_rns(n, q)
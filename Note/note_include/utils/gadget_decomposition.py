@@ -1,35 +1,68 @@
 import numpy as np
-from note_include.elem.Ring import Ring
+from note_include.elem.Ring import Ring, coeff_dtype
+from note_include.utils.lazy import Accumulator
 # from note_include.utils.types import RGSWctxt, RLWEctxt, RLWEpctxt
 
-def gadget_decomposition(poly : Ring, B : int, d : int) -> list[Ring]:
-    coeffs     = np.array(poly.coeffs)
-    decomposed = []
+# Balanced (signed) digits : x mod q is first centered to [-q/2, q/2), then split into
+# digits in [-B/2, B/2) with the carry pushed upwards, and the top digit takes what is
+# left. With B^d >= q every digit satisfies |v| <= ceil(B/2) (max_digit), so products
+# with the digits add half the noise of unsigned digits in [0, B), and key tables
+# indexed by a digit only need its magnitude (the sign is applied by the caller).
 
-    for _ in range(d):  # Decompose into d components
-        remainder = coeffs % B  # Get the lowest base-B component
-        coeffs = coeffs   // B  # Reduce the coefficients
-        decomposed.append(Ring(poly.n, poly.q, remainder))  # Store decomposition step
+def max_digit(B : int) -> int:
+    '''Largest |v| of a signed digit in base B.'''
+    return (B + 1) // 2
 
-    return decomposed  # Return vector of polynomials
+def signed_digits(x, B : int, d : int, q : int, out : np.ndarray = None, carry : np.ndarray = None) -> np.ndarray:
+    '''
+        (d, ...) balanced digits of the array x mod q : x = sum_j out[j] * B^j (mod q).
+        out / carry : optional buffers of shape (d,) + x.shape and x.shape (carry is overwritten).
+    '''
+    x = np.asarray(x)
+    if carry is None:
+        carry = np.array(x)
+    else:
+        carry[...] = x
+    out  = np.empty((d,) + x.shape, dtype=carry.dtype) if out is None else out
+    half = B // 2
+
+    carry %= q
+    carry[carry >= (q + 1) // 2] -= q # centered
+    for j in range(d - 1):
+        digit  = out[j]
+        np.add(carry, half, out=digit)
+        np.remainder(digit, B, out=digit)
+        digit -= half
+        carry -= digit
+        carry //= B
+    out[d - 1] = carry
+    return out
+
+def gadget_decomposition(poly : Ring, B : int, d : int) -> list[Ring]:
+    '''d polynomials whose coefficients are the signed digits of poly (stored mod q).'''
+    return [Ring(poly.n, poly.q, digit) for digit in signed_digits(poly.coeffs, B, d, poly.q)]
 
 def gadget_composition(decomposed: list[Ring], B: int, modulus: int) -> Ring:
-    coeffs = np.zeros_like(decomposed[0].coeffs)  # Initialize with zeros
+    '''sum_i B^i * decomposed[i] mod modulus, summed unreduced and reduced once.'''
+    acc = Accumulator.zeros(modulus, decomposed[0].n, coeff_dtype(modulus))
 
     for i, d in enumerate(decomposed):
-        coeffs += (B**i) * np.array(d.coeffs)  # Sum up each term
-    
-    coeffs = [coef % modulus for coef in coeffs]
-    return Ring(decomposed[0].n, decomposed[0].q, coeffs)
+        power = B**i % modulus
+        acc.add(power * d.coeffs, power * (modulus - 1))  # Sum up each term
+
+    return Ring.from_reduced(decomposed[0].n, decomposed[0].q, acc.result())
 
 def format_ring_list(ring_list):
     return "\n".join(repr(ring) for ring in ring_list)
 
-def gadget_decomposition_int(v:int, B : int, d : int) -> list[int]:
+def gadget_decomposition_int(v:int, B : int, d : int, q : int) -> list[int]:
+    '''Signed digits of the integer v mod q, as signed_digits.'''
+    v          = int(v) % q
+    v         -= q if v >= (q + 1) // 2 else 0
     decomposed = []
-    for _ in range(d):  # Decompose into d components
-        remainder = v % B  # Get the lowest base-B component
-        v = v // B  # Reduce the coefficients
-        decomposed.append(remainder)  # Store decomposition step
-
-    return decomposed  # Return vector of polynomials
\ No newline at end of file
+    for _ in range(d - 1):
+        digit = (v + B // 2) % B - B // 2
+        v     = (v - digit) // B
+        decomposed.append(digit)
+    decomposed.append(v)
+    return decomposed
@@ -0,0 +1,91 @@
+import json
+import struct
+import numpy as np
+from note_include.elem.Ring import Ring, coeff_dtype
+
+# ------------------ Evaluation-key file format ------------------ #
+#
+#   | MAGIC (8 bytes) | header length (uint64, little endian) | header (JSON) | pad | arrays ... |
+#
+# The JSON header records the parameter set and method of the keys and, for every
+# array, its dtype, shape and offset relative to the (ALIGN-aligned) data section.
+# Arrays are raw C-order buffers, each starting on an ALIGN boundary, so that they
+# can be np.memmap'ed directly and shared between processes through the page cache.
+
+MAGIC   = b"TOYFHEW1"
+VERSION = 1
+ALIGN   = 4096
+
+def storage_dtype(Q:int):
+    """Smallest integer dtype holding residues mod Q, evaluation keys dominate key memory."""
+    if Q <= 2**16: return np.uint16
+    if Q <= 2**32: return np.uint32
+    if Q <= 2**63: return np.int64
+    return coeff_dtype(Q)
+
+def _aligned(size):
+    return -(-size // ALIGN) * ALIGN
+
+def flatten_rgsw(brk):
+    '''
+        Splits a (nested list of) RGSW key(s) into its outer shape and the flat list of
+        its RGSW leaves. A leaf is either an array (2, d, 2, N) or an RGSW in Ring form.
+    '''
+    if isinstance(brk, np.ndarray):
+        return brk.shape[:-4], list(brk.reshape((-1,) + brk.shape[-4:]))
+    if isinstance(brk[0][0][0], Ring):
+        return (), [brk]
+
+    shapes, leaves = zip(*[flatten_rgsw(x) for x in brk])
+    return (len(brk),) + shapes[0], [leaf for sub in leaves for leaf in sub]
+
+def save(path, header:dict, arrays:dict):
+    '''
+        arrays : name -> (shape, dtype, chunks) where chunks is an iterable of arrays
+                 whose concatenation in C order fills the given shape.
+    '''
+    entries, offset = {}, 0
+    for name, (shape, dtype, _) in arrays.items():
+        dtype = np.dtype(dtype)
+        if dtype == object:
+            raise ValueError("Keys with coefficients above 2^63 cannot be stored.")
+        entries[name] = {"shape": list(shape), "dtype": dtype.str, "offset": offset}
+        offset       += _aligned(int(np.prod(shape)) * dtype.itemsize)
+
+    blob  = json.dumps(dict(header, version=VERSION, arrays=entries)).encode()
+    start = _aligned(len(MAGIC) + 8 + len(blob))
+
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<Q", len(blob)))
+        f.write(blob)
+        for name, (shape, dtype, chunks) in arrays.items():
+            f.seek(start + entries[name]["offset"])
+            written = 0
+            for chunk in chunks:
+                chunk    = np.ascontiguousarray(chunk, dtype=dtype)
+                written += chunk.size
+                f.write(chunk.tobytes())
+            assert written == int(np.prod(shape)), f"{name} : wrong number of elements."
+        f.truncate(start + offset)
+
+def load(path, mode = "r"):
+    '''
+        Returns (header, arrays) where every array is an np.memmap into the file.
+        The default read-only mode lets several processes map the same pages.
+    '''
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not an evaluation-key file.")
+        (length,) = struct.unpack("<Q", f.read(8))
+        header    = json.loads(f.read(length))
+
+    if header["version"] != VERSION:
+        raise ValueError(f"Unsupported key file version {header['version']}.")
+
+    start  = _aligned(len(MAGIC) + 8 + length)
+    arrays = {}
+    for name, entry in header["arrays"].items():
+        arrays[name] = np.memmap(path, dtype=np.dtype(entry["dtype"]), mode=mode,
+                                 offset=start + entry["offset"], shape=tuple(entry["shape"]))
+    return header, arrays
@@ -0,0 +1,86 @@
+import numpy as np
+
+# ------------------ Lazy modular reduction ------------------ #
+#
+# A multiply-accumulate chain mod q can keep its int64 sum unreduced as long as it
+# cannot overflow : the Accumulator tracks a bound on |value| and only reduces when
+# the next term could push it past the machine word (WORD), the caller reduces once at
+# the end (or hands the value to a transform, which reduces its input anyway). Terms
+# below q^2 < 2^54 (27-bit q) fit 2^9 at a time, so an external product with 2 d_Q
+# digit rows needs no reduction before the final one. Object arrays (coeff_dtype of
+# a large q) hold Python ints, which never overflow and are never reduced early.
+
+WORD = 2**63 - 1
+
+class Accumulator:
+    __slots__ = ("q", "value", "bound", "reductions")
+
+    def __init__(self, q:int, value:np.ndarray, bound:int = None):
+        '''
+            Accumulates into the array `value` (used in place, e.g. a workspace buffer).
+            bound : bound on |value| (default : q - 1, a reduced array), 0 for zeros.
+        '''
+        self.q          = q
+        self.value      = value
+        self.bound      = q - 1 if bound is None else bound
+        self.reductions = 0
+
+    @classmethod
+    def zeros(cls, q:int, shape, dtype = np.int64, out:np.ndarray = None) -> "Accumulator":
+        if out is None:
+            out = np.zeros(shape, dtype=dtype)
+        else:
+            out[...] = 0
+        return cls(q, out, 0)
+
+    def fits(self, bound:int) -> bool:
+        return self.value.dtype == object or self.bound + bound <= WORD
+
+    def reduce(self) -> "Accumulator":
+        '''value mod q, in [0, q).'''
+        np.remainder(self.value, self.q, out=self.value)
+        self.bound       = self.q - 1
+        self.reductions += 1
+        return self
+
+    def add(self, x, bound:int) -> "Accumulator":
+        '''value += x, every |x| <= bound (at most WORD - q + 1).'''
+        if not self.fits(bound):
+            self.reduce()
+        self.value += x
+        self.bound += bound
+        return self
+
+    def sub(self, x, bound:int) -> "Accumulator":
+        if not self.fits(bound):
+            self.reduce()
+        self.value -= x
+        self.bound += bound
+        return self
+
+    def add_sum(self, terms:np.ndarray, bound:int) -> "Accumulator":
+        '''value += terms.sum(axis=0), every |term| <= bound.'''
+        if self.bound == 0 and self.fits(len(terms) * bound): # one sum straight into value
+            np.sum(terms, axis=0, dtype=self.value.dtype, out=self.value)
+            self.bound = len(terms) * bound
+            return self
+        for part, part_bound in self.partial_sums(terms, bound):
+            self.add(part, part_bound)
+        return self
+
+    def sub_sum(self, terms:np.ndarray, bound:int) -> "Accumulator":
+        for part, part_bound in self.partial_sums(terms, bound):
+            self.sub(part, part_bound)
+        return self
+
+    def partial_sums(self, terms:np.ndarray, bound:int):
+        '''Sums of consecutive terms (axis 0, in the dtype of value), as few as the word allows.'''
+        k   = len(terms)
+        per = k if self.value.dtype == object else max(1, (WORD - self.q + 1) // max(bound, 1))
+        for start in range(0, k, per):
+            part = terms[start:start + per]
+            yield part.sum(axis=0, dtype=self.value.dtype), len(part) * bound
+
+    def result(self, out:np.ndarray = None) -> np.ndarray:
+        '''The accumulated value mod q (into out, which may be self.value).'''
+        return np.remainder(self.value, self.q, out=out)
@@ -1,12 +1,13 @@
-import numpy as np
 from note_include.elem.Ring import Ring
+from note_include.utils.sampler import get_sampler
+
+# Ring-valued wrappers of the current sampler (utils/sampler.py). Hot paths (LWE, RLWE)
+# draw raw arrays from the sampler directly.
 
 def discrete_gaussian(n, q, mean=0., std=1.):
-    coeffs = np.round(std * np.random.randn(n)) % q
-    return Ring(n, q, np.array(coeffs, dtype = int))
+    return Ring(n, q, get_sampler().gaussian(n, std) + int(round(mean)))
 
 def discrete_uniform(n, q, min=0., max=None):
     if max is None:
         max = q
-    coeffs = np.random.randint(min, max, size=n)
-    return Ring(n, q, np.array(coeffs, dtype = int))
\ No newline at end of file
+    return Ring(n, q, get_sampler().uniform(n, int(max) - int(min)) + int(min))
@@ -0,0 +1,88 @@
+import secrets
+import numpy as np
+
+# ------------------ Seeded uniform masks ------------------ #
+#
+# The uniform part `a` of an (R)LWE ciphertext can be replaced by a short seed.
+# Masks come from the counter-based Philox generator keyed by a 128-bit seed : row
+# `index` of width w is the words [index * stride, index * stride + w) of the
+# stream (stride = w rounded up to a Philox block of 4 words), so every row can be
+# regenerated on its own by moving the counter, and many consecutive rows can be
+# expanded in one call.
+#
+# A word w is kept as w mod q only below the largest multiple of q under 2^64, so
+# every residue is equally likely. A rejected word is replaced by the word at the same
+# position of retry stream 1, 2, ... (the same key, with the retry number in the
+# second counter word), which keeps every row a function of its index alone. For a
+# power-of-two q nothing is rejected, for q < 2^54 about one word in 2^10 is.
+
+def new_seed() -> int:
+    return secrets.randbits(128)
+
+def raw_rows(seed:int, stride:int, start:int, count:int, retry:int = 0) -> np.ndarray:
+    """Words of rows start, ..., start+count-1 of retry stream `retry`, as a (count, stride) array."""
+    bit_gen = np.random.Philox(key=seed, counter=retry << 64)
+    bit_gen.advance(start * stride // 4)
+    return bit_gen.random_raw(count * stride).reshape(count, stride)
+
+def uniform_rows(seed:int, q:int, width:int, start:int = 0, count:int = 1) -> np.ndarray:
+    """Rows start, ..., start+count-1 of the mask stream of seed, as a (count, width) array mod q."""
+    assert q <= 2**63, "Seeded masks support moduli up to 2^63."
+    stride = -(-width // 4) * 4
+    words  = raw_rows(seed, stride, start, count)[:, :width]
+
+    excess = 2**64 % q
+    if excess:
+        limit = np.uint64(2**64 - excess)
+        retry = 0
+        while True:
+            rows, cols = np.nonzero(words >= limit)
+            if len(rows) == 0:
+                break
+            retry += 1
+            for row in np.unique(rows):
+                redo = cols[rows == row]
+                words[row, redo] = raw_rows(seed, stride, start + int(row), 1, retry)[0, redo]
+
+    return (words % np.uint64(q)).astype(np.int64)
+
+class SeededMask:
+    '''
+        Lazily expanded LWE mask : a single row (n,) or `count` consecutive rows (count, n).
+        Only (seed, start) is pickled, the expansion is cached on first use.
+    '''
+    __slots__ = ("seed", "q", "width", "start", "count", "_rows")
+
+    def __init__(self, seed:int, q:int, width:int, start:int = 0, count:int = None):
+        self.seed, self.q, self.width, self.start, self.count = seed, q, width, start, count
+        self._rows = None
+
+    def expand(self) -> np.ndarray:
+        if self._rows is None:
+            rows       = uniform_rows(self.seed, self.q, self.width, self.start, 1 if self.count is None else self.count)
+            self._rows = rows[0] if self.count is None else rows
+        return self._rows
+
+    def compress(self):
+        """Drops the cached expansion, only the seed is kept."""
+        self._rows = None
+        return self
+
+    def __array__(self, dtype = None, copy = None):
+        rows = self.expand()
+        return rows if dtype is None else rows.astype(dtype)
+
+    def __len__(self):
+        return self.width if self.count is None else self.count
+
+    def __getitem__(self, index):
+        return self.expand()[index]
+
+    def __iter__(self):
+        return iter(self.expand())
+
+    def __reduce__(self):
+        return (SeededMask, (self.seed, self.q, self.width, self.start, self.count))
+
+    def __repr__(self):
+        return f"SeededMask(seed={self.seed:#x}, start={self.start}, count={self.count}, q={self.q})"
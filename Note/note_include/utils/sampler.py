@@ -0,0 +1,138 @@
+import math
+import os
+import numpy as np
+from contextlib import contextmanager
+from functools import lru_cache
+
+# ------------------ Randomness of keygen and encryption ------------------ #
+#
+# Every secret, error and (unseeded) mask comes from a Sampler : a np.random.Generator
+# (PCG64) seeded from a SeedSequence, so independent streams are spawned instead of
+# reseeding one global state. Samplers return raw int64 arrays, callers reduce or wrap
+# them. Small draws (one LWE error per encryption) are served from pre-sampled buffers
+# of BUFFER values per distribution, refilled in bulk.
+#
+#   gaussian : discrete Gaussian D_{Z, std}, P(x) ~ exp(-x^2 / 2 std^2) on |x| <= TAIL * std,
+#              by inversion of a cumulative distribution table (CDT) : a guide table of
+#              GUIDE equal bins of [0, 1) resolves most uniforms with one lookup and only
+#              those falling in a bin that straddles a CDT entry are binary searched. For
+#              std above MAX_CDT / (2 TAIL) (tables too large), by rejection from a
+#              uniform proposal.
+#   ternary  : {-1, 0, 1} with P(0) = p_zero, binary : {0, 1}, uniform : [0, q).
+#
+# The process-wide sampler (get_sampler) is used by LWE / RLWE / RGSW ; set_sampler or
+# `with using(sampler)` swap it, e.g. for reproducible keys or one stream per key range
+# (parallel.generate_keys). A forked child starts from fresh entropy rather than a copy
+# of its parent's stream.
+
+TAIL    = 12
+BUFFER  = 1 << 14
+MAX_CDT = 1 << 16
+GUIDE   = 1 << 12
+
+@lru_cache(maxsize=None)
+def cdt(std:float) -> np.ndarray:
+    '''Cumulative probabilities of D_{Z, std} on -t, ..., t (t = ceil(TAIL * std)).'''
+    t     = math.ceil(TAIL * std)
+    x     = np.arange(-t, t + 1)
+    table = np.cumsum(np.exp(-x**2 / (2 * std**2)))
+    return table / table[-1]
+
+@lru_cache(maxsize=None)
+def guide(std:float) -> tuple[np.ndarray, np.ndarray]:
+    '''CDT indices at the left and right edges of the GUIDE bins, equal when the bin maps to one value.'''
+    table, edges = cdt(std), np.arange(GUIDE + 1) / GUIDE
+    return np.searchsorted(table, edges[:-1], side="right"), np.searchsorted(table, edges[1:], side="right")
+
+class Sampler:
+    def __init__(self, seed = None, buffer:int = BUFFER):
+        '''seed : int, SeedSequence or None (fresh OS entropy). buffer : values pre-sampled per refill.'''
+        self.seed_seq = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+        self.rng      = np.random.Generator(np.random.PCG64(self.seed_seq))
+        self.buffer   = buffer
+        self.pools    = {} # distribution -> (samples, position)
+
+    def spawn(self, n:int) -> list["Sampler"]:
+        '''n independent child streams, e.g. one per worker.'''
+        return [Sampler(child, self.buffer) for child in self.seed_seq.spawn(n)]
+
+    @classmethod
+    def stream(cls, entropy, index:int) -> "Sampler":
+        '''Child `index` of entropy : the same stream whichever process asks for it.'''
+        return cls(np.random.SeedSequence(entropy, spawn_key=(index,)))
+
+    # ------------------------ Distributions ------------------------ #
+
+    def uniform(self, size, q:int) -> np.ndarray:
+        return self.rng.integers(0, q, size, dtype=np.int64)
+
+    def binary(self, size) -> np.ndarray:
+        return self.rng.integers(0, 2, size, dtype=np.int64)
+
+    def ternary(self, size, p_zero:float = 1 / 3) -> np.ndarray:
+        if p_zero == 1 / 3:
+            return self.rng.integers(-1, 2, size, dtype=np.int64)
+        u = self.rng.random(size)
+        return np.where(u < p_zero, 0, np.where(u < (1 + p_zero) / 2, 1, -1)).astype(np.int64)
+
+    def gaussian(self, size, std:float) -> np.ndarray:
+        '''Discrete Gaussian samples of standard deviation std (zeros for std = 0).'''
+        if std == 0:
+            return np.zeros(size, dtype=np.int64)
+        return self.buffered(("gaussian", float(std)), size, lambda k: self.gaussian_bulk(k, std))
+
+    def gaussian_bulk(self, k:int, std:float) -> np.ndarray:
+        t = math.ceil(TAIL * std)
+        if 2 * t + 1 <= MAX_CDT:
+            lo, hi   = guide(float(std))
+            u        = self.rng.random(k)
+            bins     = (u * GUIDE).astype(np.intp)
+            x        = lo[bins]
+            straddle = np.flatnonzero(x != hi[bins])
+            x[straddle] = np.searchsorted(cdt(float(std)), u[straddle], side="right")
+            return x - t
+        out, filled = np.empty(k, dtype=np.int64), 0
+        while filled < k:
+            x       = self.rng.integers(-t, t + 1, 2 * (k - filled) * t // int(std) + 16)
+            x       = x[self.rng.random(len(x)) < np.exp(-x.astype(np.float64)**2 / (2 * std**2))][:k - filled]
+            out[filled:filled + len(x)] = x
+            filled += len(x)
+        return out
+
+    def buffered(self, key, size, bulk) -> np.ndarray:
+        '''`size` values of the distribution `key`, taken from its buffer (refilled by bulk(k)).'''
+        k = math.prod(size) if isinstance(size, tuple) else int(size)
+        if k > self.buffer:
+            return bulk(k).reshape(size)
+        samples, pos = self.pools.get(key, (None, 0))
+        if samples is None or pos + k > len(samples):
+            samples, pos = bulk(self.buffer), 0
+        self.pools[key] = (samples, pos + k)
+        return samples[pos:pos + k].reshape(size)
+
+# ------------------------------------------------------------------- #
+
+_current = None
+
+def get_sampler() -> Sampler:
+    global _current
+    if _current is None:
+        _current = Sampler()
+    return _current
+
+def set_sampler(sampler:Sampler) -> Sampler:
+    '''Installs sampler (None : a fresh one on next use) and returns the previous one.'''
+    global _current
+    previous, _current = _current, sampler
+    return previous
+
+@contextmanager
+def using(sampler:Sampler):
+    previous = set_sampler(sampler)
+    try:
+        yield sampler
+    finally:
+        set_sampler(previous)
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=lambda: set_sampler(None))
@@ -1,7 +1,15 @@
+import numpy as np
 from note_include.elem.Ring  import Ring
 from typing import List, Tuple, TypeAlias
 
 LWEctxt  : TypeAlias = Tuple[int, int]
 RLWEctxt : TypeAlias = Tuple[Ring, Ring]
 RLWEpctxt: TypeAlias = List[RLWEctxt]
-RGSWctxt : TypeAlias = Tuple[RLWEpctxt, RLWEpctxt]
\ No newline at end of file
+RGSWctxt : TypeAlias = Tuple[RLWEpctxt, RLWEpctxt]
+
+# k LWE ciphertexts held as a (k, n) mask matrix and a length-k vector b; row i is (A[i], b[i])
+LWEctxt_batch: TypeAlias = Tuple[np.ndarray, np.ndarray]
+
+# Evaluation (NTT) domain ciphertexts, last axis holds the N evaluations
+RLWEpctxt_ntt: TypeAlias = np.ndarray # (d, 2, N)    : [level][a, b]
+RGSWctxt_ntt : TypeAlias = np.ndarray # (2, d, 2, N) : [row][level][a, b]
@@ -0,0 +1,75 @@
+import json
+import struct
+import numpy as np
+
+# ------------------ Gate service wire format ------------------ #
+#
+# Every message is one frame : | body length (uint32, big endian) | body |
+#
+#   request  body : | request id (uint32) | op (uint8) | gate (uint8) | payload |
+#   response body : | request id (uint32) | status (uint8)            | payload |
+#
+# Requests are matched to responses by id, so a connection may have many requests in
+# flight and responses come back in completion order. Payloads :
+#
+#   EVAL_BIN : two packed ciphertexts              -> OK : one packed ciphertext
+#   EVAL_NOT : one packed ciphertext (gate unused) -> OK : one packed ciphertext
+#   INFO     : empty                               -> OK : JSON parameters (n, q, gates, ...)
+#   METRICS  : empty                               -> OK : JSON server metrics
+#   ERROR / CLOSING responses carry a UTF-8 message.
+#
+# A packed LWE ciphertext is its n + 1 values (a_0 .. a_{n-1}, b) mod q, each on
+# ceil(log2 q) bits, packed little-endian into ceil((n + 1) * bits / 8) bytes : 1.4 kB
+# for n = 512, q = 2048 instead of 4 kB of int64.
+
+EVAL_BIN, EVAL_NOT, INFO, METRICS = 1, 2, 3, 4
+OK, ERROR, CLOSING                = 0, 1, 2
+
+LENGTH    = struct.Struct("!I")
+REQUEST   = struct.Struct("!IBB")
+RESPONSE  = struct.Struct("!IB")
+MAX_FRAME = 1 << 24
+
+def value_bits(q:int) -> int:
+    return max(1, (q - 1).bit_length())
+
+def lwe_bytes(n:int, q:int) -> int:
+    '''Size of a packed ciphertext.'''
+    return -(-(n + 1) * value_bits(q) // 8)
+
+def pack_lwe(ctxt, q:int) -> bytes:
+    a, b   = ctxt
+    values = np.append(np.asarray(a, dtype=np.int64), int(b)) % q
+    bits   = (values[:, None] >> np.arange(value_bits(q))) & 1
+    return np.packbits(bits.astype(np.uint8), axis=None, bitorder="little").tobytes()
+
+def unpack_lwe(data:bytes, n:int, q:int) -> tuple[np.ndarray, int]:
+    '''(a, b) of a packed ciphertext, a as an int64 array.'''
+    nbits  = value_bits(q)
+    bits   = np.unpackbits(np.frombuffer(data, dtype=np.uint8), count=(n + 1) * nbits, bitorder="little")
+    values = bits.reshape(n + 1, nbits).astype(np.int64) @ (1 << np.arange(nbits, dtype=np.int64))
+    return values[:n], int(values[n])
+
+def pack_json(obj) -> bytes:
+    return json.dumps(obj).encode()
+
+def unpack_json(data:bytes):
+    return json.loads(data.decode())
+
+# ------------------------------------------------------------------- #
+
+def frame(header:struct.Struct, *fields_and_payload) -> bytes:
+    '''One frame : header.pack(*fields) followed by the payload (last argument).'''
+    *fields, payload = fields_and_payload
+    body = header.pack(*fields) + payload
+    return LENGTH.pack(len(body)) + body
+
+async def read_frame(reader) -> bytes:
+    '''Body of the next frame, None at end of stream.'''
+    try:
+        length, = LENGTH.unpack(await reader.readexactly(LENGTH.size))
+        if length > MAX_FRAME:
+            raise ValueError(f"Frame of {length} bytes exceeds {MAX_FRAME}.")
+        return await reader.readexactly(length)
+    except EOFError: # IncompleteReadError
+        return None